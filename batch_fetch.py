@@ -5,25 +5,44 @@
   python batch_fetch.py bing 2025-12        # 抓取 Bing 2025年12月的所有壁纸
   python batch_fetch.py bing 2025-12-10     # 抓取 Bing 2025年12月10日的壁纸
   python batch_fetch.py unsplash 2025-12    # 抓取 Unsplash 2025年12月的所有壁纸
+  python batch_fetch.py bing 2025-12 --profile --trace-memory  # 按阶段剖析耗时与内存
+超出 config/sources.yaml 中 llm.budget 的 token 预算后，剩余条目只抓取图片与元数据，
+故事推迟到下次运行（python scripts/generate_missing_stories.py 补齐）
 """
 
+import argparse
 import os
 import sys
-import json
-import requests
-from datetime import datetime, timezone
 from pathlib import Path
-from PIL import Image
 
 # 导入主脚本的工具函数
 import fetch_bing_wallpaper
+import fetch_unsplash_wallpaper
+from src import llm_usage, profiling, resilience
+from src.archive import (
+    atomic_write_text, log_write_summary, write_meta,
+    load_checkpoint, update_checkpoint, mark_stage, is_entry_complete, upload_entry_to_cos
+)
+from src.palette import describe_colors
+from src.recompress import apply_recompress
+from src.storage import apply_storage_tier, fetch_original, has_original, read_pointers
 from src.update_readme import update_readme
 from src.update_gallery import update_gallery
 
 
-BING_API = "https://www.bing.com/HPImageArchive.aspx"
-BING_BASE = "https://www.bing.com"
-UNSPLASH_API = "https://api.unsplash.com/photos/random"
+BING_BASE = fetch_bing_wallpaper.BING_BASE
+UNSPLASH_API = fetch_unsplash_wallpaper.UNSPLASH_API
+DEFERRED_STORIES = []  # 因超出 LLM 预算推迟生成故事的条目
+
+
+def story_deferred(source: str, date_str: str) -> bool:
+    """超出 LLM token 预算时记录该条目并返回 True，调用方跳过故事生成"""
+    reason = llm_usage.budget_exceeded()
+    if reason:
+        if not DEFERRED_STORIES:
+            print(f"[WARN] {reason}，剩余故事推迟到下次运行")
+        DEFERRED_STORIES.append(f"{source}/{date_str}")
+    return bool(reason)
 
 
 def batch_fetch_bing(target_date):
@@ -34,22 +53,15 @@ def batch_fetch_bing(target_date):
     count = 0
     story_count = 0
     
-    # 尝试抓取多页
-    all_images = []
-    for idx_start in [0, 8, 16]:
-        params = {
-            "format": "js",
-            "idx": idx_start,
-            "n": 8,
-            "mkt": "zh-CN"
-        }
-        try:
-            resp = requests.get(BING_API, params=params, timeout=10)
-            resp.raise_for_status()
-            data = resp.json()
-            all_images.extend(data.get("images", []))
-        except Exception as e:
-            print(f"⚠️ 无法获取 idx={idx_start} 的数据: {e}")
+    # 并发抓取主市场与附加市场的多页数据
+    profiling.stage("metadata")
+    primary = fetch_bing_wallpaper.PRIMARY_MARKET
+    extra_markets = fetch_bing_wallpaper.get_extra_markets()
+    market_images = fetch_bing_wallpaper.fetch_market_images(
+        [primary] + extra_markets,
+        pages=((0, 8), (8, 8), (16, 8))
+    )
+    all_images = market_images.pop(primary)
     
     for img in all_images:
         start_date = img.get("startdate")
@@ -66,50 +78,71 @@ def batch_fetch_bing(target_date):
         base_dir.mkdir(parents=True, exist_ok=True)
         
         image_path = base_dir / "image.jpg"
-        meta_path = base_dir / "meta.json"
         thumb_path = base_dir / "thumb.jpg"
         story_path = base_dir / "story.md"
         
-        # 1. 下载图片
-        if not image_path.exists():
-            image_url = BING_BASE + img["url"]
+        # 1. 下载图片（每个产物单独检查，中断后重跑只补缺失部分；已分层的原图不重复下载）
+        profiling.stage("download")
+        image_url = BING_BASE + img["url"]
+        if not has_original(base_dir):
             print(f"📥 正在下载 {date_str}: {img.get('title')}")
             fetch_bing_wallpaper.download_image(image_url, image_path)
-            fetch_bing_wallpaper.generate_thumbnail(image_path, thumb_path)
             count += 1
+            mark_stage(base_dir, "image", url=image_url)
+        profiling.stage("thumbnail")
+        if not thumb_path.exists():
+            image_path = fetch_original(base_dir)
+            fetch_bing_wallpaper.generate_thumbnail(image_path, thumb_path)
+            mark_stage(base_dir, "thumb", source_bytes=image_path.stat().st_size)
+        
+        # 1.1 多市场：按 hsh 去重，每张唯一图片只下载一次
+        profiling.stage("markets")
+        meta_draft = {
+            "date": date_str,
+            "title": img.get("title"),
+            "copyright": img.get("copyright"),
+            "image_url": image_url
+        }
+        if extra_markets:
+            markets_info, variant_downloads = fetch_bing_wallpaper.collect_market_variants(img, market_images)
+            fetch_bing_wallpaper.download_market_variants(base_dir, variant_downloads)
+            meta_draft["markets"] = markets_info
+        profiling.stage("recompress")
+        apply_recompress(base_dir)
+        profiling.stage("palette")
+        meta_draft.update(describe_colors(thumb_path))
+        update_checkpoint(base_dir, meta=meta_draft)
         
         # 2. 生成 AI 故事
+        profiling.stage("story")
         has_story = story_path.exists()
-        if not has_story:
+        if not has_story and not story_deferred("bing", date_str):
             story_content = fetch_bing_wallpaper.generate_story(
                 img.get("title"),
                 img.get("copyright"),
-                image_path
+                fetch_original(base_dir),
+                entry_dir=base_dir
             )
             if story_content:
-                story_path.write_text(story_content, encoding="utf-8")
+                atomic_write_text(story_path, story_content)
+                mark_stage(base_dir, "story")
                 print(f"📖 已生成故事: {date_str}")
                 has_story = True
                 story_count += 1
         
-        # 3. 更新元数据
-        meta_info = {
-            "date": date_str,
-            "title": img.get("title"),
-            "copyright": img.get("copyright"),
-            "image_url": BING_BASE + img["url"],
-            "has_story": has_story
-        }
-        meta_path.write_text(json.dumps(meta_info, ensure_ascii=False, indent=2), encoding="utf-8")
+        # 3. 更新元数据（合并到已有 meta.json，保留原图指针与画廊占位图）
+        profiling.stage("meta")
+        meta_info = {**meta_draft, "has_story": has_story}
+        pointers = read_pointers(base_dir)
+        if pointers:
+            meta_info["originals"] = pointers
+        write_meta(base_dir, meta_info)
+        mark_stage(base_dir, "meta")
 
-        # 4. 上传到 COS
-        from src.utils import upload_to_cos
-        cos_base_path = f"wallpapers/bing/{date_str}"
-        upload_to_cos(str(image_path), f"{cos_base_path}/image.jpg")
-        upload_to_cos(str(thumb_path), f"{cos_base_path}/thumb.jpg")
-        if has_story:
-            upload_to_cos(str(story_path), f"{cos_base_path}/story.md")
-        upload_to_cos(str(meta_path), f"{cos_base_path}/meta.json")
+        # 4. 上传到 COS，并按存储分层配置迁出原图
+        profiling.stage("cos")
+        upload_entry_to_cos(base_dir)
+        apply_storage_tier(base_dir)
     
     print(f"✅ Bing 批量处理完成：新增图片 {count} 张，补全故事 {story_count} 篇。")
 
@@ -140,13 +173,16 @@ def batch_fetch_unsplash(target_date):
         print("[ERROR] 日期格式错误，应为 YYYY-MM 或 YYYY-MM-DD")
         return
     
+    size_policy = fetch_unsplash_wallpaper.get_size_policy()
     count = 0
     for date_str in dates_to_fetch:
         base_dir = Path("docs/wallpapers/unsplash") / date_str
         
-        # 如果已存在，跳过
-        if base_dir.exists() and (base_dir / "image.jpg").exists():
+        # 已完整归档则跳过；下载后中断的条目从断点状态中的元数据草稿继续
+        if is_entry_complete(base_dir):
             continue
+        image_path = base_dir / "image.jpg"
+        meta_draft = load_checkpoint(base_dir).get("meta") if image_path.exists() else None
         
         # 抓取一张照片
         headers = {"Authorization": f"Client-ID {access_key}"}
@@ -157,50 +193,53 @@ def batch_fetch_unsplash(target_date):
         }
         
         try:
-            resp = requests.get(UNSPLASH_API, headers=headers, params=params, timeout=10)
-            resp.raise_for_status()
-            photo = resp.json()
-            
-            base_dir.mkdir(parents=True, exist_ok=True)
-            
-            # 下载图片
-            image_url = photo["urls"]["full"]
-            image_path = base_dir / "image.jpg"
-            fetch_bing_wallpaper.download_image(image_url, image_path)
+            profiling.stage("download")
+            if not meta_draft:
+                resp = resilience.get(UNSPLASH_API, headers=headers, params=params, timeout=10, label="Unsplash API")
+                photo = resp.json()
+                
+                base_dir.mkdir(parents=True, exist_ok=True)
+                
+                # 下载图片（按尺寸策略请求服务端缩放版本）
+                image_url = fetch_unsplash_wallpaper.select_image_url(photo, size_policy)
+                fetch_bing_wallpaper.download_image(image_url, image_path)
+                meta_draft = fetch_unsplash_wallpaper.build_photo_meta(photo, date_str, image_path)
+                mark_stage(base_dir, "image", url=image_url)
+                update_checkpoint(base_dir, meta=meta_draft)
+            profiling.stage("recompress")
+            if apply_recompress(base_dir):
+                meta_draft["bytes"] = image_path.stat().st_size
             
             # 生成缩略图
+            profiling.stage("thumbnail")
             thumb_path = base_dir / "thumb.jpg"
-            fetch_bing_wallpaper.generate_thumbnail(image_path, thumb_path)
+            if not thumb_path.exists():
+                fetch_bing_wallpaper.generate_thumbnail(image_path, thumb_path)
+            mark_stage(base_dir, "thumb", source_bytes=image_path.stat().st_size)
+            profiling.stage("palette")
+            meta_draft.update(describe_colors(thumb_path))
+            update_checkpoint(base_dir, meta=meta_draft)
             
             # 生成故事
-            title = photo.get("description") or photo.get("alt_description") or "Unsplash Featured Photo"
-            author = photo.get("user", {}).get("name", "Unknown")
-            copyright_info = f"Photo by {author} on Unsplash"
-            
-            story_content = fetch_bing_wallpaper.generate_story(title, copyright_info, image_path)
-            if story_content:
-                (base_dir / "story.md").write_text(story_content, encoding="utf-8")
+            profiling.stage("story")
+            title = meta_draft["title"]
+            story_path = base_dir / "story.md"
+            story_content = story_path.read_text(encoding="utf-8") if story_path.exists() else None
+            if not story_content and not story_deferred("unsplash", date_str):
+                story_content = fetch_bing_wallpaper.generate_story(title, meta_draft["copyright"], image_path)
+                if story_content:
+                    atomic_write_text(story_path, story_content)
+                    mark_stage(base_dir, "story")
             
             # 保存元数据
-            meta_info = {
-                "date": date_str,
-                "title": title,
-                "copyright": copyright_info,
-                "image_url": photo["links"]["html"],
-                "photographer": author,
-                "has_story": bool(story_content)
-            }
-            meta_path = base_dir / "meta.json"
-            meta_path.write_text(json.dumps(meta_info, ensure_ascii=False, indent=2), encoding="utf-8")
+            profiling.stage("meta")
+            write_meta(base_dir, {**meta_draft, "has_story": bool(story_content)})
+            mark_stage(base_dir, "meta")
             
-            # 上传到 COS
-            from src.utils import upload_to_cos
-            cos_base_path = f"wallpapers/unsplash/{date_str}"
-            upload_to_cos(str(image_path), f"{cos_base_path}/image.jpg")
-            upload_to_cos(str(thumb_path), f"{cos_base_path}/thumb.jpg")
-            if story_content:
-                upload_to_cos(str(base_dir / "story.md"), f"{cos_base_path}/story.md")
-            upload_to_cos(str(meta_path), f"{cos_base_path}/meta.json")
+            # 上传到 COS，并按存储分层配置迁出原图
+            profiling.stage("cos")
+            upload_entry_to_cos(base_dir)
+            apply_storage_tier(base_dir)
             
             print(f"📥 已抓取 {date_str}: {title}")
             count += 1
@@ -213,30 +252,41 @@ def batch_fetch_unsplash(target_date):
 
 
 def main():
-    if len(sys.argv) < 3:
-        print("用法:")
-        print("  python batch_fetch.py bing 2025-12        # 抓取 Bing 2025年12月")
-        print("  python batch_fetch.py bing 2025-12-10     # 抓取 Bing 指定日期")
-        print("  python batch_fetch.py unsplash 2025-12    # 抓取 Unsplash 2025年12月")
-        print("  python batch_fetch.py unsplash 2025-12-10 # 抓取 Unsplash 指定日期")
-        sys.exit(1)
+    parser = argparse.ArgumentParser(description='批量抓取壁纸 (支持多数据源)', epilog=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('source', type=str.lower, help='数据源: bing / unsplash（忽略大小写）')
+    parser.add_argument('target_date', help='YYYY-MM 或 YYYY-MM-DD')
+    profiling.add_arguments(parser)
+    args = parser.parse_args()
     
-    source = sys.argv[1].lower()  # 忽略大小写
-    target_date = sys.argv[2]
-    
-    if source == "bing":
-        batch_fetch_bing(target_date)
-    elif source == "unsplash":
-        batch_fetch_unsplash(target_date)
-    else:
-        print(f"❌ 不支持的数据源: {source}")
+    if args.source not in ("bing", "unsplash"):
+        print(f"❌ 不支持的数据源: {args.source}")
         print("支持的数据源: bing, unsplash")
         sys.exit(1)
     
-    # 更新索引
-    print("🔄 正在更新 README 和 Gallery...")
-    update_readme()
-    update_gallery()
+    profiling.start(args, f"batch_{args.source}")
+    try:
+        if args.source == "bing":
+            batch_fetch_bing(args.target_date)
+        else:
+            batch_fetch_unsplash(args.target_date)
+        
+        # 更新索引
+        if DEFERRED_STORIES:
+            print(f"⏸️ 超出 LLM 预算，推迟 {len(DEFERRED_STORIES)} 篇故事，"
+                  "之后运行 python scripts/generate_missing_stories.py 补齐")
+        print("🔄 正在更新 README 和 Gallery...")
+        profiling.stage("readme")
+        update_readme()
+        update_gallery()
+        profiling.stage("summary")
+        log_write_summary()
+        resilience.log_summary()
+        from src import llm_router
+        llm_router.log_summary()
+        llm_usage.log_summary()
+    finally:
+        profiling.finish()
     print("✅ 全部完成！")
 
 
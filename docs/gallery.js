@@ -0,0 +1,50 @@
+// 画廊按颜色筛选、按明暗排序：读取卡片上由 update_gallery 写入的 data-colors / data-luminance
+(() => {
+    // 色系判定：低饱和度或接近黑白的颜色归为 neutral，其余按色相分段
+    const HUES = [[15, "red"], [45, "orange"], [70, "yellow"], [165, "green"], [200, "cyan"], [260, "blue"], [330, "purple"], [360, "red"]];
+
+    function colorFamily(hex) {
+        const [r, g, b] = [1, 3, 5].map((i) => parseInt(hex.slice(i, i + 2), 16) / 255);
+        const max = Math.max(r, g, b);
+        const min = Math.min(r, g, b);
+        const light = (max + min) / 2;
+        const delta = max - min;
+        const sat = delta === 0 ? 0 : delta / (1 - Math.abs(2 * light - 1));
+        if (sat < 0.2 || light < 0.12 || light > 0.9) return "neutral";
+        let hue = max === r ? ((g - b) / delta) % 6 : max === g ? (b - r) / delta + 2 : (r - g) / delta + 4;
+        hue = (hue * 60 + 360) % 360;
+        return HUES.find(([limit]) => hue < limit)[1];
+    }
+
+    document.addEventListener("DOMContentLoaded", () => {
+        const gallery = document.querySelector('div[class="gallery"]');
+        const sortSelect = document.getElementById("sort-select");
+        const colorSelect = document.getElementById("color-filter");
+        if (!gallery || !sortSelect || !colorSelect) return;
+
+        const cards = [...gallery.querySelectorAll(".card")];
+        // 主色调的前两种颜色决定卡片所属色系
+        const families = new Map(cards.map((card) => [
+            card,
+            new Set((card.dataset.colors || "").split(" ").filter(Boolean).slice(0, 2).map(colorFamily)),
+        ]));
+
+        function apply() {
+            const sort = sortSelect.value;
+            const family = colorSelect.value;
+            const ordered = [...cards];
+            if (sort !== "date") {
+                const sign = sort === "bright" ? -1 : 1;
+                const lum = (card) => parseFloat(card.dataset.luminance ?? (sort === "bright" ? -1 : 2));
+                ordered.sort((a, b) => sign * (lum(a) - lum(b)));
+            }
+            for (const card of ordered) {
+                card.hidden = Boolean(family) && !families.get(card).has(family);
+            }
+            gallery.append(...ordered);
+        }
+
+        sortSelect.addEventListener("change", apply);
+        colorSelect.addEventListener("change", apply);
+    });
+})();
@@ -0,0 +1,121 @@
+// 画廊搜索：按需加载 docs/search/ 下的分片倒排索引，在浏览器端完成查询
+// 分词与分片规则需与 src/search_index.py 保持一致
+(() => {
+    const CJK = "\\u3400-\\u4dbf\\u4e00-\\u9fff\\uf900-\\ufaff";
+    const TOKEN_RE = new RegExp(`[a-z0-9]+|[${CJK}]+`, "g");
+    const CJK_RE = new RegExp(`^[${CJK}]`);
+
+    let manifestPromise = null;
+    const shardCache = new Map();
+
+    function tokenize(text) {
+        const tokens = [];
+        for (const run of text.normalize("NFKC").toLowerCase().match(TOKEN_RE) || []) {
+            if (!CJK_RE.test(run)) {
+                tokens.push(run);
+            } else if (run.length === 1) {
+                tokens.push(run);
+            } else {
+                for (let i = 0; i < run.length - 1; i++) tokens.push(run.slice(i, i + 2));
+            }
+        }
+        return tokens;
+    }
+
+    // FNV-1a 32 位
+    function shardOf(token, count) {
+        let h = 0x811c9dc5;
+        for (const ch of token) {
+            h ^= ch.codePointAt(0);
+            h = Math.imul(h, 0x01000193) >>> 0;
+        }
+        return h % count;
+    }
+
+    function loadManifest() {
+        manifestPromise ||= fetch("search/manifest.json", { cache: "no-cache" }).then((r) => r.json());
+        return manifestPromise;
+    }
+
+    function loadShard(manifest, n) {
+        if (!shardCache.has(n)) {
+            const name = `search/shard-${String(n).padStart(2, "0")}.json?v=${manifest.shards[n]}`;
+            shardCache.set(n, fetch(name).then((r) => r.json()));
+        }
+        return shardCache.get(n);
+    }
+
+    async function search(query) {
+        const tokens = [...new Set(tokenize(query))];
+        if (!tokens.length) return null;
+        const manifest = await loadManifest();
+        const lists = await Promise.all(tokens.map(async (token) => {
+            const shard = await loadShard(manifest, shardOf(token, manifest.shards.length));
+            return shard[token] || [];
+        }));
+        // 所有词项都需命中：从最短的倒排表开始求交集
+        lists.sort((a, b) => a.length - b.length);
+        let hits = lists[0];
+        for (const list of lists.slice(1)) {
+            const set = new Set(list);
+            hits = hits.filter((n) => set.has(n));
+        }
+        const fields = manifest.fields;
+        return hits
+            .map((n) => Object.fromEntries(fields.map((f, i) => [f, manifest.docs[n][i]])))
+            .sort((a, b) => b.date.localeCompare(a.date));
+    }
+
+    function el(tag, attrs, ...children) {
+        const node = document.createElement(tag);
+        Object.assign(node, attrs);
+        node.append(...children);
+        return node;
+    }
+
+    function renderCard(doc) {
+        const base = `./wallpapers/${doc.source}/${doc.date}`;
+        const title = el("span", { className: "title" }, doc.has_story ? `${doc.title} 📖` : doc.title);
+        return el("div", { className: "card" },
+            el("a", { href: doc.image_url || `${base}/image.jpg`, target: "_blank" },
+                el("img", { src: `${base}/thumb.jpg`, alt: doc.title, loading: "lazy" })),
+            el("p", {}, `${doc.date} · ${doc.label}`),
+            doc.has_story ? el("a", { href: `${base}/story.html`, className: "story-link" }, title) : title);
+    }
+
+    document.addEventListener("DOMContentLoaded", () => {
+        const input = document.getElementById("search-input");
+        const results = document.getElementById("search-results");
+        const status = document.getElementById("search-status");
+        const gallery = document.querySelector('div[class="gallery"]');
+        if (!input || !results || !gallery) return;
+
+        let timer = null;
+        let latest = 0;
+        input.addEventListener("input", () => {
+            clearTimeout(timer);
+            timer = setTimeout(async () => {
+                const query = input.value.trim();
+                const ticket = ++latest;
+                let docs = null;
+                try {
+                    docs = query ? await search(query) : null;
+                } catch (e) {
+                    status.textContent = "搜索索引加载失败 / Search index unavailable";
+                    return;
+                }
+                if (ticket !== latest) return;  // 丢弃过期的查询结果
+                if (docs === null) {
+                    results.hidden = true;
+                    gallery.hidden = false;
+                    status.textContent = "";
+                    return;
+                }
+                results.replaceChildren(...docs.map(renderCard));
+                results.hidden = false;
+                gallery.hidden = true;
+                status.textContent = `${docs.length} 条结果 / results`;
+            }, 150);
+        });
+    });
+})();
@@ -10,20 +10,25 @@
 import argparse
 
 import os
-import json
-import base64
-import requests
+import re
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
 from pathlib import Path
-from PIL import Image
 
-from src.utils import send_image_to_wecom, send_markdown_to_wecom, send_story_to_wecom
-from src.update_readme import update_readme
-from src.update_gallery import update_gallery
+from src import profiling, resilience
+from src.archive import (
+    atomic_output, atomic_write_text, log_write_summary, write_meta,
+    load_checkpoint, update_checkpoint, mark_stage, is_entry_complete, upload_entry_to_cos
+)
 
+# 注意：Pillow、src.utils (qcloud_cos)、README/Gallery 更新器和 PyYAML 均在需要的阶段内按需导入，
+# 保证「今日壁纸已存在」这条最常见路径只加载 requests 即可退出
 
-BING_API = "https://www.bing.com/HPImageArchive.aspx"
-BING_BASE = "https://www.bing.com"
+
+# BING_BASE_URL 可指向本地替身服务 (scripts/stub_services.py)
+BING_BASE = os.environ.get("BING_BASE_URL", "https://www.bing.com").rstrip("/")
+BING_API = f"{BING_BASE}/HPImageArchive.aspx"
+PRIMARY_MARKET = "zh-CN"  # 主市场：决定归档日期、标题与故事
 THUMB_SIZE = (400, 225)  # 16:9 缩略图
 
 
@@ -45,153 +50,257 @@ def get_date_from_meta(meta):
     return f"{start_date[:4]}-{start_date[4:6]}-{start_date[6:8]}"
 
 
-def fetch_bing_metadata():
-    """获取必应每日壁纸元数据"""
+def fetch_bing_images(mkt: str = PRIMARY_MARKET, idx: int = 0, n: int = 1):
+    """获取指定市场的必应壁纸元数据列表"""
     params = {
         "format": "js",
-        "idx": 0,
-        "n": 1,
-        "mkt": "zh-CN"
+        "idx": idx,
+        "n": n,
+        "mkt": mkt
     }
-    resp = requests.get(BING_API, params=params, timeout=10)
-    resp.raise_for_status()
+    resp = resilience.get(BING_API, params=params, timeout=10, hedge=True, hedge_after=3, label=f"Bing API {mkt}")
     data = resp.json()
-    return data["images"][0]
+    return data.get("images", [])
+
+
+def fetch_bing_metadata(mkt: str = PRIMARY_MARKET):
+    """获取必应每日壁纸元数据"""
+    return fetch_bing_images(mkt)[0]
+
+
+def get_extra_markets():
+    """读取 config/sources.yaml 中配置的附加市场（不含主市场）"""
+    from src.config_loader import get_source_config
+    markets = get_source_config("bing").get("markets") or []
+    return [m for m in markets if m != PRIMARY_MARKET]
+
+
+def fetch_market_images(markets, pages=((0, 8),)):
+    """
+    并发查询多个市场的壁纸列表
+    pages 为 (idx, n) 元组序列，返回 {市场: [image, ...]}，查询失败的页会被跳过
+    """
+    jobs = [(mkt, idx, n) for mkt in markets for idx, n in pages]
+    results = {mkt: [] for mkt in markets}
+    if not jobs:
+        return results
+
+    with ThreadPoolExecutor(max_workers=min(8, len(jobs))) as pool:
+        futures = {pool.submit(fetch_bing_images, mkt, idx, n): (mkt, idx) for mkt, idx, n in jobs}
+        for future, (mkt, idx) in futures.items():
+            try:
+                results[mkt].extend(future.result())
+            except Exception as e:
+                print(f"[WARN] 无法获取 {mkt} idx={idx} 的数据: {e}")
+    return results
+
+
+def image_key(img: dict):
+    """图片去重键：优先使用 hsh，缺失时使用去掉市场后缀的 urlbase"""
+    if img.get("hsh"):
+        return img["hsh"]
+    # /th?id=OHR.CheetahMound_ZH-CN1970221812 -> /th?id=OHR.CheetahMound
+    return re.sub(r"_[A-Za-z]{2}-[A-Za-z]{2}\d*$", "", img.get("urlbase", ""))
+
+
+def collect_market_variants(primary_img: dict, market_images: dict):
+    """
+    按图片去重合并多个市场同一天的壁纸
+    与主市场相同的图片复用 image.jpg，其余每张唯一图片只下载一次 (image_<市场>.jpg)
+    返回 (markets 元数据, [(文件名, 下载地址), ...])
+    """
+    start_date = primary_img.get("startdate")
+    files = {image_key(primary_img): "image.jpg"}
+    markets = {
+        PRIMARY_MARKET: {
+            "title": primary_img.get("title"),
+            "copyright": primary_img.get("copyright"),
+            "hsh": primary_img.get("hsh"),
+            "image": "image.jpg"
+        }
+    }
+    downloads = []
+
+    for mkt, images in market_images.items():
+        img = next((i for i in images if i.get("startdate") == start_date), None)
+        if not img or mkt == PRIMARY_MARKET:
+            continue
+
+        key = image_key(img)
+        if key not in files:
+            files[key] = f"image_{mkt}.jpg"
+            downloads.append((files[key], BING_BASE + img["url"]))
+
+        markets[mkt] = {
+            "title": img.get("title"),
+            "copyright": img.get("copyright"),
+            "hsh": img.get("hsh"),
+            "image": files[key]
+        }
+
+    return markets, downloads
+
+
+def download_market_variants(base_dir: Path, downloads):
+    """并发下载其他市场的唯一图片，本地已有或已分层到对象存储的文件跳过，返回新下载的文件列表"""
+    from src.storage import has_original
+    pending = [(name, url) for name, url in downloads if not has_original(base_dir, name)]
+    if not pending:
+        return []
+
+    with ThreadPoolExecutor(max_workers=min(4, len(pending))) as pool:
+        futures = {pool.submit(download_image, url, base_dir / name): name for name, url in pending}
+        done = []
+        for future, name in futures.items():
+            try:
+                future.result()
+                done.append(name)
+            except Exception as e:
+                print(f"[WARN] 市场图片下载失败 {name}: {e}")
+    return done
 
 
 def download_image(url: str, save_path: Path):
-    """下载图片到指定路径"""
-    r = requests.get(url, timeout=30)
-    r.raise_for_status()
-    save_path.write_bytes(r.content)
+    """
+    下载图片到指定路径（原子写入，中断时不会留下半截文件；失败重试，慢请求对冲）
+    服务器支持 Range 且文件较大时分段并行下载，见 src/download.py
+    """
+    from src.download import download_file
+    download_file(url, save_path)
+
+
+def resize_image(image_path: Path, save_path: Path, size=THUMB_SIZE, fmt: str = "JPEG", quality: int = 85):
+    """按比例缩放到 size 以内（不放大）并原子写入；缩略图与按需缩放服务 (scripts/serve.py) 共用"""
+    from PIL import Image
+    with Image.open(image_path) as img:
+        img.thumbnail(size, Image.Resampling.LANCZOS)
+        if fmt == "JPEG" and img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+        # atomic_output 会确保目录存在 (为了 batch_fetch)
+        with atomic_output(save_path) as tmp_path:
+            img.save(tmp_path, fmt, quality=quality)
 
 
 def generate_thumbnail(image_path: Path, thumb_path: Path):
     """生成缩略图"""
-    with Image.open(image_path) as img:
-        img.thumbnail(THUMB_SIZE, Image.Resampling.LANCZOS)
-        # 确保目录存在 (为了 batch_fetch)
-        thumb_path.parent.mkdir(parents=True, exist_ok=True)
-        img.save(thumb_path, "JPEG", quality=85)
+    resize_image(image_path, thumb_path, THUMB_SIZE)
 
 
-def generate_story(title, copyright, image_path: Path):
-    """通过支持视觉的 LLM 生成壁纸背景故事"""
-    api_key = os.environ.get("LLM_API_KEY")
-    base_url = os.environ.get("LLM_BASE_URL", "https://api.openai.com/v1")
-    model_name = os.environ.get("LLM_MODEL_NAME", "gpt-4o") # 默认尝试视觉模型
-    
-    if not api_key:
-        return None
+def generate_story(title, copyright, image_path: Path, partial_path: Path = None, on_first_token=None,
+                   entry_dir: Path = None):
+    """
+    生成壁纸背景故事，返回主输出 (story.md) 的 Markdown；生成失败或未配置 LLM 时返回 None
+    一次视觉调用得到画面分析（缓存为条目目录下的 analysis.json），再以纯文本调用并发生成
+    story.outputs 配置的各语言 / 风格输出，其他输出直接写入条目目录（见 src/story_pipeline.py）
+    主输出流式写入 .story.partial.md，中途失败时本次或下次调用从中断处续写；
+    on_first_token 在主输出开始输出时回调（最多一次）。entry_dir 默认为原图所在目录
+    """
+    from src.story_pipeline import generate_outputs, get_outputs
 
-    # 从外部文件加载提示词
-    prompt_file = Path(os.environ.get("STORY_PROMPT_FILE", "prompts/story_prompt.txt"))
-    if prompt_file.exists():
-        system_prompt = prompt_file.read_text(encoding="utf-8").strip()
-    else:
-        system_prompt =  "你是一位地理与文化深度旅行作家。请结合提供的图片内容、标题和背景信息，写一篇约 500 字的精美短文。要求：\n1. 直接输出 Markdown 正文，不要包含“好的”、“这是一篇...”等开头或结尾的客套话。\n2. 标题使用一级标题 (# Title)。\n3. 内容要包含对画面视觉细节（光影、色彩、构图）的细腻描写，并自然引出背后的地理文化故事。\n4. 语言风格优美、感性且富有深度。"
-    
     print(f"[INFO] 正在为 '{title}' 生成视觉深度故事...")
     try:
-        # 读取图片并编码为 base64
-        with open(image_path, "rb") as image_file:
-            base64_image = base64.b64encode(image_file.read()).decode('utf-8')
-
-        headers = {
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json"
-        }
-        
-        payload = {
-            "model": model_name,
-            "messages": [
-                {
-                    "role": "system", 
-                    "content": system_prompt
-                },
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "text",
-                            "text": f"题目：{title}\n背景项：{copyright}\n请结合这张图片进行创作。"
-                        },
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:image/jpeg;base64,{base64_image}"
-                            }
-                        }
-                    ]
-                }
-            ],
-            "max_tokens": 1000
-        }
-        resp = requests.post(f"{base_url}/chat/completions", headers=headers, json=payload, timeout=90)
-        resp.raise_for_status()
-        result = resp.json()
-        story_text = result["choices"][0]["message"]["content"]
-        
-        # 在文章头部插入原图展示（根据图片文件名动态调整）
-        image_filename = image_path.name  # 获取实际文件名
-        final_content = f"![{title}]({image_filename})\n\n{story_text}"
-        return final_content
+        results = generate_outputs(entry_dir or Path(image_path).parent, title, copyright, image_path,
+                                   on_first_token=on_first_token, partial_path=partial_path)
+        return results[get_outputs()[0]["name"]]
     except Exception as e:
         print(f"[WARN] 视觉故事生成失败: {e}")
         return None
 
 
-def push_to_wecom(webhook_url: str, image_path: Path, meta: dict, story_content: str = None, source_name: str = "Bing"):
-    """推送图片、消息和故事到企业微信处理核心"""
+def push_to_wecom(webhook_url: str, image_path: Path, meta: dict, story_content: str = None,
+                  source_name: str = "Bing", include_preview: bool = True, after: dict = None,
+                  wait: bool = True):
+    """
+    推送图片、消息和故事到企业微信处理核心
+    webhook_url 可包含多个群（逗号或换行分隔）：每条消息只构建一次，并发推送到所有群
+    include_preview=False 时只推送故事（图片与元数据已由 WecomPreview 提前推送）；
+    after / wait 的含义同 src.utils.fan_out_to_wecom
+    """
+    from src.utils import fan_out_to_wecom, image_payload, markdown_payload, story_payload
     try:
-        # 1. 发送图片
-        send_image_to_wecom(webhook_url, str(image_path))
-        print("[OK] 企业微信图片推送成功")
+        messages = []
+        if include_preview:
+            # 1. 图片  2. markdown 消息（元数据）
+            messages.append(("图片", image_payload(str(image_path))))
+            messages.append(("消息", markdown_payload(meta, source_name=source_name)))
 
-        # 2. 发送 markdown 消息（元数据）
-        send_markdown_to_wecom(webhook_url, meta, source_name=source_name)
-        print("[OK] 企业微信消息推送成功")
-        
-        # 3. 发送故事内容（如果存在）
+        # 3. 故事内容（如果存在）
         if story_content:
-            send_story_to_wecom(webhook_url, meta, story_content)
-            print("[OK] 企业微信故事推送成功")
+            messages.append(("故事", story_payload(meta, story_content)))
+        return fan_out_to_wecom(webhook_url, messages, after=after, wait=wait)
     except Exception as e:
         print(f"[WARN] 企业微信推送失败: {e}")
 
 
+class WecomPreview:
+    """
+    企业微信预览（图片 + 元数据）：故事开始输出时即在后台推送，不必等整篇生成完毕；
+    故事生成完成（或未生成）后由 finish() 补发故事或完整推送
+    """
+
+    def __init__(self, webhook_url: str, image_path: Path, meta: dict, source_name: str = "Bing"):
+        self.webhook_url = webhook_url
+        self.image_path = image_path
+        self.meta = meta
+        self.source_name = source_name
+        self.pending = None  # 各群的预览推送任务
+
+    def start(self):
+        """作为 generate_story 的 on_first_token 回调"""
+        if self.webhook_url and self.pending is None:
+            self.pending = push_to_wecom(self.webhook_url, self.image_path, self.meta,
+                                         source_name=self.source_name, wait=False) or {}
+
+    def finish(self, meta: dict, story_content: str = None):
+        if not self.webhook_url:
+            print("[INFO] WEWORK_WEBHOOK 未配置，跳过推送")
+            return
+        # 各群在自己的预览发完后立即补发故事，慢群不拖累其他群
+        push_to_wecom(self.webhook_url, self.image_path, meta, story_content, source_name=self.source_name,
+                      include_preview=self.pending is None, after=self.pending)
+
+
 def main():
     # 解析命令行参数
     parser = argparse.ArgumentParser(description='抓取必应每日壁纸')
     parser.add_argument('--skip-story', action='store_true', help='跳过 AI 故事生成（快速模式）')
+    parser.add_argument('--markets', help='附加市场列表，逗号分隔（默认读取 config/sources.yaml）')
+    parser.add_argument('--daemon', action='store_true',
+                        help='常驻模式：按学习到的发布时刻轮询，有新内容时立即抓取（见 src/daemon.py）')
+    parser.add_argument('--health-file', default='.cache/daemon_health.json', help='常驻模式的健康文件路径')
+    profiling.add_arguments(parser)
     args = parser.parse_args()
     
     load_env()
-
+    profiling.start(args, "fetch_bing")
+    try:
+        if args.daemon:
+            from src.daemon import run_daemon
+            run_daemon(args)
+        else:
+            run(args)
+    finally:
+        profiling.finish()
+
+
+def run(args) -> bool:
+    """执行一次抓取流程；归档了新条目时返回 True（常驻模式在进程内重复调用）"""
+    profiling.stage("metadata")
     # 1. 获取元数据（尝试今天，如果不存在则使用昨天）
     print(f"[INFO] 正在获取必应壁纸...")
     
     for idx in [0, 1]:  # 0=今天, 1=昨天
-        params = {
-            "format": "js",
-            "idx": idx,
-            "n": 1,
-            "mkt": "zh-CN"
-        }
-        resp = requests.get(BING_API, params=params, timeout=10)
-        resp.raise_for_status()
-        data = resp.json()
-        meta = data["images"][0]
+        meta = fetch_bing_images(PRIMARY_MARKET, idx=idx)[0]
         
         # 使用 API 返回的日期作为文件夹名
         today = get_date_from_meta(meta)
         base_dir = Path("docs/wallpapers/bing") / today
         
-        # 如果该日期的壁纸已存在，跳过
-        if base_dir.exists() and (base_dir / "image.jpg").exists():
+        # 如果该日期的壁纸已完整归档，跳过；下载后中断的条目则从断点继续
+        if is_entry_complete(base_dir):
             if idx == 0:
                 print(f"[INFO] {today} 的壁纸已存在，不再重复下载。")
-                return
+                return False
             else:
                 continue  # 尝试下一个
         
@@ -200,70 +309,109 @@ def main():
         break
     
     base_dir.mkdir(parents=True, exist_ok=True)
+    checkpoint = load_checkpoint(base_dir)
+    if checkpoint["stages"]:
+        print(f"[INFO] 检测到未完成的条目，从断点继续（已完成: {', '.join(checkpoint['stages'])}）")
 
-    # 2. 下载原图
+    profiling.stage("download")
+    # 2. 下载原图（原子写入，已存在即为完整文件）
     image_url = BING_BASE + meta["url"]
     image_path = base_dir / "image.jpg"
-    download_image(image_url, image_path)
-    print(f"[OK] 壁纸已下载: {image_path} ({meta.get('title')})")
-
+    if not image_path.exists():
+        download_image(image_url, image_path)
+        print(f"[OK] 壁纸已下载: {image_path} ({meta.get('title')})")
+    mark_stage(base_dir, "image", url=image_url)
+
+    profiling.stage("markets")
+    # 2.1 多市场模式：并发查询附加市场，按 hsh 去重后只下载唯一图片
+    extra_markets = args.markets.split(",") if args.markets else get_extra_markets()
+    meta_draft = {
+        "date": today,
+        "title": meta.get("title"),
+        "copyright": meta.get("copyright"),
+        "image_url": image_url
+    }
+    if extra_markets:
+        market_images = fetch_market_images(extra_markets)
+        markets_info, variant_downloads = collect_market_variants(meta, market_images)
+        downloaded = download_market_variants(base_dir, variant_downloads)
+        meta_draft["markets"] = markets_info
+        print(f"[OK] 多市场查询完成: {len(markets_info)} 个市场，新增唯一图片 {len(downloaded)} 张")
+
+    profiling.stage("recompress")
+    # 2.2 可选：原图无损重压缩（像素不变，不影响缩略图和故事）
+    from src.recompress import apply_recompress
+    apply_recompress(base_dir)
+    # 元数据草稿先写入断点状态，后续阶段中断时可据此补全 meta.json
+    update_checkpoint(base_dir, meta=meta_draft)
+
+    profiling.stage("thumbnail")
     # 3. 生成缩略图
     thumb_path = base_dir / "thumb.jpg"
-    generate_thumbnail(image_path, thumb_path)
-    print(f"[OK] 缩略图已生成: {thumb_path}")
-
-    # 4. 生成 AI 故事 (带视觉) - 可选
-    story_content = None
-    if not args.skip_story:
-        story_content = generate_story(meta.get("title"), meta.get("copyright"), image_path)
+    if not thumb_path.exists():
+        generate_thumbnail(image_path, thumb_path)
+        print(f"[OK] 缩略图已生成: {thumb_path}")
+    mark_stage(base_dir, "thumb", source_bytes=image_path.stat().st_size)
+
+    profiling.stage("palette")
+    # 3.1 基于缩略图提取主色调与平均亮度
+    from src.palette import describe_colors
+    meta_draft.update(describe_colors(thumb_path))
+    update_checkpoint(base_dir, meta=meta_draft)
+
+    profiling.stage("story")
+    # 4. 生成 AI 故事 (带视觉) - 可选；故事开始输出时即推送企业微信预览
+    preview = WecomPreview(os.environ.get("WEWORK_WEBHOOK"), image_path, meta_draft, source_name="Bing")
+    story_path = base_dir / "story.md"
+    story_content = story_path.read_text(encoding="utf-8") if story_path.exists() else None
+    if story_content:
+        print(f"[INFO] 故事已存在，跳过生成")
+    elif not args.skip_story:
+        story_content = generate_story(meta.get("title"), meta.get("copyright"), image_path,
+                                       on_first_token=preview.start)
         if story_content:
-            (base_dir / "story.md").write_text(story_content, encoding="utf-8")
-            print(f"[OK] AI 故事已生成: {base_dir / 'story.md'}")
+            atomic_write_text(story_path, story_content)
+            mark_stage(base_dir, "story")
+            print(f"[OK] AI 故事已生成: {story_path}")
     else:
         print(f"[INFO] 跳过故事生成（使用 --skip-story）")
 
+    profiling.stage("meta")
     # 5. 保存元数据
     meta_path = base_dir / "meta.json"
-    meta_info = {
-        "date": today,
-        "title": meta.get("title"),
-        "copyright": meta.get("copyright"),
-        "image_url": image_url,
-        "has_story": bool(story_content)
-    }
-    meta_path.write_text(
-        json.dumps(meta_info, ensure_ascii=False, indent=2),
-        encoding="utf-8"
-    )
+    meta_info = write_meta(base_dir, {**meta_draft, "has_story": bool(story_content)})
+    mark_stage(base_dir, "meta")
     print(f"[OK] 元数据已保存: {meta_path}")
 
-    # 6. 更新 README
-    update_readme()
-    print("[OK] README.md 已更新")
+    profiling.stage("push")
+    # 6. 推送企业微信（预览已提前发出时只补发故事）
+    preview.finish(meta_info, story_content)
 
-    # 7. 更新 Gallery
-    update_gallery()
-    print("[OK] docs/index.html 已更新")
+    profiling.stage("cos")
+    # 7. 分发到腾讯云 COS (可选)
+    upload_entry_to_cos(base_dir)
 
-    # 8. 推送企业微信
-    webhook_url = os.environ.get("WEWORK_WEBHOOK")
-    if webhook_url:
-        push_to_wecom(webhook_url, image_path, meta_info, story_content, source_name="Bing")
-    else:
-        print("[INFO] WEWORK_WEBHOOK 未配置，跳过推送")
+    # 8. 存储分层：原图迁移到对象存储，仓库内只保留缩略图和元数据 (可选)
+    from src.storage import apply_storage_tier
+    apply_storage_tier(base_dir)
 
-    # 9. 分发到腾讯云 COS (可选)
-    from src.utils import upload_to_cos
-    cos_base_path = f"wallpapers/bing/{today}"
-    upload_to_cos(str(image_path), f"{cos_base_path}/image.jpg")
-    upload_to_cos(str(thumb_path), f"{cos_base_path}/thumb.jpg")
-    if story_content:
-        # 创建临时文件上传 story
-        story_path = base_dir / "story.md"
-        upload_to_cos(str(story_path), f"{cos_base_path}/story.md")
-    upload_to_cos(str(meta_path), f"{cos_base_path}/meta.json")
+    profiling.stage("readme")
+    # 9. 更新 README
+    from src.update_readme import update_readme
+    from src.update_gallery import update_gallery
+    update_readme()
+
+    # 10. 更新 Gallery
+    update_gallery()
 
+    profiling.stage("summary")
+    log_write_summary()
+    resilience.log_summary()
+    from src import llm_router, llm_usage
+    llm_router.log_summary()
+    llm_usage.log_summary()
     print(f"\n✅ 完成！壁纸已归档至 {base_dir}")
+    return True
 
 
 if __name__ == "__main__":
@@ -7,23 +7,24 @@ Unsplash 每日壁纸抓取脚本
 import argparse
 
 import os
-import json
-import base64
-import requests
 from datetime import datetime, timezone
 from pathlib import Path
-from PIL import Image
+from urllib.parse import urlencode
 
-# 复用主脚本的函数
+# 复用主脚本的函数（重依赖在各阶段内按需导入，见 fetch_bing_wallpaper）
 import sys
 sys.path.insert(0, str(Path(__file__).parent))
-from fetch_bing_wallpaper import generate_thumbnail, generate_story, load_env
-from src.utils import send_image_to_wecom, send_markdown_to_wecom, send_story_to_wecom
-from src.update_readme import update_readme
-from src.update_gallery import update_gallery
+from fetch_bing_wallpaper import WecomPreview, generate_thumbnail, generate_story, load_env, download_image
+from src import profiling, resilience
+from src.archive import (
+    atomic_write_text, log_write_summary, write_meta,
+    load_checkpoint, update_checkpoint, mark_stage, is_entry_complete, upload_entry_to_cos
+)
 
 
-UNSPLASH_API = "https://api.unsplash.com/photos/random"
+# UNSPLASH_API_BASE 可指向本地替身服务 (scripts/stub_services.py)
+UNSPLASH_API = os.environ.get("UNSPLASH_API_BASE", "https://api.unsplash.com").rstrip("/") + "/photos/random"
+DEFAULT_SIZE_POLICY = {"width": 3840, "quality": 85, "format": "jpg"}
 
 
 def fetch_unsplash_photo():
@@ -43,114 +44,191 @@ def fetch_unsplash_photo():
     }
     
     try:
-        resp = requests.get(UNSPLASH_API, headers=headers, params=params, timeout=10)
-        resp.raise_for_status()
+        resp = resilience.get(UNSPLASH_API, headers=headers, params=params, timeout=10, label="Unsplash API")
         return resp.json()
     except Exception as e:
         print(f"[ERROR] Unsplash API 请求失败: {e}")
         return None
 
 
-def download_image(url: str, save_path: Path):
-    """下载图片"""
-    r = requests.get(url, timeout=30)
-    r.raise_for_status()
-    save_path.write_bytes(r.content)
+def get_size_policy():
+    """读取 Unsplash 下载尺寸策略 (config/sources.yaml 中的 size_policy)"""
+    from src.config_loader import get_source_config
+    policy = dict(DEFAULT_SIZE_POLICY)
+    policy.update(get_source_config("unsplash").get("size_policy") or {})
+    return policy
+
+
+def select_image_url(photo: dict, policy: dict = None):
+    """
+    按尺寸策略选择下载地址
+    通过 urls.raw 附加 w/q/fm 参数让 Unsplash 服务端缩放，原图更窄时不放大
+    实际尺寸在下载后由 describe_image 读取
+    """
+    policy = policy or get_size_policy()
+    urls = photo.get("urls", {})
+    target_w = int(policy.get("width") or 0)
+
+    if not urls.get("raw") or target_w <= 0:
+        return urls["full"]
+
+    if photo.get("width"):
+        target_w = min(target_w, photo["width"])
+
+    params = {
+        "w": target_w,
+        "q": policy.get("quality", 85),
+        "fm": policy.get("format", "jpg"),
+        "fit": "max",
+    }
+    separator = "&" if "?" in urls["raw"] else "?"
+    return f"{urls['raw']}{separator}{urlencode(params)}"
+
+
+def describe_image(image_path: Path):
+    """读取已下载图片的实际尺寸与字节数，用于写入 meta.json"""
+    from PIL import Image
+    with Image.open(image_path) as img:
+        width, height = img.size
+    return {"width": width, "height": height, "bytes": image_path.stat().st_size}
+
+
+def build_photo_meta(photo: dict, date_str: str, image_path: Path):
+    """由 Unsplash 照片数据和已下载的图片构建元数据（不含 has_story）"""
+    author = photo.get("user", {}).get("name", "Unknown")
+    return {
+        "date": date_str,
+        "title": photo.get("description") or photo.get("alt_description") or "Unsplash Featured Photo",
+        "copyright": f"Photo by {author} on Unsplash",
+        "image_url": photo["links"]["html"],
+        "photographer": author,
+        **describe_image(image_path)
+    }
 
 
 def main():
     # 解析命令行参数
     parser = argparse.ArgumentParser(description='抓取 Unsplash 精选壁纸')
     parser.add_argument('--skip-story', action='store_true', help='跳过 AI 故事生成（快速模式）')
+    profiling.add_arguments(parser)
     args = parser.parse_args()
     
     load_env()
-    
-    # 1. 获取照片
-    print("[INFO] 正在获取 Unsplash 精选照片...")
-    photo = fetch_unsplash_photo()
-    
-    if not photo:
-        return
-    
-    # 使用今天的日期
+    profiling.start(args, "fetch_unsplash")
+    try:
+        run(args)
+    finally:
+        profiling.finish()
+
+
+def run(args) -> bool:
+    """执行一次抓取流程；归档了新条目时返回 True（必应常驻模式在进程内按日调用）"""
+    profiling.stage("metadata")
+    # 使用今天的日期；已存在时直接退出，不消耗 API 配额
     today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
     base_dir = Path("docs/wallpapers/unsplash") / today
     
-    if base_dir.exists() and (base_dir / "image.jpg").exists():
+    if is_entry_complete(base_dir):
         print(f"[INFO] {today} 的 Unsplash 壁纸已存在")
-        return
-    
-    base_dir.mkdir(parents=True, exist_ok=True)
+        return False
     
-    # 2. 下载原图
-    image_url = photo["urls"]["full"]  # 使用全尺寸图片
+    # 下载后中断的条目：从断点状态中的元数据草稿继续，不再重新抓取
     image_path = base_dir / "image.jpg"
-    download_image(image_url, image_path)
-    print(f"[OK] Unsplash 照片已下载: {photo.get('description', 'Untitled')}")
+    meta_draft = load_checkpoint(base_dir).get("meta") if image_path.exists() else None
+    if meta_draft:
+        print(f"[INFO] 检测到未完成的条目，从断点继续: {meta_draft['title']}")
+    else:
+        # 1. 获取照片
+        print("[INFO] 正在获取 Unsplash 精选照片...")
+        photo = fetch_unsplash_photo()
+        
+        if not photo:
+            return False
+        
+        base_dir.mkdir(parents=True, exist_ok=True)
+        
+        profiling.stage("download")
+        # 2. 下载原图
+        image_url = select_image_url(photo)  # 按尺寸策略选择服务端缩放版本
+        download_image(image_url, image_path)
+        meta_draft = build_photo_meta(photo, today, image_path)
+        mark_stage(base_dir, "image", url=image_url)
+        update_checkpoint(base_dir, meta=meta_draft)
+        print(f"[OK] Unsplash 照片已下载: {meta_draft['title']} "
+              f"({meta_draft['width']}x{meta_draft['height']}, {meta_draft['bytes'] // 1024} KB)")
+
+    profiling.stage("recompress")
+    # 2.1 可选：原图无损重压缩（像素不变，只需更新记录的大小）
+    from src.recompress import apply_recompress
+    if apply_recompress(base_dir):
+        meta_draft["bytes"] = image_path.stat().st_size
     
+    profiling.stage("thumbnail")
     # 3. 生成缩略图
     thumb_path = base_dir / "thumb.jpg"
-    generate_thumbnail(image_path, thumb_path)
-    print(f"[OK] 缩略图已生成")
-    
-    # 4. 生成 AI 故事 - 可选
-    title = photo.get("description") or photo.get("alt_description") or "Unsplash Featured Photo"
-    author = photo.get("user", {}).get("name", "Unknown")
-    copyright_info = f"Photo by {author} on Unsplash"
-    
-    story_content = None
-    if not args.skip_story:
-        story_content = generate_story(title, copyright_info, image_path)
+    if not thumb_path.exists():
+        generate_thumbnail(image_path, thumb_path)
+        print(f"[OK] 缩略图已生成")
+    mark_stage(base_dir, "thumb", source_bytes=image_path.stat().st_size)
+    
+    profiling.stage("palette")
+    # 3.1 基于缩略图提取主色调与平均亮度
+    from src.palette import describe_colors
+    meta_draft.update(describe_colors(thumb_path))
+    update_checkpoint(base_dir, meta=meta_draft)
+    
+    profiling.stage("story")
+    # 4. 生成 AI 故事 - 可选；故事开始输出时即推送企业微信预览
+    preview = WecomPreview(os.environ.get("WEWORK_WEBHOOK"), image_path, meta_draft, source_name="Unsplash")
+    story_path = base_dir / "story.md"
+    story_content = story_path.read_text(encoding="utf-8") if story_path.exists() else None
+    if story_content:
+        print(f"[INFO] 故事已存在，跳过生成")
+    elif not args.skip_story:
+        story_content = generate_story(meta_draft["title"], meta_draft["copyright"], image_path,
+                                       on_first_token=preview.start)
         if story_content:
-            (base_dir / "story.md").write_text(story_content, encoding="utf-8")
+            atomic_write_text(story_path, story_content)
+            mark_stage(base_dir, "story")
             print(f"[OK] AI 故事已生成")
     else:
         print(f"[INFO] 跳过故事生成（使用 --skip-story）")
     
+    profiling.stage("meta")
     # 5. 保存元数据
-    meta_path = base_dir / "meta.json"
-    meta_info = {
-        "date": today,
-        "title": title,
-        "copyright": copyright_info,
-        "image_url": photo["links"]["html"],
-        "photographer": author,
-        "has_story": bool(story_content)
-    }
-    meta_path.write_text(json.dumps(meta_info, ensure_ascii=False, indent=2), encoding="utf-8")
+    meta_info = write_meta(base_dir, {**meta_draft, "has_story": bool(story_content)})
+    mark_stage(base_dir, "meta")
     print(f"[OK] 元数据已保存")
     
-    # 6. 更新 README
-    update_readme()
-    print("[OK] README.md 已更新")
+    profiling.stage("push")
+    # 6. 推送企业微信（可选；预览已提前发出时只补发故事）
+    preview.finish(meta_info, story_content)
     
-    # 7. 更新 Gallery
-    update_gallery()
-    print("[OK] docs/index.html 已更新")
+    profiling.stage("cos")
+    # 7. 分发到腾讯云 COS (可选)
+    upload_entry_to_cos(base_dir)
     
-    # 8. 推送企业微信（可选）
-    webhook_url = os.environ.get("WEWORK_WEBHOOK")
-    if webhook_url:
-        try:
-            send_image_to_wecom(webhook_url, str(image_path))
-            send_markdown_to_wecom(webhook_url, meta_info, source_name="Unsplash")
-            if story_content:
-                send_story_to_wecom(webhook_url, meta_info, story_content)
-            print("[OK] Unsplash 企业微信推送成功")
-        except Exception as e:
-            print(f"[WARN] Unsplash 企业微信推送失败: {e}")
-    
-    # 9. 分发到腾讯云 COS (可选)
-    from src.utils import upload_to_cos
-    cos_base_path = f"wallpapers/unsplash/{today}"
-    upload_to_cos(str(image_path), f"{cos_base_path}/image.jpg")
-    upload_to_cos(str(thumb_path), f"{cos_base_path}/thumb.jpg")
-    if story_content:
-        upload_to_cos(str(base_dir / "story.md"), f"{cos_base_path}/story.md")
-    upload_to_cos(str(meta_path), f"{cos_base_path}/meta.json")
+    # 8. 存储分层：原图迁移到对象存储，仓库内只保留缩略图和元数据 (可选)
+    from src.storage import apply_storage_tier
+    apply_storage_tier(base_dir)
+
+    profiling.stage("readme")
+    # 9. 更新 README
+    from src.update_readme import update_readme
+    from src.update_gallery import update_gallery
+    update_readme()
     
+    # 10. 更新 Gallery
+    update_gallery()
+
+    profiling.stage("summary")
+    log_write_summary()
+    resilience.log_summary()
+    from src import llm_router, llm_usage
+    llm_router.log_summary()
+    llm_usage.log_summary()
     print(f"\n✅ 完成！Unsplash 壁纸已归档至 {base_dir}")
+    return True
 
 
 if __name__ == "__main__":
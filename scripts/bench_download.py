@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+分段下载基准测试：启动本地替身服务 (scripts/stub_services.py)，按单连接限速模拟远端带宽，
+对比不同分段数下载同一张大图的耗时与吞吐，并校验下载结果与源文件逐字节一致；
+最后关闭替身服务的 Range 支持，确认自动回退到单连接下载
+
+用法:
+  python scripts/bench_download.py                               # 6000x4000，单连接 2048KB/s
+  python scripts/bench_download.py --stream-kbps 512 --segments 1 4 8
+  python scripts/bench_download.py --latency-ms 80 --runs 3
+"""
+
+import argparse
+import hashlib
+import shutil
+import statistics
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT))
+from scripts.stub_services import build_faults, parse_size, start_server
+from src.download import download_file
+
+
+def bench(url: str, workdir: Path, segments: int, min_segment: int, runs: int, expected: str) -> dict:
+    """以指定分段数下载 runs 次，返回耗时中位数；内容与源文件不一致时抛出 AssertionError"""
+    seconds = []
+    for i in range(runs):
+        save_path = workdir / f"s{segments}-{i}.jpg"
+        result = download_file(url, save_path, segments=segments, min_segment=min_segment)
+        digest = hashlib.sha256(save_path.read_bytes()).hexdigest()
+        assert digest == expected, f"{segments} 段下载结果与源文件不一致"
+        seconds.append(result["seconds"])
+        save_path.unlink()
+    return {"requested": segments, "mode": result["mode"], "segments": result["segments"], "bytes": result["bytes"],
+            "seconds": statistics.median(seconds)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="分段下载基准测试")
+    parser.add_argument("--image-size", default="6000x4000", help="替身大图尺寸")
+    parser.add_argument("--stream-kbps", type=float, default=2048, help="替身服务单连接带宽 (KB/s)")
+    parser.add_argument("--latency-ms", type=float, default=0, help="每个请求的固定延迟")
+    parser.add_argument("--segments", type=int, nargs="+", default=[1, 2, 4, 8], help="对比的分段数")
+    parser.add_argument("--min-segment-kb", type=int, default=256, help="每段最小大小")
+    parser.add_argument("--runs", type=int, default=1, help="每种分段数的下载次数（取中位数）")
+    args = parser.parse_args()
+
+    faults = build_faults(latency_ms=args.latency_ms)
+    server, base_url = start_server(faults=faults, image_size=parse_size(args.image_size),
+                                    stream_kbps=args.stream_kbps)
+    url = f"{base_url}/th?id=OHR.Bench_1920x1080.jpg"
+    expected = hashlib.sha256(server.state.image).hexdigest()
+    workdir = Path(tempfile.mkdtemp(prefix="wallpaper-download-"))
+    min_segment = args.min_segment_kb * 1024
+    size_mb = len(server.state.image) / 1024 / 1024
+    print(f"🧪 替身服务: {base_url}，图片 {args.image_size} ({size_mb:.1f}MB)，单连接 {args.stream_kbps:.0f}KB/s")
+
+    try:
+        results = [bench(url, workdir, n, min_segment, args.runs, expected) for n in args.segments]
+        server.state.ranges = False
+        fallback = bench(url, workdir, max(args.segments), min_segment, 1, expected)
+    finally:
+        server.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    baseline = results[0]["seconds"]
+    fallback["requested"] = f"{fallback['requested']} (无 Range)"
+    print(f"\n{'分段数':<14}{'模式':<12}{'实际段数':>8}{'耗时':>10}{'吞吐':>12}{'加速比':>8}")
+    for r in results + [fallback]:
+        mbps = r["bytes"] / 1024 / 1024 / r["seconds"]
+        print(f"{str(r['requested']):<14}{r['mode']:<12}{r['segments']:>8}"
+              f"{r['seconds']:>9.2f}s{mbps:>8.2f}MB/s{baseline / r['seconds']:>7.2f}x")
+    assert fallback["mode"] == "single", "服务器不支持 Range 时应回退为单连接下载"
+    print("\n✅ 所有下载结果与源文件一致；不支持 Range 时已回退单连接")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+启动耗时基准测试
+衡量「今日壁纸已存在」这条快速路径的真实开销：在临时工作目录中预先放好今天的完整条目，
+对着替身服务 (scripts/stub_services.py) 运行各抓取脚本的 main()，计时从导入入口模块开始、到 main() 返回为止
+（不含解释器自身与 site 的启动，它们与代码无关）
+- 每个抓取脚本的耗时（导入 + 快速路径）不得超过预算
+- 快速路径不得加载 Pillow、qcloud_cos、PyYAML、README/Gallery 更新器等重依赖（以 -X importtime 检查）
+
+用法:
+  python scripts/bench_startup.py                  # 默认预算 150ms，取 5 次最优
+  python scripts/bench_startup.py --budget-ms 200 --runs 10
+"""
+
+import argparse
+import shutil
+import subprocess
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT))
+from scripts.load_test import prepare_workspace, stub_env
+from scripts.stub_services import start_server
+
+# 快速路径上的入口脚本及其今日条目所在的源
+ENTRY_MODULES = {"fetch_bing_wallpaper": "bing", "fetch_unsplash_wallpaper": "unsplash"}
+
+# 快速路径上禁止出现的重依赖（按顶层模块名匹配）
+HEAVY_MODULES = [
+    "PIL",
+    "qcloud_cos",
+    "yaml",
+    "src.utils",
+    "src.update_readme",
+    "src.update_gallery",
+]
+
+# 在子进程中导入入口模块并执行 main()，最后一行输出导入与运行耗时（秒）
+DRIVER = """
+import sys, time
+sys.path.insert(0, {root!r})
+sys.argv = [{module!r}]
+started = time.perf_counter()
+import {module} as entry
+imported = time.perf_counter()
+entry.main()
+print(f"__bench__ {{imported - started:.6f}} {{time.perf_counter() - imported:.6f}}")
+"""
+
+
+def prepare_fast_path(workdir: Path):
+    """在工作目录中放好今天 (UTC) 的完整条目，抓取脚本会走「已存在」快速路径"""
+    today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+    for source in ENTRY_MODULES.values():
+        entry_dir = workdir / "docs/wallpapers" / source / today
+        entry_dir.mkdir(parents=True, exist_ok=True)
+        for name in ("image.jpg", "thumb.jpg", "meta.json"):
+            (entry_dir / name).write_bytes(b"{}" if name == "meta.json" else b"")
+
+
+def run_entry(module: str, workdir: Path, env: dict, importtime: bool = False):
+    """
+    运行一次入口脚本的快速路径
+    返回 (导入耗时 us, 运行耗时 us, {模块名: 累计导入耗时 us})；importtime=False 时模块表为空
+    """
+    command = [sys.executable] + (["-X", "importtime"] if importtime else [])
+    result = subprocess.run(
+        command + ["-c", DRIVER.format(root=str(ROOT), module=module)],
+        cwd=workdir,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    marker = [line for line in result.stdout.splitlines() if line.startswith("__bench__")]
+    if not marker:
+        raise RuntimeError(f"{module} 未走完快速路径:\n{result.stdout}")
+    import_s, run_s = (float(v) for v in marker[-1].split()[1:])
+
+    cumulative = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        # 格式: "import time: <self us> | <cumulative us> | <缩进+模块名>"
+        _, cum_us, name = line.split("|", 2)
+        cumulative[name.strip()] = int(cum_us.strip())
+    return import_s * 1e6, run_s * 1e6, cumulative
+
+
+def main():
+    parser = argparse.ArgumentParser(description="抓取脚本启动耗时基准测试")
+    parser.add_argument("--budget-ms", type=float, default=150.0, help="每个抓取脚本快速路径的耗时预算（毫秒）")
+    parser.add_argument("--runs", type=int, default=5, help="重复次数，取最优值以降低噪声")
+    parser.add_argument("--top", type=int, default=10, help="展示耗时最高的模块数量")
+    args = parser.parse_args()
+
+    server, base_url = start_server()
+    workdir = prepare_workspace()
+    prepare_fast_path(workdir)
+    env = stub_env(base_url)
+
+    ok = True
+    try:
+        for module in ENTRY_MODULES:
+            best = None
+            for _ in range(args.runs):
+                import_us, run_us, _ = run_entry(module, workdir, env)
+                if best is None or import_us + run_us < sum(best):
+                    best = (import_us, run_us)
+            # 模块明细与重依赖检查单独跑一次：-X importtime 本身有开销，不计入上面的耗时
+            _, _, detail = run_entry(module, workdir, env, importtime=True)
+            total_ms = sum(best) / 1000
+
+            print(f"📦 {module}")
+            print(f"⏱  快速路径耗时: {total_ms:.1f} ms（导入 {best[0] / 1000:.1f} ms + 运行 {best[1] / 1000:.1f} ms；"
+                  f"预算 {args.budget_ms:.0f} ms，{args.runs} 次取最优）")
+            print(f"耗时最高的 {args.top} 个模块（累计导入耗时，含 -X importtime 开销）:")
+            for name, cum_us in sorted(detail.items(), key=lambda x: x[1], reverse=True)[:args.top]:
+                print(f"  {cum_us / 1000:8.1f} ms  {name}")
+
+            loaded_heavy = [m for m in HEAVY_MODULES
+                            if any(name == m or name.startswith(m + ".") for name in detail)]
+            if loaded_heavy:
+                print(f"❌ 快速路径加载了重依赖: {', '.join(loaded_heavy)}")
+                ok = False
+            if total_ms > args.budget_ms:
+                print(f"❌ 快速路径耗时超出预算: {total_ms:.1f} ms > {args.budget_ms:.0f} ms")
+                ok = False
+            print()
+    finally:
+        server.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if ok:
+        print("✅ 启动耗时在预算内")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
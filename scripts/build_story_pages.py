@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+"""
+静态故事页 (src/story_pages.py)：把各条目的 story.md 渲染为 story.html
+按 story.md、meta.json 与页面模板的摘要增量构建，输出生成与跳过的页面数
+画廊渲染 (src/update_gallery.py) 会自动调用，这里用于单独重建或修改模板后全部重建
+
+用法:
+  python scripts/build_story_pages.py                 # 所有源，只重建新增或变化的条目
+  python scripts/build_story_pages.py --source bing
+  python scripts/build_story_pages.py --force         # 忽略摘要，全部重建
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from src.story_pages import build_story_pages, describe
+
+
+def main():
+    parser = argparse.ArgumentParser(description="生成静态故事页")
+    parser.add_argument("--source", action="append", help="只处理指定源（可重复）")
+    parser.add_argument("--force", action="store_true", help="忽略页面摘要，全部重建")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    counts = build_story_pages(args.source, args.force)
+    print(f"✅ {describe(counts)}，耗时 {time.perf_counter() - started:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
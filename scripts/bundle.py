@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+按月打包归档 (src/bundle.py)：每个源每月一个 tar.zst / zip，写入 dist/bundles/<源>/，清单写入 data/bundles/<源>/
+成员未变化的月份跳过；--upload 时把新构建（或尚未上传）的包上传到对象存储
+
+用法:
+  python scripts/bundle.py                                 # 所有源、所有月份
+  python scripts/bundle.py --month 2025-10 --upload        # 指定月份并上传
+  python scripts/bundle.py --source bing --format zip --force
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+import fetch_bing_wallpaper
+from src.archive import WALLPAPERS_BASE
+from src.bundle import FORMATS, HashCache, build_bundle, describe, list_months, upload_bundle
+
+
+def main():
+    parser = argparse.ArgumentParser(description="按月打包归档")
+    parser.add_argument("--source", action="append", help="只打包指定源（可重复）")
+    parser.add_argument("--month", action="append", help="只打包指定月份 YYYY-MM（可重复）")
+    parser.add_argument("--format", choices=FORMATS, help="覆盖配置中的打包格式")
+    parser.add_argument("--level", type=int, help="压缩级别")
+    parser.add_argument("--out", help="输出目录（默认读取配置，dist/bundles）")
+    parser.add_argument("--force", action="store_true", help="忽略清单，全部重新构建")
+    parser.add_argument("--upload", action="store_true", help="上传新构建或尚未上传的包")
+    args = parser.parse_args()
+
+    fetch_bing_wallpaper.load_env()
+    sources = args.source or sorted(p.name for p in WALLPAPERS_BASE.iterdir()
+                                    if p.is_dir() and not p.name.startswith("."))
+    hashes = HashCache()
+    started = time.perf_counter()
+    built, skipped, uploaded, failed = [], 0, 0, 0
+
+    for source in sources:
+        for month in args.month or list_months(source):
+            manifest = build_bundle(source, month, args.format, args.level, args.out, args.force, hashes)
+            if manifest is None:
+                continue
+            if manifest["rebuilt"]:
+                built.append(manifest)
+                print(f"[OK] {describe(manifest)}")
+            else:
+                skipped += 1
+                print(f"[INFO] {manifest['file']} 成员未变化，跳过")
+            if args.upload and (manifest.get("uploaded") or {}).get("sha256") != manifest["sha256"]:
+                url = upload_bundle(manifest, args.out)
+                if url is not None:
+                    uploaded += 1
+                    print(f"[OK] 已上传: {url or manifest['file']}")
+                else:
+                    failed += 1
+
+    total_in = sum(m["input_bytes"] for m in built) / 1024 / 1024
+    total_out = sum(m["bytes"] for m in built) / 1024 / 1024
+    print(f"\n📦 构建 {len(built)} 个包 ({total_in:.1f}MB -> {total_out:.1f}MB)，跳过 {skipped} 个，"
+          f"上传 {uploaded} 个，耗时 {time.perf_counter() - started:.2f}s")
+    if failed:
+        print(f"[ERROR] {failed} 个包上传失败")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
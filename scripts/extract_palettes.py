@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+批量提取主色调：为归档中缺少 palette / luminance 的条目补全 meta.json
+基于 thumb.jpg 计算，多进程并行
+
+用法:
+  python scripts/extract_palettes.py                 # 只处理缺少色彩信息的条目
+  python scripts/extract_palettes.py --force --workers 8
+  python scripts/extract_palettes.py --source bing
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from src.archive import iter_entries, write_json
+from src.palette import describe_colors
+
+
+def process_entry(entry_dir: str):
+    """计算单个条目的色彩信息并写回 meta.json（在子进程中执行），返回 (条目目录, 错误信息)"""
+    entry_dir = Path(entry_dir)
+    try:
+        meta_path = entry_dir / "meta.json"
+        meta = json.loads(meta_path.read_text(encoding="utf-8"))
+        meta.update(describe_colors(entry_dir / "thumb.jpg"))
+        write_json(meta_path, meta, if_changed=True)
+    except Exception as e:
+        return str(entry_dir), str(e)
+    return str(entry_dir), None
+
+
+def needs_palette(entry_dir: Path) -> bool:
+    """条目是否缺少色彩信息"""
+    try:
+        meta = json.loads((entry_dir / "meta.json").read_text(encoding="utf-8"))
+    except ValueError:
+        return False
+    return "palette" not in meta or "luminance" not in meta
+
+
+def main():
+    parser = argparse.ArgumentParser(description="批量提取壁纸主色调与平均亮度")
+    parser.add_argument("--source", action="append", help="只处理指定源（可重复）")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="并发进程数（默认 CPU 核数）")
+    parser.add_argument("--force", action="store_true", help="重新计算已有色彩信息的条目")
+    args = parser.parse_args()
+
+    entries = [
+        str(entry_dir) for _, _, entry_dir in iter_entries(args.source)
+        if (entry_dir / "meta.json").exists() and (entry_dir / "thumb.jpg").exists()
+        and (args.force or needs_palette(entry_dir))
+    ]
+    print(f"🎨 待处理条目 {len(entries)} 个")
+    if not entries:
+        return
+
+    started = time.perf_counter()
+    failures = 0
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        for entry_dir, error in pool.map(process_entry, entries, chunksize=8):
+            if error:
+                failures += 1
+                print(f"[ERROR] {entry_dir}: {error}")
+
+    elapsed = time.perf_counter() - started
+    print(f"\n✅ 完成：{len(entries) - failures}/{len(entries)} 个条目，耗时 {elapsed:.2f}s")
+
+    if len(entries) > failures:
+        from src.update_gallery import update_gallery
+        print("🔄 更新 Gallery...")
+        update_gallery()
+
+
+if __name__ == "__main__":
+    main()
@@ -13,6 +13,7 @@ from PIL import Image
 # 添加项目根目录到路径
 sys.path.insert(0, str(Path(__file__).parent.parent))
 import fetch_bing_wallpaper
+import fetch_unsplash_wallpaper
 
 UNSPLASH_API = "https://api.unsplash.com/photos/random"
 
@@ -56,7 +57,7 @@ def fill_unsplash_december():
             base_dir.mkdir(parents=True, exist_ok=True)
             
             # 下载图片
-            image_url = photo["urls"]["full"]
+            image_url = fetch_unsplash_wallpaper.select_image_url(photo)
             image_path = base_dir / "image.jpg"
             fetch_bing_wallpaper.download_image(image_url, image_path)
             
@@ -75,7 +76,8 @@ def fill_unsplash_december():
                 "copyright": copyright_info,
                 "image_url": photo["links"]["html"],
                 "photographer": author,
-                "has_story": False  # 故事稍后异步生成
+                "has_story": False,  # 故事稍后异步生成
+                **fetch_unsplash_wallpaper.describe_image(image_path)
             }
             (base_dir / "meta.json").write_text(json.dumps(meta_info, ensure_ascii=False, indent=2), encoding="utf-8")
             
@@ -1,7 +1,9 @@
 #!/usr/bin/env python3
 """
 异步生成缺失的 AI 故事
-扫描所有壁纸目录，为没有 story.md 的壁纸生成故事
+扫描所有壁纸目录，为没有 story.md 的壁纸生成故事；已有 story.md 但缺少其他配置输出（如 story_en.md）的条目
+基于缓存的画面分析 (analysis.json) 只补生成缺失的输出
+超出 config/sources.yaml 中 llm.budget 的 token 预算后不再调用 LLM，剩余条目推迟到下次运行（见 src/llm_usage.py）
 """
 
 import os
@@ -12,10 +14,26 @@ from pathlib import Path
 # 添加项目根目录到路径
 sys.path.insert(0, str(Path(__file__).parent.parent))
 import fetch_bing_wallpaper
+from src import llm_router, llm_usage
+from src.archive import atomic_write_text, log_write_summary, write_json, mark_stage
+from src.storage import fetch_original, has_original
+from src.story_pipeline import generate_outputs, missing_outputs
 from src.update_readme import update_readme
 from src.update_gallery import update_gallery
 
 
+def backfill_outputs(source_name: str, date_dir: Path):
+    """为已有主故事的条目补生成缺失的其他输出"""
+    meta = json.loads((date_dir / "meta.json").read_text(encoding="utf-8"))
+    names = ", ".join(o["name"] for o in missing_outputs(date_dir))
+    print(f"[INFO] 正在为 {source_name}/{date_dir.name} 补生成输出: {names}")
+    try:
+        generate_outputs(date_dir, meta.get("title", "Wallpaper"), meta.get("copyright", ""),
+                         fetch_original(date_dir), include_primary=False)
+    except Exception as e:
+        print(f"[WARN] {source_name}/{date_dir.name}: 补生成失败: {e}")
+
+
 def generate_missing_stories():
     """生成所有缺失的故事"""
     print("🚀 开始扫描并生成缺失的故事...")
@@ -25,6 +43,8 @@ def generate_missing_stories():
     
     total_count = 0
     success_count = 0
+    deferred_count = 0
+    budget_reason = None
     
     # 遍历所有源
     for source_dir in wallpapers_base.iterdir():
@@ -44,14 +64,27 @@ def generate_missing_stories():
             meta_path = date_dir / "meta.json"
             image_path = date_dir / "image.jpg"
             
-            # 检查是否需要生成故事
-            if story_path.exists():
+            # 检查是否需要生成故事；主故事已存在时只补齐其他输出
+            needs_backfill = story_path.exists() and bool(missing_outputs(date_dir))
+            if story_path.exists() and not needs_backfill:
                 continue
             
-            if not meta_path.exists() or not image_path.exists():
+            if not meta_path.exists() or not has_original(date_dir):
                 print(f"[SKIP] {date_str}: 缺少元数据或图片")
                 continue
             
+            # 超出 token 预算后剩余条目推迟到下次运行
+            budget_reason = budget_reason or llm_usage.budget_exceeded()
+            if budget_reason:
+                if not deferred_count:
+                    print(f"[WARN] {budget_reason}，剩余条目推迟到下次运行")
+                deferred_count += 1
+                continue
+            
+            if needs_backfill:
+                backfill_outputs(source_name, date_dir)
+                continue
+            
             total_count += 1
             
             try:
@@ -62,14 +95,18 @@ def generate_missing_stories():
                 
                 # 生成故事
                 print(f"[INFO] 正在为 {source_name}/{date_str} 生成故事...")
-                story_content = fetch_bing_wallpaper.generate_story(title, copyright_info, image_path)
+                story_content = fetch_bing_wallpaper.generate_story(
+                    title, copyright_info, fetch_original(date_dir), entry_dir=date_dir
+                )
                 
                 if story_content:
-                    story_path.write_text(story_content, encoding="utf-8")
+                    atomic_write_text(story_path, story_content)
+                    mark_stage(date_dir, "story")
                     
                     # 更新元数据
                     meta["has_story"] = True
-                    meta_path.write_text(json.dumps(meta, ensure_ascii=False, indent=2), encoding="utf-8")
+                    write_json(meta_path, meta, if_changed=True)
+                    mark_stage(date_dir, "meta")
                     
                     print(f"✅ {source_name}/{date_str}: 故事已生成")
                     
@@ -88,12 +125,17 @@ def generate_missing_stories():
                 continue
     
     print(f"\n✅ 故事生成完成：成功 {success_count}/{total_count}")
+    if deferred_count:
+        print(f"⏸️ 超出 LLM 预算，推迟 {deferred_count} 个条目")
+    llm_router.log_summary()
+    llm_usage.log_summary()
     
     # 更新 README 和 Gallery
     if success_count > 0:
         print("\n🔄 更新 README 和 Gallery...")
         update_readme()
         update_gallery()
+        log_write_summary()
         print("✅ 更新完成")
 
 
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+LLM 用量报告：按源与月份汇总 data/llm_usage.jsonl 中的调用次数、tokens、吞吐与成本
+成本按 config/sources.yaml 的 llm.pricing 估算，未配置单价的模型记为 "-"
+
+用法:
+  python scripts/llm_usage_report.py                  # 按源 × 月份汇总
+  python scripts/llm_usage_report.py --month 2025-12  # 只看某月
+  python scripts/llm_usage_report.py --by model       # 按模型汇总
+"""
+
+import argparse
+import sys
+from collections import defaultdict
+from pathlib import Path
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from src.llm_usage import LEDGER_FILE, get_pricing, read_ledger, row_cost
+
+GROUPINGS = {
+    "source-month": lambda row: (row.get("source", "-"), row.get("at", "")[:7]),
+    "source": lambda row: (row.get("source", "-"),),
+    "month": lambda row: (row.get("at", "")[:7],),
+    "model": lambda row: (row.get("model", "-"),),
+    "kind": lambda row: (row.get("kind", "-"),),
+}
+
+
+def summarize(rows, key, pricing: dict) -> dict:
+    """按 key(row) 分组累加，返回 {分组: 统计}"""
+    groups = defaultdict(lambda: {"calls": 0, "entries": set(), "prompt": 0, "completion": 0,
+                                  "seconds": 0.0, "cost": 0.0, "unpriced": 0, "estimated": 0})
+    for row in rows:
+        group = groups[key(row)]
+        group["calls"] += 1
+        group["entries"].add((row.get("source"), row.get("entry")))
+        group["prompt"] += row.get("prompt_tokens") or 0
+        group["completion"] += row.get("completion_tokens") or 0
+        group["seconds"] += row.get("seconds") or 0
+        group["estimated"] += bool(row.get("estimated"))
+        cost = row_cost(row, pricing)
+        if cost is None:
+            group["unpriced"] += 1
+        else:
+            group["cost"] += cost
+    return groups
+
+
+def format_row(label: str, g: dict) -> str:
+    speed = f"{g['completion'] / g['seconds']:.1f}" if g["seconds"] else "-"
+    cost = "-" if g["unpriced"] == g["calls"] else f"${g['cost']:.4f}" + ("*" if g["unpriced"] else "")
+    return (f"{label:<24} {g['calls']:>6} {len(g['entries']):>6} {g['prompt']:>10} {g['completion']:>10} "
+            f"{g['seconds'] / g['calls']:>8.1f} {speed:>8} {cost:>11}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="汇总 LLM 用量台账（调用次数、tokens、吞吐与成本）")
+    parser.add_argument("--by", choices=sorted(GROUPINGS), default="source-month", help="分组方式（默认 source-month）")
+    parser.add_argument("--month", help="只统计某月 (YYYY-MM)")
+    parser.add_argument("--source", action="append", help="只统计指定源（可重复）")
+    parser.add_argument("--ledger", type=Path, default=LEDGER_FILE, help=f"台账路径（默认 {LEDGER_FILE}）")
+    args = parser.parse_args()
+
+    rows = [
+        row for row in read_ledger(args.ledger)
+        if (not args.month or row.get("at", "").startswith(args.month))
+        and (not args.source or row.get("source") in args.source)
+    ]
+    if not rows:
+        print(f"[INFO] {args.ledger} 中没有匹配的记录")
+        return
+
+    pricing = get_pricing()
+    groups = summarize(rows, GROUPINGS[args.by], pricing)
+    total = summarize(rows, lambda row: (), pricing)[()]
+
+    print(f"📊 LLM 用量（{args.ledger}，{len(rows)} 次调用）")
+    print(f"{args.by:<24} {'调用':>6} {'条目':>6} {'prompt':>10} {'completion':>10} {'平均耗时':>8} {'tok/s':>8} {'成本':>11}")
+    for key in sorted(groups):
+        print(format_row(" / ".join(key), groups[key]))
+    print(format_row("合计", total))
+    if total["unpriced"]:
+        print(f"[INFO] {total['unpriced']} 次调用的模型未在 llm.pricing 中配置单价，未计入成本（标 * 的成本不完整）")
+    if total["estimated"]:
+        print(f"[INFO] {total['estimated']} 次调用的服务端未返回 usage，completion tokens 为估算值")
+
+
+if __name__ == "__main__":
+    main()
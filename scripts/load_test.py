@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+端到端压测：启动本地替身服务 (scripts/stub_services.py)，在临时工作目录中反复运行抓取脚本，
+报告吞吐量、单次运行耗时分位数，以及各外部服务在服务端的请求数、注入故障与耗时分位数
+每次运行使用全新的临时目录，互不影响，也不会改动仓库内的归档
+
+场景:
+  bing      python fetch_bing_wallpaper.py
+  unsplash  python fetch_unsplash_wallpaper.py
+  batch     python batch_fetch.py bing <当月>
+
+用法:
+  python scripts/load_test.py                                  # 三个场景各运行 3 次
+  python scripts/load_test.py --scenario bing --runs 20 --concurrency 4
+  python scripts/load_test.py --latency-ms 50 --service-latency llm=2000 --error-rate 0.02
+  python scripts/load_test.py --skip-story --json .cache/load_test.json
+"""
+
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT))
+from scripts.stub_services import add_fault_arguments, faults_from_args, parse_size, percentile, start_server
+from src.archive import write_json
+
+SCENARIOS = ("bing", "unsplash", "batch")
+
+# 每次运行复制到临时工作目录的文件（不含归档本身）
+WORKSPACE_FILES = ["config", "prompts", "templates", "README.md", "README_EN.md", "docs/index.html", "docs/style.css"]
+
+
+def scenario_command(name: str, skip_story: bool):
+    """场景对应的命令行"""
+    if name == "batch":
+        # batch_fetch 没有 --skip-story，替身 LLM 响应很快
+        month = datetime.now(timezone.utc).strftime("%Y-%m")
+        return [sys.executable, str(ROOT / "batch_fetch.py"), "bing", month]
+    script = "fetch_bing_wallpaper.py" if name == "bing" else "fetch_unsplash_wallpaper.py"
+    return [sys.executable, str(ROOT / script)] + (["--skip-story"] if skip_story else [])
+
+
+def stub_env(base_url: str, with_cos=True, with_wecom=True) -> dict:
+    """指向替身服务的环境变量；显式覆盖所有外部服务配置，避免误用真实密钥"""
+    env = dict(os.environ)
+    env.update({
+        "PYTHONUNBUFFERED": "1",
+        "BING_BASE_URL": base_url,
+        "UNSPLASH_API_BASE": base_url,
+        "UNSPLASH_ACCESS_KEY": "stub",
+        "LLM_API_KEY": "stub",
+        "LLM_BASE_URL": f"{base_url}/v1",
+        "LLM_MODEL_NAME": "stub-vision",
+        "LLM_FALLBACK_API_KEY": "stub",
+        "LLM_FALLBACK_BASE_URL": f"{base_url}/alt/v1",
+        "LLM_FALLBACK_MODEL_NAME": "stub-alt",
+        # 两个群，验证多群并发推送
+        "WEWORK_WEBHOOK": (f"{base_url}/cgi-bin/webhook/send?key=stub-a,"
+                           f"{base_url}/cgi-bin/webhook/send?key=stub-b") if with_wecom else "",
+        "COS_SECRET_ID": "stub" if with_cos else "",
+        "COS_SECRET_KEY": "stub" if with_cos else "",
+        "COS_REGION": "ap-stub" if with_cos else "",
+        "COS_BUCKET": "stub-1250000000" if with_cos else "",
+        "COS_DOMAIN": base_url.split("://", 1)[1],
+        "COS_SCHEME": "http",
+    })
+    return env
+
+
+def prepare_workspace() -> Path:
+    """创建临时工作目录并复制运行所需的配置和页面模板"""
+    workdir = Path(tempfile.mkdtemp(prefix="wallpaper-load-"))
+    for name in WORKSPACE_FILES:
+        src = ROOT / name
+        dst = workdir / name
+        if src.is_dir():
+            shutil.copytree(src, dst)
+        elif src.exists():
+            dst.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copy2(src, dst)
+    return workdir
+
+
+def run_once(command, env, keep=False):
+    """在全新的工作目录中运行一次，返回 {"seconds", "ok", "log"}"""
+    workdir = prepare_workspace()
+    started = time.perf_counter()
+    result = subprocess.run(command, cwd=workdir, env=env, capture_output=True, text=True)
+    seconds = time.perf_counter() - started
+    ok = result.returncode == 0 and "Traceback" not in result.stderr
+    if not keep:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return {"seconds": seconds, "ok": ok, "log": (result.stdout + result.stderr)[-2000:], "workdir": str(workdir)}
+
+
+def run_scenario(name, env, runs, concurrency, skip_story, keep=False) -> dict:
+    """并发运行某个场景 runs 次，返回统计结果"""
+    command = scenario_command(name, skip_story)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda _: run_once(command, env, keep), range(runs)))
+    wall = time.perf_counter() - started
+
+    durations = [r["seconds"] for r in results]
+    failed = [r for r in results if not r["ok"]]
+    for r in failed[:3]:
+        print(f"[ERROR] {name} 运行失败 ({r['workdir']}):\n{r['log']}")
+
+    return {
+        "runs": runs,
+        "failed": len(failed),
+        "wall_seconds": round(wall, 3),
+        "throughput_per_min": round(runs / wall * 60, 2),
+        "p50_s": round(percentile(durations, 50), 3),
+        "p95_s": round(percentile(durations, 95), 3),
+        "p99_s": round(percentile(durations, 99), 3),
+        "max_s": round(max(durations), 3),
+    }
+
+
+def fetch_stats(base_url: str) -> dict:
+    import requests
+    return requests.get(f"{base_url}/__stats", timeout=10).json()
+
+
+def reset_stats(base_url: str):
+    import requests
+    requests.post(f"{base_url}/__reset", timeout=10)
+
+
+def print_report(report: dict):
+    print(f"\n{'场景':<10}{'次数':>6}{'失败':>6}{'吞吐/分钟':>12}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}")
+    for name, s in report["scenarios"].items():
+        print(f"{name:<10}{s['runs']:>6}{s['failed']:>6}{s['throughput_per_min']:>12}"
+              f"{s['p50_s']:>8}s{s['p95_s']:>8}s{s['p99_s']:>8}s{s['max_s']:>8}s")
+
+    print(f"\n{'服务 (服务端)':<22}{'请求':>7}{'注入错误':>10}{'限流':>7}{'p50':>10}{'p95':>10}{'p99':>10}")
+    for name, services in report["services"].items():
+        for service, s in sorted(services.items()):
+            print(f"{name + '/' + service:<22}{s['requests']:>7}{s['errors']:>10}{s['throttled']:>7}"
+                  f"{s['p50_ms']:>8}ms{s['p95_ms']:>8}ms{s['p99_ms']:>8}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="基于本地替身服务的端到端压测")
+    parser.add_argument("--scenario", action="append", choices=SCENARIOS, help="运行的场景（可重复，默认全部）")
+    parser.add_argument("--runs", type=int, default=3, help="每个场景的运行次数")
+    parser.add_argument("--concurrency", type=int, default=1, help="同时运行的进程数")
+    parser.add_argument("--skip-story", action="store_true", help="抓取脚本跳过故事生成")
+    parser.add_argument("--no-cos", action="store_true", help="不配置 COS")
+    parser.add_argument("--no-wecom", action="store_true", help="不配置企业微信推送")
+    parser.add_argument("--keep", action="store_true", help="保留每次运行的临时工作目录")
+    parser.add_argument("--json", help="JSON 报告输出路径")
+    add_fault_arguments(parser)
+    args = parser.parse_args()
+
+    try:
+        faults = faults_from_args(args)
+    except ValueError as e:
+        parser.error(str(e))
+    server, base_url = start_server(
+        faults=faults, image_size=parse_size(args.image_size), story_chars=args.story_chars,
+        ranges=not args.no_ranges, stream_kbps=args.stream_kbps, token_ms=args.token_ms,
+        stream_cut_rate=args.stream_cut_rate
+    )
+    env = stub_env(base_url, with_cos=not args.no_cos, with_wecom=not args.no_wecom)
+    print(f"🧪 替身服务: {base_url}")
+
+    report = {"config": {"runs": args.runs, "concurrency": args.concurrency, "faults": faults},
+              "scenarios": {}, "services": {}}
+    try:
+        for name in args.scenario or SCENARIOS:
+            print(f"🚀 场景 {name}: {args.runs} 次，并发 {args.concurrency}")
+            reset_stats(base_url)
+            report["scenarios"][name] = run_scenario(
+                name, env, args.runs, max(1, args.concurrency), args.skip_story, args.keep
+            )
+            report["services"][name] = fetch_stats(base_url)
+    finally:
+        server.shutdown()
+
+    print_report(report)
+    if args.json:
+        write_json(Path(args.json), report)
+        print(f"\n📄 报告: {args.json}")
+    sys.exit(1 if any(s["failed"] for s in report["scenarios"].values()) else 0)
+
+
+if __name__ == "__main__":
+    main()
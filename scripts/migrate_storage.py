@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+存量原图迁移：把仓库中的 image.jpg（及多市场图片）批量迁移到对象存储
+迁移后 meta.json 写入 originals 指针，本地原图删除，README / Gallery 改为链接对象存储
+（只影响工作区，git 历史中已提交的原图不会被改写）
+
+用法:
+  python scripts/migrate_storage.py --dry-run
+  python scripts/migrate_storage.py --workers 8
+  python scripts/migrate_storage.py --backend local --source bing
+"""
+
+import argparse
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+import fetch_bing_wallpaper
+from src.archive import iter_entries
+from src.storage import get_storage_config, tier_entry
+
+
+def main():
+    parser = argparse.ArgumentParser(description="存量原图批量迁移到对象存储")
+    parser.add_argument("--source", action="append", help="只迁移指定源（可重复）")
+    parser.add_argument("--backend", choices=["cos", "local"], help="覆盖配置中的存储后端")
+    parser.add_argument("--workers", type=int, default=4, help="并发上传线程数")
+    parser.add_argument("--dry-run", action="store_true", help="只统计待迁移的文件")
+    args = parser.parse_args()
+
+    fetch_bing_wallpaper.load_env()
+    config = get_storage_config()
+    if args.backend:
+        config["backend"] = args.backend
+
+    entries = [
+        entry_dir for _, _, entry_dir in iter_entries(args.source)
+        if (entry_dir / "meta.json").exists() and any(entry_dir.glob("image*.jpg"))
+    ]
+    total_bytes = sum(p.stat().st_size for d in entries for p in d.glob("image*.jpg"))
+    print(f"🚚 待迁移条目 {len(entries)} 个，共 {total_bytes / 1024 / 1024:.1f} MB -> {config['backend']}")
+    if args.dry_run or not entries:
+        return
+
+    started = time.perf_counter()
+    moved_bytes = 0
+    moved_entries = 0
+    with ThreadPoolExecutor(max_workers=max(1, args.workers)) as pool:
+        futures = {pool.submit(tier_entry, entry_dir, config): entry_dir for entry_dir in entries}
+        for future in as_completed(futures):
+            entry_dir = futures[future]
+            try:
+                moved = future.result()
+            except Exception as e:
+                print(f"[ERROR] {entry_dir}: {e}")
+                continue
+            if moved:
+                moved_bytes += moved
+                moved_entries += 1
+                print(f"[OK] {entry_dir.parent.name}/{entry_dir.name}: {moved // 1024} KB")
+
+    elapsed = time.perf_counter() - started
+    print(f"\n✅ 迁移完成：{moved_entries}/{len(entries)} 个条目，"
+          f"{moved_bytes / 1024 / 1024:.1f} MB，耗时 {elapsed:.1f}s")
+
+    if moved_entries:
+        from src.update_readme import update_readme
+        from src.update_gallery import update_gallery
+        print("🔄 更新 README 和 Gallery...")
+        update_readme()
+        update_gallery()
+
+
+if __name__ == "__main__":
+    main()
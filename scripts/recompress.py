@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+原图无损重压缩 (src/recompress.py)：用 jpegtran 批量优化归档中的 JPEG 原图
+逐像素校验后才替换，输出每个条目与总计节省的字节数；已处理且大小未变的条目跳过
+需要 jpegtran（libjpeg-turbo 2.1+ 或 IJG 9+）；替换后 COS 上的旧副本可用 scripts/reconcile.py 重新上传
+
+用法:
+  python scripts/recompress.py                       # 所有源，进程数为 CPU 核数
+  python scripts/recompress.py --source bing --workers 4
+  python scripts/recompress.py --force               # 忽略断点状态，全部重新处理
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from src.archive import iter_entries
+from src.recompress import find_jpegtran, recompress_entry
+
+
+def run_entry(task):
+    """在子进程中处理单个条目"""
+    entry_dir, jpegtran, force = task
+    return recompress_entry(Path(entry_dir), jpegtran, force)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="原图无损重压缩")
+    parser.add_argument("--source", action="append", help="只处理指定源（可重复）")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2, help="并发进程数")
+    parser.add_argument("--jpegtran", help="jpegtran 可执行文件（默认读取配置）")
+    parser.add_argument("--force", action="store_true", help="忽略断点状态中的 recompress 记录")
+    args = parser.parse_args()
+
+    jpegtran = find_jpegtran(args.jpegtran)
+    if not jpegtran:
+        print("[ERROR] 未找到 jpegtran，请安装 libjpeg-turbo（apt install libjpeg-turbo-progs / brew install jpeg-turbo）")
+        sys.exit(1)
+
+    tasks = [(str(entry_dir), jpegtran, args.force) for _, _, entry_dir in iter_entries(args.source)]
+    print(f"🗜  共 {len(tasks)} 个条目，{args.workers} 个进程，jpegtran: {jpegtran}")
+    started = time.perf_counter()
+    before = after = optimized = skipped = 0
+    errors = []
+
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        for report in pool.map(run_entry, tasks, chunksize=4):
+            if report["skipped"]:
+                skipped += 1
+                continue
+            if report["error"]:
+                errors.append(report)
+                print(f"[WARN] {report['entry']}: {report['error']}")
+            before += report["before"]
+            after += report["after"]
+            if report["saved"]:
+                optimized += 1
+                print(f"[OK] {report['entry']}: {report['before'] // 1024} KB -> {report['after'] // 1024} KB "
+                      f"(-{report['saved'] // 1024} KB, {report['saved'] / report['before']:.1%})")
+
+    saved = before - after
+    ratio = f"{saved / before:.1%}" if before else "-"
+    print(f"\n✅ 处理 {len(tasks) - skipped} 个条目（跳过 {skipped} 个），优化 {optimized} 个，"
+          f"{before / 1024 / 1024:.1f}MB -> {after / 1024 / 1024:.1f}MB，共节省 {saved / 1024 / 1024:.1f}MB ({ratio})，"
+          f"耗时 {time.perf_counter() - started:.1f}s")
+    if errors:
+        print(f"[ERROR] {len(errors)} 个条目处理失败，已保留原文件")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
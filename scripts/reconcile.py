@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""
+归档对账：计算整个归档中缺失或过期的产物，只执行这部分工作
+- 原图缺失（断点状态中有下载地址时重新下载）
+- 缩略图缺失或早于当前原图
+- 故事缺失
+- meta.json 缺失（由断点状态中的草稿补全）或 has_story 与 story.md 不一致
+- COS 未上传或与本地文件不一致
+- 存储分层模式下尚未迁出仓库的原图
+故事任务遵守 config/sources.yaml 中 llm.budget 的 token 预算：超出后该条目的故事（及随之更新 has_story 的
+meta 任务）推迟到下次运行（见 src/llm_usage.py）
+
+用法:
+  python scripts/reconcile.py --dry-run           # 只输出计划
+  python scripts/reconcile.py --workers 4         # 用 4 个线程执行
+  python scripts/reconcile.py --source bing --date 2025-12 --skip-story --no-cos
+"""
+
+import argparse
+import json
+import sys
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+import fetch_bing_wallpaper
+from src import llm_usage
+from src.archive import (
+    iter_entries, load_checkpoint, mark_stage, atomic_write_text, log_write_summary, write_json,
+    entry_upload_files, upload_entry_to_cos
+)
+from src.storage import fetch_original, get_storage_config, is_tiered, read_pointers, tier_entry
+
+# 同一条目内任务的执行顺序
+TASK_ORDER = ("image", "thumb", "story", "meta", "cos", "tier")
+STORY_META_REASON = "故事生成后更新 has_story"  # 只为故事服务的 meta 任务，故事推迟时一并去掉
+
+
+def read_meta(entry_dir: Path):
+    """读取 meta.json，不存在或损坏时返回 None"""
+    meta_path = entry_dir / "meta.json"
+    if not meta_path.exists():
+        return None
+    try:
+        return json.loads(meta_path.read_text(encoding="utf-8"))
+    except ValueError:
+        return None
+
+
+def image_download_url(source: str, checkpoint: dict, meta: dict):
+    """原图下载地址：优先使用断点状态中的记录；Bing 的 image_url 本身即原图地址"""
+    url = checkpoint.get("stages", {}).get("image", {}).get("url")
+    if not url and source == "bing":
+        url = (meta or {}).get("image_url")
+    return url
+
+
+def cos_out_of_date(entry_dir: Path, checkpoint: dict):
+    """
+    判断 COS 上的文件是否过期
+    有上传记录时对比记录的文件大小；没有记录时查询 COS 上的对象大小
+    """
+    from src.utils import cos_object_size
+
+    local = {p.name: p.stat().st_size for p in entry_upload_files(entry_dir)}
+    recorded = checkpoint.get("stages", {}).get("cos", {}).get("files")
+    if recorded is not None:
+        # 已迁出仓库的原图不在本地，只比较本地仍存在的文件
+        return {name: recorded.get(name) for name in local} != local
+
+    cos_base_path = f"wallpapers/{entry_dir.parent.name}/{entry_dir.name}"
+    return any(cos_object_size(f"{cos_base_path}/{name}") != size for name, size in local.items())
+
+
+def plan_entry(source: str, date: str, entry_dir: Path, skip_story=False, check_cos=False, tiered=False):
+    """
+    计算单个条目需要执行的任务
+    返回 {"source", "date", "dir", "tasks": [(任务, 原因)], "blocked": 无法处理的原因或 None}
+    """
+    plan = {"source": source, "date": date, "dir": entry_dir, "tasks": [], "blocked": None}
+    tasks = plan["tasks"]
+    checkpoint = load_checkpoint(entry_dir)
+    stages = checkpoint.get("stages", {})
+    image_path = entry_dir / "image.jpg"
+    story_exists = (entry_dir / "story.md").exists()
+    meta = read_meta(entry_dir)
+    draft = meta or checkpoint.get("meta")
+    pointer = read_pointers(entry_dir).get("image.jpg")
+
+    if image_path.exists():
+        image_bytes = image_path.stat().st_size
+    elif pointer:
+        image_bytes = pointer.get("bytes")  # 原图已分层到对象存储
+    else:
+        if not image_download_url(source, checkpoint, meta):
+            plan["blocked"] = "原图缺失且没有可用的下载地址"
+            return plan
+        tasks.append(("image", "原图缺失"))
+        image_bytes = None
+
+    thumb_record = stages.get("thumb", {})
+    if not (entry_dir / "thumb.jpg").exists():
+        tasks.append(("thumb", "缩略图缺失"))
+    elif image_bytes is None or (
+        "source_bytes" in thumb_record and thumb_record["source_bytes"] != image_bytes
+    ):
+        tasks.append(("thumb", "缩略图早于当前原图"))
+
+    if draft is None:
+        plan["blocked"] = "meta.json 缺失且断点状态中没有元数据草稿"
+        return plan
+
+    if not story_exists and not skip_story:
+        tasks.append(("story", "故事缺失"))
+
+    if meta is None:
+        tasks.append(("meta", "meta.json 缺失"))
+    elif bool(meta.get("has_story")) != story_exists:
+        tasks.append(("meta", "has_story 与 story.md 不一致"))
+    elif any(task == "story" for task, _ in tasks):
+        tasks.append(("meta", STORY_META_REASON))
+
+    if check_cos and (tasks or cos_out_of_date(entry_dir, checkpoint)):
+        tasks.append(("cos", "COS 未上传或已过期"))
+
+    if tiered and (image_path.exists() or any(entry_dir.glob("image_*.jpg"))):
+        tasks.append(("tier", "原图尚未迁移到对象存储"))
+
+    return plan
+
+
+def defer_story(plan: dict) -> bool:
+    """
+    超出 LLM token 预算时从计划中去掉故事任务及其配套的 meta 任务，
+    原因与去掉的任务记录在 plan["deferred"] / plan["deferred_tasks"]；返回是否推迟
+    """
+    if not any(task == "story" for task, _ in plan["tasks"]):
+        return False
+    reason = llm_usage.budget_exceeded()
+    if not reason:
+        return False
+    dropped = [(task, why) for task, why in plan["tasks"]
+               if task == "story" or (task == "meta" and why == STORY_META_REASON)]
+    plan["tasks"] = [t for t in plan["tasks"] if t not in dropped]
+    plan["deferred"], plan["deferred_tasks"] = reason, [task for task, _ in dropped]
+    return True
+
+
+def run_entry(plan: dict):
+    """按固定顺序执行单个条目的任务，返回 (已完成任务列表, 错误信息)"""
+    defer_story(plan)  # 在执行时检查，前面条目的用量已计入
+    entry_dir = plan["dir"]
+    storage_config = get_storage_config()
+    checkpoint = load_checkpoint(entry_dir)
+    meta = read_meta(entry_dir) or checkpoint.get("meta") or {}
+    image_path = entry_dir / "image.jpg"
+    story_path = entry_dir / "story.md"
+    done = []
+
+    try:
+        for task in sorted({t for t, _ in plan["tasks"]}, key=TASK_ORDER.index):
+            if task == "image":
+                url = image_download_url(plan["source"], checkpoint, meta)
+                fetch_bing_wallpaper.download_image(url, image_path)
+                mark_stage(entry_dir, "image", url=url)
+            elif task == "thumb":
+                local_image = fetch_original(entry_dir)
+                fetch_bing_wallpaper.generate_thumbnail(local_image, entry_dir / "thumb.jpg")
+                mark_stage(entry_dir, "thumb", source_bytes=local_image.stat().st_size)
+            elif task == "story":
+                story_content = fetch_bing_wallpaper.generate_story(
+                    meta.get("title"), meta.get("copyright"), fetch_original(entry_dir), entry_dir=entry_dir
+                )
+                if not story_content:
+                    continue
+                atomic_write_text(story_path, story_content)
+                mark_stage(entry_dir, "story")
+            elif task == "meta":
+                meta_info = {k: v for k, v in meta.items() if k != "has_story"}
+                meta_info["has_story"] = story_path.exists()
+                write_json(entry_dir / "meta.json", meta_info, if_changed=True)
+                mark_stage(entry_dir, "meta")
+            elif task == "cos":
+                if not upload_entry_to_cos(entry_dir):
+                    continue
+            elif task == "tier":
+                if not tier_entry(entry_dir, storage_config):
+                    continue
+            done.append(task)
+    except Exception as e:
+        return done, str(e)
+    return done, None
+
+
+def reconcile(sources=None, date_prefix=None, workers=4, dry_run=False, skip_story=False, check_cos=True):
+    """对账主流程：先规划，再用线程池只执行缺失的工作"""
+    from src.utils import cos_configured
+
+    check_cos = check_cos and cos_configured()
+    tiered = is_tiered()
+    entries = [
+        (source, date, entry_dir) for source, date, entry_dir in iter_entries(sources)
+        if not date_prefix or date.startswith(date_prefix)
+    ]
+
+    # 规划阶段可能需要查询 COS，同样放进线程池
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        plans = list(pool.map(lambda e: plan_entry(*e, skip_story=skip_story, check_cos=check_cos, tiered=tiered), entries))
+
+    pending = [p for p in plans if p["tasks"]]
+    blocked = [p for p in plans if p["blocked"]]
+    task_counts = Counter(task for p in pending for task, _ in p["tasks"])
+
+    print(f"🔎 扫描 {len(plans)} 个条目：需处理 {len(pending)} 个，无法处理 {len(blocked)} 个")
+    for task in TASK_ORDER:
+        if task_counts[task]:
+            print(f"   - {task}: {task_counts[task]}")
+    for p in pending:
+        reasons = "；".join(reason for _, reason in p["tasks"])
+        print(f"   {p['source']}/{p['date']}: {reasons}")
+    for p in blocked:
+        print(f"   [BLOCKED] {p['source']}/{p['date']}: {p['blocked']}")
+
+    if dry_run or not pending:
+        return 0
+
+    done_counts = Counter()
+    failures = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(run_entry, p): p for p in pending}
+        for future in as_completed(futures):
+            p = futures[future]
+            done, error = future.result()
+            done_counts.update(done)
+            if error:
+                failures += 1
+                print(f"[ERROR] {p['source']}/{p['date']}: {error}")
+            else:
+                print(f"[OK] {p['source']}/{p['date']}: {', '.join(done) or '无变化'}")
+
+    deferred = [p for p in pending if p.get("deferred")]
+    for p in deferred:
+        task_counts.subtract(p["deferred_tasks"])
+    summary = ", ".join(f"{task} {done_counts[task]}/{task_counts[task]}" for task in TASK_ORDER if task_counts[task])
+    print(f"\n✅ 对账完成：{summary}；失败条目 {failures} 个")
+    if deferred:
+        print(f"⏸️ {deferred[0]['deferred']}，推迟 {len(deferred)} 个条目的故事到下次运行")
+    llm_usage.log_summary()
+    return sum(done_counts[t] for t in ("image", "thumb", "story", "meta"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="归档对账：只补齐缺失或过期的产物")
+    parser.add_argument("--source", action="append", help="只处理指定源（可重复）")
+    parser.add_argument("--date", help="只处理指定日期前缀，如 2025-12 或 2025-12-10")
+    parser.add_argument("--workers", type=int, default=4, help="并发线程数")
+    parser.add_argument("--dry-run", action="store_true", help="只输出计划，不执行")
+    parser.add_argument("--skip-story", action="store_true", help="不补生成 AI 故事")
+    parser.add_argument("--no-cos", action="store_true", help="不检查 / 上传 COS")
+    args = parser.parse_args()
+
+    fetch_bing_wallpaper.load_env()
+    changed = reconcile(
+        sources=args.source,
+        date_prefix=args.date,
+        workers=max(1, args.workers),
+        dry_run=args.dry_run,
+        skip_story=args.skip_story,
+        check_cos=not args.no_cos,
+    )
+
+    # 有本地产物变化时刷新 README 和 Gallery
+    if changed:
+        from src.update_readme import update_readme
+        from src.update_gallery import update_gallery
+        print("\n🔄 更新 README 和 Gallery...")
+        update_readme()
+        update_gallery()
+        log_write_summary()
+        print("✅ 更新完成")
+
+
+if __name__ == "__main__":
+    main()
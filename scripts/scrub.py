@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+归档完整性巡检 (scrub)
+逐条目校验：
+- image.jpg / thumb.jpg 能否完整解码（发现截断的下载）、尺寸是否合理
+- meta.json 字段是否齐全、类型是否正确、与磁盘上的文件是否一致
+- has_story 与 story.md 是否一致
+
+增量：条目内所有文件的 (size, mtime) 与上次通过时的台账一致则跳过
+用法:
+  python scripts/scrub.py                      # 增量巡检，报告写入 .cache/scrub_report.json
+  python scripts/scrub.py --full --workers 8   # 忽略台账，全量巡检
+  python scripts/scrub.py --report -           # 报告输出到标准输出
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from src.archive import iter_entries, write_json, CHECKPOINT_FILE
+from src.storage import has_original
+
+LEDGER_PATH = Path(".cache/scrub_ledger.json")
+REPORT_PATH = Path(".cache/scrub_report.json")
+
+MIN_IMAGE_WIDTH = 640       # 原图宽度下限
+THUMB_MAX_SIZE = (400, 225)  # 与 fetch_bing_wallpaper.THUMB_SIZE 一致
+
+# meta.json 必需字段及类型
+META_SCHEMA = {
+    "date": str,
+    "title": str,
+    "copyright": str,
+    "image_url": str,
+    "has_story": bool,
+}
+NUMBER = (int, float)  # JSON 往返后 0 与 1 等整值浮点数会变成 int
+# 可选字段及类型
+META_OPTIONAL = {
+    "photographer": str,
+    "width": int,
+    "height": int,
+    "bytes": int,
+    "markets": dict,
+    "originals": dict,
+    "palette": list,
+    "luminance": NUMBER,
+    "thumb": dict,
+}
+
+
+def type_matches(value, expected) -> bool:
+    """isinstance 检查，但 bool 只匹配 bool（bool 是 int 的子类，不算数值字段的合法值）"""
+    if isinstance(value, bool):
+        return expected is bool
+    return isinstance(value, expected)
+
+
+def type_name(expected) -> str:
+    return "/".join(t.__name__ for t in expected) if isinstance(expected, tuple) else expected.__name__
+
+
+def entry_signature(entry_dir: Path):
+    """条目内所有文件的 {文件名: [size, mtime_ns]}，断点状态文件除外"""
+    signature = {}
+    for path in sorted(entry_dir.iterdir()):
+        if path.is_file() and path.name != CHECKPOINT_FILE and not path.name.endswith(".tmp"):
+            st = path.stat()
+            signature[path.name] = [st.st_size, st.st_mtime_ns]
+    return signature
+
+
+def check_jpeg(path: Path, problems: list, label: str):
+    """完整解码 JPEG，返回 (宽, 高)；失败时记录问题并返回 None"""
+    from PIL import Image
+
+    try:
+        with Image.open(path) as img:
+            img.verify()  # 校验文件结构
+        with Image.open(path) as img:
+            if img.format != "JPEG":
+                problems.append(f"{label} 不是 JPEG ({img.format})")
+            img.load()  # 完整解码，截断的文件会在这里报错
+            return img.size
+    except Exception as e:
+        problems.append(f"{label} 无法解码: {e}")
+        return None
+
+
+def check_meta(meta_path: Path, date: str, problems: list):
+    """校验 meta.json 的结构，返回解析后的字典或 None"""
+    try:
+        meta = json.loads(meta_path.read_text(encoding="utf-8"))
+    except Exception as e:
+        problems.append(f"meta.json 无法解析: {e}")
+        return None
+    if not isinstance(meta, dict):
+        problems.append("meta.json 顶层不是对象")
+        return None
+
+    for key, expected in META_SCHEMA.items():
+        if key not in meta:
+            problems.append(f"meta.json 缺少字段 {key}")
+        elif not type_matches(meta[key], expected):
+            problems.append(f"meta.json 字段 {key} 类型应为 {type_name(expected)}")
+    for key, expected in META_OPTIONAL.items():
+        if key in meta and not type_matches(meta[key], expected):
+            problems.append(f"meta.json 字段 {key} 类型应为 {type_name(expected)}")
+
+    if meta.get("date") != date:
+        problems.append(f"meta.json 日期 {meta.get('date')} 与目录 {date} 不一致")
+    return meta
+
+
+def scrub_entry(task):
+    """校验单个条目（在子进程中执行），返回报告条目"""
+    source, date, entry_dir = task
+    entry_dir = Path(entry_dir)
+    problems = []
+
+    image_path = entry_dir / "image.jpg"
+    thumb_path = entry_dir / "thumb.jpg"
+    meta_path = entry_dir / "meta.json"
+    story_path = entry_dir / "story.md"
+
+    image_size = None
+    if image_path.exists():
+        image_size = check_jpeg(image_path, problems, "image.jpg")
+        if image_size and image_size[0] < MIN_IMAGE_WIDTH:
+            problems.append(f"image.jpg 宽度过小: {image_size[0]}px")
+    elif not has_original(entry_dir):  # 已分层的原图以 meta.json 中的指针为准
+        problems.append("image.jpg 缺失")
+
+    if thumb_path.exists():
+        thumb_size = check_jpeg(thumb_path, problems, "thumb.jpg")
+        if thumb_size and (thumb_size[0] > THUMB_MAX_SIZE[0] or thumb_size[1] > THUMB_MAX_SIZE[1]):
+            problems.append(f"thumb.jpg 尺寸超出 {THUMB_MAX_SIZE}: {thumb_size}")
+    else:
+        problems.append("thumb.jpg 缺失")
+
+    if meta_path.exists():
+        meta = check_meta(meta_path, date, problems)
+        if meta is not None:
+            if bool(meta.get("has_story")) != story_path.exists():
+                problems.append(f"has_story={meta.get('has_story')} 与 story.md 是否存在不一致")
+            if image_size and "width" in meta and [meta.get("width"), meta.get("height")] != list(image_size):
+                problems.append(f"meta.json 尺寸 {meta.get('width')}x{meta.get('height')} 与原图 {image_size} 不一致")
+            if image_path.exists() and "bytes" in meta and meta["bytes"] != image_path.stat().st_size:
+                problems.append(f"meta.json bytes={meta['bytes']} 与原图大小不一致")
+            for market in (meta.get("markets") or {}).values():
+                name = market.get("image") if isinstance(market, dict) else None
+                if name and not has_original(entry_dir, name):
+                    problems.append(f"markets 引用的 {name} 不存在")
+    else:
+        problems.append("meta.json 缺失")
+
+    return {
+        "source": source,
+        "date": date,
+        "status": "error" if problems else "ok",
+        "problems": problems,
+    }
+
+
+def load_ledger():
+    """读取上次巡检的台账 {"源/日期": 签名}"""
+    if LEDGER_PATH.exists():
+        try:
+            return json.loads(LEDGER_PATH.read_text(encoding="utf-8"))
+        except ValueError:
+            pass
+    return {}
+
+
+def scrub(workers=None, full=False, sources=None):
+    """执行巡检，返回报告字典"""
+    started = time.perf_counter()
+    ledger = {} if full else load_ledger()
+    new_ledger = {}
+    results = []
+    tasks = []
+
+    for source, date, entry_dir in iter_entries(sources):
+        key = f"{source}/{date}"
+        signature = entry_signature(entry_dir)
+        if ledger.get(key) == signature:
+            new_ledger[key] = signature
+            results.append({"source": source, "date": date, "status": "skipped", "problems": []})
+        else:
+            tasks.append(((source, date, str(entry_dir)), key, signature))
+
+    if tasks:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            checked = pool.map(scrub_entry, [t[0] for t in tasks], chunksize=4)
+            for (_, key, signature), result in zip(tasks, checked):
+                results.append(result)
+                if result["status"] == "ok":
+                    new_ledger[key] = signature
+
+    LEDGER_PATH.parent.mkdir(parents=True, exist_ok=True)
+    write_json(LEDGER_PATH, new_ledger)
+
+    results.sort(key=lambda r: (r["source"], r["date"]))
+    summary = {
+        "entries": len(results),
+        "checked": len(tasks),
+        "skipped": sum(r["status"] == "skipped" for r in results),
+        "ok": sum(r["status"] == "ok" for r in results),
+        "errors": sum(r["status"] == "error" for r in results),
+        "elapsed_seconds": round(time.perf_counter() - started, 3),
+        "generated_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+    }
+    return {"summary": summary, "entries": results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="归档完整性巡检")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="并发进程数（默认 CPU 核数）")
+    parser.add_argument("--full", action="store_true", help="忽略台账，全量巡检")
+    parser.add_argument("--source", action="append", help="只巡检指定源（可重复）")
+    parser.add_argument("--report", default=str(REPORT_PATH), help="JSON 报告路径，- 表示标准输出")
+    args = parser.parse_args()
+
+    report = scrub(workers=args.workers, full=args.full, sources=args.source)
+    summary = report["summary"]
+
+    if args.report == "-":
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        write_json(Path(args.report), report)
+        for entry in report["entries"]:
+            for problem in entry["problems"]:
+                print(f"[ERROR] {entry['source']}/{entry['date']}: {problem}")
+        print(f"\n🔍 巡检完成：{summary['entries']} 个条目，检查 {summary['checked']}，"
+              f"跳过 {summary['skipped']}，异常 {summary['errors']}，耗时 {summary['elapsed_seconds']}s")
+        print(f"📄 报告: {args.report}")
+
+    sys.exit(1 if summary["errors"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+"""
+按需缩放的本地图片服务（内网镜像用）
+- GET /<源>/<日期>/image?w=<宽>&fmt=<jpeg|webp|png>  按比例缩放到指定宽度（不放大），与缩略图共用
+  fetch_bing_wallpaper.resize_image；不带 w 时返回原图。已分层的原图按指针取回 (src/storage.py)
+- 磁盘缓存：缩放结果按大小上限做 LRU 淘汰，命中时刷新 mtime，重启后按 mtime 恢复淘汰顺序
+- 请求合并：同一变体的并发请求只缩放一次，其余请求等待同一结果
+- 条件请求：ETag 由原图版本与变体参数得出，If-None-Match 命中时返回 304
+- GET /_stats  请求数、缓存命中率、304 数与耗时 p50 / p99；退出时输出同样的统计
+
+用法:
+  python scripts/serve.py --port 8000
+  python scripts/serve.py --cache-mb 2048 --cache-dir /var/cache/wallpaper
+  curl -o /dev/null "http://127.0.0.1:8000/bing/2025-12-20/image?w=1280&fmt=webp"
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from fetch_bing_wallpaper import resize_image
+from scripts.stub_services import percentile
+from src.archive import WALLPAPERS_BASE
+from src.storage import fetch_original, read_pointers
+
+ROUTE = re.compile(r"^/([a-z0-9_-]+)/(\d{4}-\d{2}-\d{2})/image$")
+FORMATS = {"jpeg": ("JPEG", "image/jpeg", "jpg"), "jpg": ("JPEG", "image/jpeg", "jpg"),
+           "webp": ("WEBP", "image/webp", "webp"), "png": ("PNG", "image/png", "png")}
+MIN_WIDTH, MAX_WIDTH = 16, 3840
+CACHE_CONTROL = "public, max-age=86400"
+LATENCY_SAMPLES = 10000
+CACHE_HEADER = {"hits": "HIT", "misses": "MISS", "coalesced": "COALESCED", "originals": "ORIGINAL"}
+
+
+class DiskLRU:
+    """按总大小上限淘汰最久未使用文件的磁盘缓存"""
+
+    def __init__(self, directory: Path, max_bytes: int):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # 文件名 -> 字节数，最久未使用的在前
+        self.total = 0
+        files = [p for p in self.directory.iterdir() if p.is_file() and not p.name.startswith(".")]
+        for path in sorted(files, key=lambda p: p.stat().st_mtime):
+            self.entries[path.name] = path.stat().st_size
+            self.total += self.entries[path.name]
+        self.evictions = 0
+        self._evict()
+
+    def get(self, name: str):
+        """命中时返回文件内容并标记为最近使用，未命中返回 None"""
+        with self.lock:
+            if name not in self.entries:
+                return None
+            self.entries.move_to_end(name)
+        path = self.directory / name
+        try:
+            data = path.read_bytes()
+            os.utime(path)
+        except FileNotFoundError:  # 读取前刚被淘汰
+            return None
+        return data
+
+    def put(self, name: str, tmp_path: Path) -> Path:
+        """把临时文件移入缓存并按上限淘汰"""
+        path = self.directory / name
+        os.replace(tmp_path, path)
+        with self.lock:
+            self.total -= self.entries.pop(name, 0)
+            self.entries[name] = path.stat().st_size
+            self.total += self.entries[name]
+            self._evict()
+        return path
+
+    def _evict(self):
+        while self.total > self.max_bytes and len(self.entries) > 1:
+            name, size = self.entries.popitem(last=False)
+            self.total -= size
+            self.evictions += 1
+            (self.directory / name).unlink(missing_ok=True)
+
+
+class ServeStats:
+    """请求计数与耗时分位数"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = {"requests": 0, "hits": 0, "misses": 0, "coalesced": 0, "originals": 0,
+                       "not_modified": 0, "errors": 0}
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+
+    def record(self, outcome: str, seconds: float):
+        with self.lock:
+            self.counts["requests"] += 1
+            self.counts[outcome] = self.counts.get(outcome, 0) + 1
+            self.latencies.append(seconds)
+
+    def snapshot(self, cache: DiskLRU) -> dict:
+        with self.lock:
+            counts, latencies = dict(self.counts), list(self.latencies)
+        lookups = counts["hits"] + counts["misses"] + counts["coalesced"]
+        p50, p99 = percentile(latencies, 50), percentile(latencies, 99)
+        return {
+            **counts,
+            "hit_ratio": round((counts["hits"] + counts["coalesced"]) / lookups, 4) if lookups else None,
+            "p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+            "p99_ms": round(p99 * 1000, 1) if p99 is not None else None,
+            "cache_files": len(cache.entries),
+            "cache_bytes": cache.total,
+            "cache_limit": cache.max_bytes,
+            "evictions": cache.evictions,
+        }
+
+
+class ResizeService:
+    """解析原图版本、查缓存、合并并发缩放"""
+
+    def __init__(self, root: Path, cache: DiskLRU):
+        self.root = Path(root)
+        self.cache = cache
+        self.stats = ServeStats()
+        self.lock = threading.Lock()
+        self.inflight = {}  # 变体文件名 -> Future
+
+    def original_version(self, entry_dir: Path):
+        """原图版本：本地文件为 (大小, mtime)，已分层的为指针中的 SHA-256；原图不存在时返回 None"""
+        local = entry_dir / "image.jpg"
+        if local.exists():
+            st = local.stat()
+            return f"{st.st_size}-{st.st_mtime_ns}"
+        pointer = read_pointers(entry_dir).get("image.jpg")
+        return pointer["sha256"] if pointer else None
+
+    def variant(self, entry_dir: Path, version: str, width: int, fmt: str) -> tuple:
+        """返回 (变体内容, 缓存结果 hits / misses / coalesced)"""
+        ext = FORMATS[fmt][2]
+        name = hashlib.sha1(f"{entry_dir.as_posix()}|{version}|{width}|{ext}".encode()).hexdigest()[:24] + f".{ext}"
+        data = self.cache.get(name)
+        if data is not None:
+            return data, "hits"
+
+        with self.lock:
+            future = self.inflight.get(name)
+            owner = future is None
+            if owner:
+                future = self.inflight[name] = Future()
+        if not owner:
+            return future.result(), "coalesced"
+
+        tmp_name = None
+        try:
+            fd, tmp_name = tempfile.mkstemp(dir=self.cache.directory, prefix=".", suffix=f".{ext}")
+            os.close(fd)
+            resize_image(fetch_original(entry_dir), Path(tmp_name), (width, MAX_WIDTH * 4), FORMATS[fmt][0])
+            data = Path(tmp_name).read_bytes()  # 移入缓存前读取，移入后可能被并发淘汰
+            self.cache.put(name, Path(tmp_name))
+            future.set_result(data)
+            return data, "misses"
+        except BaseException as e:
+            future.set_exception(e)
+            if tmp_name:
+                Path(tmp_name).unlink(missing_ok=True)
+            raise
+        finally:
+            with self.lock:
+                self.inflight.pop(name, None)
+
+
+class ResizeHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "WallpaperResize/1.0"
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def send_body(self, status: int, body: bytes, content_type: str, headers: dict = None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def do_HEAD(self):
+        self.do_GET()
+
+    def do_GET(self):
+        service = self.server.service
+        started = time.perf_counter()
+        url = urlparse(self.path)
+        if url.path == "/_stats":
+            body = json.dumps(service.stats.snapshot(service.cache), ensure_ascii=False).encode()
+            return self.send_body(200, body, "application/json")
+
+        outcome = "errors"
+        try:
+            outcome = self.serve_image(url)
+        except Exception as e:
+            self.send_body(500, f"resize failed: {e}".encode(), "text/plain; charset=utf-8")
+            if self.server.verbose:
+                import traceback
+                traceback.print_exc()
+        finally:
+            service.stats.record(outcome, time.perf_counter() - started)
+
+    def serve_image(self, url) -> str:
+        """处理图片请求，返回统计结果类别"""
+        service = self.server.service
+        match = ROUTE.match(url.path)
+        if not match:
+            self.send_body(404, b"not found", "text/plain")
+            return "errors"
+        query = parse_qs(url.query)
+        fmt = (query.get("fmt") or ["jpeg"])[0].lower()
+        width = (query.get("w") or [None])[0]
+        if fmt not in FORMATS or (width is not None and not width.isdigit()):
+            self.send_body(400, b"bad w / fmt", "text/plain")
+            return "errors"
+
+        entry_dir = service.root / match[1] / match[2]
+        version = service.original_version(entry_dir)
+        if version is None:
+            self.send_body(404, b"not found", "text/plain")
+            return "errors"
+
+        width = min(max(int(width), MIN_WIDTH), MAX_WIDTH) if width else None
+        etag = '"%s"' % hashlib.sha1(f"{version}|{width}|{FORMATS[fmt][2]}".encode()).hexdigest()[:20]
+        headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+        if etag in [t.strip() for t in self.headers.get("If-None-Match", "").split(",")]:
+            self.send_body(304, b"", FORMATS[fmt][1], headers)
+            return "not_modified"
+
+        if width is None:
+            data, outcome = fetch_original(entry_dir).read_bytes(), "originals"
+            content_type = "image/jpeg"
+        else:
+            data, outcome = service.variant(entry_dir, version, width, fmt)
+            content_type = FORMATS[fmt][1]
+        headers["X-Cache"] = CACHE_HEADER[outcome]
+        self.send_body(200, data, content_type, headers)
+        return outcome
+
+
+def start_server(host="127.0.0.1", port=8000, root: Path = WALLPAPERS_BASE,
+                 cache_dir: Path = Path(".cache/resized"), cache_bytes: int = 512 * 1024 * 1024, verbose=False):
+    """在后台线程启动服务，返回 (server, base_url)"""
+    server = ThreadingHTTPServer((host, port), ResizeHandler)
+    server.daemon_threads = True
+    server.verbose = verbose
+    server.service = ResizeService(root, DiskLRU(cache_dir, cache_bytes))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def format_stats(stats: dict) -> str:
+    ratio = f"{stats['hit_ratio']:.1%}" if stats["hit_ratio"] is not None else "-"
+    return (f"请求 {stats['requests']}（命中 {stats['hits']}，缩放 {stats['misses']}，合并 {stats['coalesced']}，"
+            f"原图 {stats['originals']}，304 {stats['not_modified']}，错误 {stats['errors']}），命中率 {ratio}，"
+            f"p50 {stats['p50_ms']}ms / p99 {stats['p99_ms']}ms，"
+            f"缓存 {stats['cache_files']} 个文件 {stats['cache_bytes'] / 1024 / 1024:.1f}/"
+            f"{stats['cache_limit'] / 1024 / 1024:.0f}MB（淘汰 {stats['evictions']}）")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="按需缩放的本地图片服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--root", default=str(WALLPAPERS_BASE), help="归档根目录")
+    parser.add_argument("--cache-dir", default=".cache/resized", help="缩放结果缓存目录")
+    parser.add_argument("--cache-mb", type=int, default=512, help="缓存大小上限 (MB)")
+    parser.add_argument("--stats-interval", type=float, default=0, help="每隔多少秒输出一次统计（0 为只在退出时输出）")
+    parser.add_argument("--verbose", action="store_true", help="输出每个请求的日志")
+    args = parser.parse_args()
+
+    server, base_url = start_server(args.host, args.port, Path(args.root), Path(args.cache_dir),
+                                    args.cache_mb * 1024 * 1024, args.verbose)
+    service = server.service
+    print(f"🖼  图片服务已启动: {base_url}/<源>/<日期>/image?w=1280&fmt=webp（统计: {base_url}/_stats）")
+    try:
+        while True:
+            time.sleep(args.stats_interval or 3600)
+            if args.stats_interval:
+                print(f"[INFO] {format_stats(service.stats.snapshot(service.cache))}")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+        print(f"\n[INFO] {format_stats(service.stats.snapshot(service.cache))}")
+
+
+if __name__ == "__main__":
+    main()
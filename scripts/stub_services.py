@@ -0,0 +1,500 @@
+#!/usr/bin/env python3
+"""
+本地替身服务：在一个端口上模拟抓取流程依赖的全部外部服务，用于离线端到端测试与压测
+- GET  /HPImageArchive.aspx         必应壁纸 API（以今天为 idx=0 生成条目，部分市场的图片不同）
+- GET  /th?id=...                   必应图片
+- GET  /photos/random               Unsplash API
+- GET  /unsplash/<id>               Unsplash 图片
+- POST /v1/chat/completions         OpenAI 兼容的对话接口
+- POST /alt/v1/chat/completions     第二个对话接口（后备 LLM 提供方，可单独注入故障）
+- POST /cgi-bin/webhook/send        企业微信机器人（key=slow-<毫秒> 的群额外延迟）
+- PUT / HEAD / GET /wallpapers/...  COS 对象存储（配合 COS_DOMAIN / COS_SCHEME 使用）
+- GET  /__stats, POST /__reset      各服务的请求数、注入的故障与服务端耗时分位数
+
+故障注入按服务配置：固定延迟 + 随机抖动、错误率（返回 503）、限流（令牌桶，超出返回 429）
+图片与 COS 对象支持 Range 请求（可用 --no-ranges 关闭），--stream-kbps 限制单连接带宽
+对话接口支持 stream=true (SSE)，--token-ms 控制每段输出的间隔，--stream-cut-rate 按概率在中途断开
+服务名: bing, bing_image, unsplash, unsplash_image, llm, llm_alt, wecom, cos
+
+用法:
+  python scripts/stub_services.py --port 8765
+  python scripts/stub_services.py --latency-ms 20 --service-latency llm=1500 --error-rate 0.05 --rate-limit 50
+"""
+
+import argparse
+import hashlib
+import io
+import json
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+import zlib
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+SERVICES = ("bing", "bing_image", "unsplash", "unsplash_image", "llm", "llm_alt", "wecom", "cos")
+DEFAULT_IMAGE_SIZE = (1920, 1080)
+STREAM_PIECE_CHARS = 4  # 流式输出每段的字数，近似一个 token
+STUB_ANALYSIS = {  # 带图片的对话请求（画面分析）返回的 JSON
+    "scene": "替身服务生成的画面分析", "subjects": ["山峦"], "colors": ["蓝", "白"], "lighting": "清晨侧光",
+    "composition": "三分构图", "location_cues": ["高原"], "mood": "宁静",
+}
+
+
+def percentile(values, pct: float):
+    """最近秩法分位数，values 为空时返回 None"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * pct // 100))  # ceil(n * pct / 100)
+    return ordered[int(rank) - 1]
+
+
+def make_jpeg(size=DEFAULT_IMAGE_SIZE, quality: int = 90) -> bytes:
+    """生成带噪点的渐变 JPEG，体积接近真实壁纸"""
+    from PIL import Image
+
+    width, height = size
+    gradient = Image.linear_gradient("L").resize(size)
+    noise = Image.effect_noise(size, 40)
+    img = Image.merge("RGB", (gradient, noise, gradient.transpose(Image.Transpose.FLIP_LEFT_RIGHT)))
+    buffer = io.BytesIO()
+    img.save(buffer, "JPEG", quality=quality)
+    return buffer.getvalue()
+
+
+class TokenBucket:
+    """每秒 rate 个令牌、容量 rate 的令牌桶"""
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self) -> bool:
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+
+class StubState:
+    """替身服务的共享状态：故障配置、限流桶、统计与对象存储"""
+
+    def __init__(self, faults: dict, image_size=DEFAULT_IMAGE_SIZE, story_chars: int = 600,
+                 ranges: bool = True, stream_kbps: float = 0, token_ms: float = 0, stream_cut_rate: float = 0):
+        self.faults = faults
+        self.buckets = {
+            name: TokenBucket(cfg["rate_limit"]) for name, cfg in faults.items() if cfg.get("rate_limit")
+        }
+        self.image = make_jpeg(image_size)
+        self.image_size = image_size
+        self.story_chars = story_chars
+        self.ranges = ranges            # 是否支持 Range 请求
+        self.stream_kbps = stream_kbps  # 单连接带宽上限，0 表示不限
+        self.token_ms = token_ms        # 流式输出每段之间的间隔
+        self.stream_cut_rate = stream_cut_rate  # 流式输出中途断开的概率
+        self.objects = {}
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.stats = defaultdict(lambda: {"requests": 0, "errors": 0, "throttled": 0, "latencies": []})
+
+    def record(self, service: str, elapsed: float, outcome: str = None):
+        with self.lock:
+            stat = self.stats[service]
+            stat["requests"] += 1
+            stat["latencies"].append(elapsed)
+            if outcome:
+                stat[outcome] += 1
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return {
+                service: {
+                    "requests": stat["requests"],
+                    "errors": stat["errors"],
+                    "throttled": stat["throttled"],
+                    "p50_ms": round(percentile(stat["latencies"], 50) * 1000, 1),
+                    "p95_ms": round(percentile(stat["latencies"], 95) * 1000, 1),
+                    "p99_ms": round(percentile(stat["latencies"], 99) * 1000, 1),
+                }
+                for service, stat in self.stats.items()
+            }
+
+
+def bing_images(idx: int, n: int, mkt: str):
+    """生成 HPImageArchive 的 images 列表；约三分之一的日期里，非中文市场使用不同的图片"""
+    today = datetime.now(timezone.utc).date()
+    images = []
+    for offset in range(idx, idx + n):
+        day = today - timedelta(days=offset)
+        start = day.strftime("%Y%m%d")
+        distinct = mkt != "zh-CN" and zlib.crc32(f"{start}{mkt}".encode()) % 3 == 0
+        variant = mkt if distinct else "shared"
+        urlbase = f"/th?id=OHR.Stub{start}{'' if variant == 'shared' else variant.replace('-', '')}_{mkt}0000"
+        images.append({
+            "startdate": start,
+            "fullstartdate": f"{start}1600",
+            "enddate": (day + timedelta(days=1)).strftime("%Y%m%d"),
+            "url": f"{urlbase}_1920x1080.jpg&rf=LaDigue_1920x1080.jpg&pid=hp",
+            "urlbase": urlbase,
+            "copyright": f"替身壁纸 {day.isoformat()} ({mkt}) (© Stub Services)",
+            "title": f"替身壁纸 {day.isoformat()}" if mkt == "zh-CN" else f"Stub wallpaper {day.isoformat()}",
+            "hsh": hashlib.md5(f"{start}{variant}".encode()).hexdigest(),
+        })
+    return images
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "StubServices/1.0"
+
+    @property
+    def state(self) -> StubState:
+        return self.server.state
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    # ---- 响应工具 ----
+
+    def send_body(self, status: int, body: bytes, content_type: str, headers: dict = None, throttle=False):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        if self.command == "HEAD":
+            return
+        if not (throttle and self.state.stream_kbps):
+            self.wfile.write(body)
+            return
+        chunk = 16 * 1024
+        try:
+            for offset in range(0, len(body), chunk):
+                self.wfile.write(body[offset:offset + chunk])
+                time.sleep(chunk / (self.state.stream_kbps * 1024))
+        except (BrokenPipeError, ConnectionResetError):
+            # 客户端读够所需区间后主动断开（分段下载的首个请求）
+            self.close_connection = True
+
+    def send_blob(self, data: bytes, content_type: str):
+        """发送文件内容：支持单区间 Range 请求，按 --stream-kbps 限速"""
+        headers = {"ETag": f'"{hashlib.md5(data).hexdigest()}"'}
+        match = re.match(r"bytes=(\d+)-(\d*)$", self.headers.get("Range", ""))
+        if not self.state.ranges or not match:
+            if self.state.ranges:
+                headers["Accept-Ranges"] = "bytes"
+            return self.send_body(200, data, content_type, headers, throttle=True)
+
+        start = int(match[1])
+        end = min(int(match[2]) if match[2] else len(data) - 1, len(data) - 1)
+        if start > end:
+            return self.send_body(416, b"", content_type, {"Content-Range": f"bytes */{len(data)}"})
+        headers.update({"Accept-Ranges": "bytes", "Content-Range": f"bytes {start}-{end}/{len(data)}"})
+        self.send_body(206, data[start:end + 1], content_type, headers, throttle=True)
+
+    def send_json(self, data, status: int = 200, headers: dict = None):
+        self.send_body(status, json.dumps(data, ensure_ascii=False).encode(), "application/json", headers)
+
+    def read_body(self) -> bytes:
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    # ---- 路由与故障注入 ----
+
+    def classify(self, url):
+        path = url.path
+        if path.startswith("/__"):
+            return None
+        if path == "/HPImageArchive.aspx":
+            return "bing"
+        if path == "/th":
+            return "bing_image"
+        if path == "/photos/random":
+            return "unsplash"
+        if path.startswith("/unsplash/"):
+            return "unsplash_image"
+        if path.endswith("/chat/completions"):
+            return "llm_alt" if path.startswith("/alt/") else "llm"
+        if path.startswith("/cgi-bin/webhook/"):
+            return "wecom"
+        return "cos"
+
+    def handle_any(self):
+        url = urlparse(self.path)
+        service = self.classify(url)
+        if service is None:
+            return self.handle_admin(url)
+
+        started = time.perf_counter()
+        fault = self.state.faults.get(service, {})
+        bucket = self.state.buckets.get(service)
+        if self.command in ("POST", "PUT"):
+            body = self.read_body()
+        else:
+            body = b""
+
+        if bucket and not bucket.take():
+            self.send_json({"error": "rate limited"}, 429, {"Retry-After": "1"})
+            return self.state.record(service, time.perf_counter() - started, "throttled")
+
+        delay = fault.get("latency_ms", 0) + random.uniform(0, fault.get("jitter_ms", 0))
+        if delay:
+            time.sleep(delay / 1000)
+
+        if random.random() < fault.get("error_rate", 0):
+            self.send_json({"error": "injected failure"}, 503)
+            return self.state.record(service, time.perf_counter() - started, "errors")
+
+        outcome = getattr(self, f"serve_{service}")(url, body)
+        self.state.record(service, time.perf_counter() - started, outcome)
+
+    def handle_admin(self, url):
+        if url.path == "/__stats":
+            return self.send_json(self.state.snapshot())
+        if url.path == "/__reset":
+            self.read_body()
+            self.state.reset()
+            return self.send_json({"ok": True})
+        self.send_json({"error": "not found"}, 404)
+
+    do_GET = do_POST = do_PUT = do_HEAD = handle_any
+
+    # ---- 各服务 ----
+
+    def serve_bing(self, url, body):
+        query = parse_qs(url.query)
+        idx = int(query.get("idx", ["0"])[0])
+        n = int(query.get("n", ["1"])[0])
+        mkt = query.get("mkt", ["zh-CN"])[0]
+        self.send_json({"images": bing_images(idx, n, mkt)})
+
+    def serve_bing_image(self, url, body):
+        self.send_blob(self.state.image, "image/jpeg")
+
+    def serve_unsplash(self, url, body):
+        photo_id = uuid.uuid4().hex[:11]
+        base = f"http://{self.headers['Host']}"
+        width, height = self.state.image_size
+        self.send_json({
+            "id": photo_id,
+            "width": width,
+            "height": height,
+            "description": f"Stub photo {photo_id}",
+            "alt_description": "a stub landscape",
+            "urls": {"raw": f"{base}/unsplash/{photo_id}", "full": f"{base}/unsplash/{photo_id}?full"},
+            "links": {"html": f"https://unsplash.com/photos/{photo_id}"},
+            "user": {"name": "Stub Photographer"},
+        })
+
+    def serve_unsplash_image(self, url, body):
+        self.send_blob(self.state.image, "image/jpeg")
+
+    def serve_llm(self, url, body):
+        paragraph = "这是一段由替身服务生成的壁纸故事，用于离线测试与压测。"
+        text = "# 替身故事\n\n" + (paragraph * (self.state.story_chars // len(paragraph) + 1))[:self.state.story_chars]
+        request = json.loads(body or b"{}")
+        if any(isinstance(m.get("content"), list) and any(part.get("type") == "image_url" for part in m["content"])
+               for m in request.get("messages", [])):
+            text = json.dumps(STUB_ANALYSIS, ensure_ascii=False)  # 带图片的请求为画面分析
+        if request.get("stream"):
+            return self.stream_llm(text, request)
+        self.send_json({
+            "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+            "object": "chat.completion",
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": len(body) // 4, "completion_tokens": len(text), "total_tokens": len(body) // 4 + len(text)},
+        })
+
+    serve_llm_alt = serve_llm
+
+    def stream_llm(self, text: str, request: dict):
+        """SSE 流式输出；续写请求（消息末尾带 assistant 前缀）只输出剩余部分，断开时返回 "errors" 计入统计"""
+        prefix = next((m["content"] for m in reversed(request.get("messages", []))
+                       if m.get("role") == "assistant"), "")
+        if prefix and text.startswith(prefix):
+            text = text[len(prefix):]
+        pieces = [text[i:i + STREAM_PIECE_CHARS] for i in range(0, len(text), STREAM_PIECE_CHARS)]
+        cut_at = len(pieces) // 2 if random.random() < self.state.stream_cut_rate else None
+        chunk_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        def event(payload):
+            self.wfile.write(f"data: {payload}\n\n".encode())
+            self.wfile.flush()
+
+        try:
+            for index, piece in enumerate(pieces):
+                if index == cut_at:
+                    return "errors"  # 不发送结束标记直接断开
+                event(json.dumps({"id": chunk_id, "object": "chat.completion.chunk",
+                                  "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]},
+                                 ensure_ascii=False))
+                if self.state.token_ms:
+                    time.sleep(self.state.token_ms / 1000)
+            event(json.dumps({"id": chunk_id, "object": "chat.completion.chunk",
+                              "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}))
+            if (request.get("stream_options") or {}).get("include_usage"):
+                prompt_tokens = len(json.dumps(request)) // 4
+                event(json.dumps({"id": chunk_id, "object": "chat.completion.chunk", "choices": [],
+                                  "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(pieces),
+                                            "total_tokens": prompt_tokens + len(pieces)}}))
+            event("[DONE]")
+        except (BrokenPipeError, ConnectionResetError):
+            return "errors"
+
+    def serve_wecom(self, url, body):
+        # key 形如 slow-500 时额外延迟 500ms，模拟某个群响应缓慢
+        key = parse_qs(url.query).get("key", [""])[0]
+        if key.startswith("slow-"):
+            time.sleep(float(key[5:]) / 1000)
+        self.send_json({"errcode": 0, "errmsg": "ok"})
+
+    def serve_cos(self, url, body):
+        key = url.path.lstrip("/")
+        if self.command == "PUT":
+            with self.state.lock:
+                self.state.objects[key] = body
+            etag = f'"{hashlib.md5(body).hexdigest()}"'
+            return self.send_body(200, b"", "application/xml", {"ETag": etag})
+
+        data = self.state.objects.get(key)
+        if data is None:
+            return self.send_body(404, b"", "application/xml")
+        self.send_blob(data, "application/octet-stream")
+
+
+def parse_overrides(items, cast=float):
+    """解析 service=value 形式的覆盖参数"""
+    overrides = {}
+    for item in items or []:
+        name, _, value = item.partition("=")
+        if name not in SERVICES:
+            raise ValueError(f"未知服务: {name}（可选 {', '.join(SERVICES)}）")
+        overrides[name] = cast(value)
+    return overrides
+
+
+def build_faults(latency_ms=0.0, jitter_ms=0.0, error_rate=0.0, rate_limit=0.0,
+                 service_latency=None, service_error_rate=None, service_rate_limit=None) -> dict:
+    """合并全局与按服务的故障配置，返回 {服务: {latency_ms, jitter_ms, error_rate, rate_limit}}"""
+    service_latency = service_latency or {}
+    service_error_rate = service_error_rate or {}
+    service_rate_limit = service_rate_limit or {}
+    return {
+        name: {
+            "latency_ms": service_latency.get(name, latency_ms),
+            "jitter_ms": jitter_ms,
+            "error_rate": service_error_rate.get(name, error_rate),
+            "rate_limit": service_rate_limit.get(name, rate_limit),
+        }
+        for name in SERVICES
+    }
+
+
+def start_server(host="127.0.0.1", port=0, faults=None, image_size=DEFAULT_IMAGE_SIZE,
+                 story_chars=600, verbose=False, ranges=True, stream_kbps=0, token_ms=0, stream_cut_rate=0):
+    """在后台线程中启动替身服务，返回 (server, 基础地址)；port=0 时自动分配端口"""
+    server = ThreadingHTTPServer((host, port), StubHandler)
+    server.daemon_threads = True
+    server.verbose = verbose
+    server.state = StubState(faults or build_faults(), image_size, story_chars, ranges, stream_kbps,
+                             token_ms, stream_cut_rate)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def add_fault_arguments(parser):
+    """故障注入相关参数（load_test.py 复用）"""
+    parser.add_argument("--latency-ms", type=float, default=0, help="每个请求的固定延迟")
+    parser.add_argument("--jitter-ms", type=float, default=0, help="额外的随机延迟上限")
+    parser.add_argument("--error-rate", type=float, default=0, help="返回 503 的概率 (0~1)")
+    parser.add_argument("--rate-limit", type=float, default=0, help="每个服务每秒允许的请求数，0 表示不限")
+    parser.add_argument("--service-latency", action="append", metavar="SERVICE=MS", help="按服务覆盖延迟（可重复）")
+    parser.add_argument("--service-error-rate", action="append", metavar="SERVICE=RATE", help="按服务覆盖错误率（可重复）")
+    parser.add_argument("--service-rate-limit", action="append", metavar="SERVICE=RPS", help="按服务覆盖限流（可重复）")
+    parser.add_argument("--image-size", default="1920x1080", help="图片尺寸，如 3840x2160")
+    parser.add_argument("--story-chars", type=int, default=600, help="替身故事的字数")
+    parser.add_argument("--no-ranges", action="store_true", help="图片与对象不支持 Range 请求")
+    parser.add_argument("--stream-kbps", type=float, default=0, help="单连接带宽上限 (KB/s)，0 表示不限")
+    parser.add_argument("--token-ms", type=float, default=0, help="对话接口流式输出每段之间的间隔")
+    parser.add_argument("--stream-cut-rate", type=float, default=0, help="流式输出中途断开的概率 (0~1)")
+
+
+def faults_from_args(args) -> dict:
+    return build_faults(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        rate_limit=args.rate_limit,
+        service_latency=parse_overrides(args.service_latency),
+        service_error_rate=parse_overrides(args.service_error_rate),
+        service_rate_limit=parse_overrides(args.service_rate_limit),
+    )
+
+
+def parse_size(text: str):
+    width, height = text.lower().split("x")
+    return int(width), int(height)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="抓取流程外部服务的本地替身")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--verbose", action="store_true", help="输出每个请求的访问日志")
+    add_fault_arguments(parser)
+    args = parser.parse_args()
+
+    try:
+        faults = faults_from_args(args)
+    except ValueError as e:
+        parser.error(str(e))
+    server, base_url = start_server(
+        args.host, args.port, faults, parse_size(args.image_size), args.story_chars, args.verbose,
+        ranges=not args.no_ranges, stream_kbps=args.stream_kbps, token_ms=args.token_ms,
+        stream_cut_rate=args.stream_cut_rate
+    )
+
+    print(f"🧪 替身服务已启动: {base_url}")
+    print("   使用以下环境变量让抓取脚本指向替身服务:")
+    print(f"   BING_BASE_URL={base_url}")
+    print(f"   UNSPLASH_API_BASE={base_url} UNSPLASH_ACCESS_KEY=stub")
+    print(f"   LLM_BASE_URL={base_url}/v1 LLM_API_KEY=stub")
+    print(f"   LLM_FALLBACK_BASE_URL={base_url}/alt/v1 LLM_FALLBACK_API_KEY=stub LLM_FALLBACK_MODEL_NAME=stub-alt")
+    print(f"   WEWORK_WEBHOOK={base_url}/cgi-bin/webhook/send?key=stub")
+    print(f"   COS_DOMAIN={base_url.split('://')[1]} COS_SCHEME=http "
+          "COS_SECRET_ID=stub COS_SECRET_KEY=stub COS_REGION=ap-stub COS_BUCKET=stub-1250000000")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+        print("\n" + json.dumps(server.state.snapshot(), ensure_ascii=False, indent=2))
+        sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
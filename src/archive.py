@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+壁纸归档工具
+- 原子写入：先写临时文件再 rename，崩溃时不会留下半截文件
+- 按需写入：生成产物（README、画廊、meta.json、索引等）内容未变时不重写，并统计写入 / 未变化的文件数
+- 断点状态：每个条目目录下的 .checkpoint.json 记录已完成的阶段
+- 归档遍历：按源 / 日期遍历 docs/wallpapers
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+
+
+WALLPAPERS_BASE = Path("docs/wallpapers")
+CHECKPOINT_FILE = ".checkpoint.json"
+STORY_PARTIAL_FILE = ".story.partial.md"  # 流式生成中途失败时保留的故事片段，供下次续写
+
+# 一个完整条目必须具备的文件
+REQUIRED_ARTIFACTS = ("image.jpg", "thumb.jpg", "meta.json")
+
+# 生成产物的写入统计，本进程内累计，由入口脚本在运行结束时输出 (log_write_summary)
+WRITE_STATS = {"written": 0, "unchanged": 0}
+
+
+@contextmanager
+def atomic_output(path: Path):
+    """
+    原子写入上下文：产出同目录下的临时文件路径，成功退出后 rename 为目标文件
+    出错时删除临时文件，目标文件保持原样
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    os.close(fd)
+    tmp_path = Path(tmp_name)
+    os.chmod(tmp_path, 0o644)  # mkstemp 默认 0600，与普通文件权限保持一致
+    try:
+        yield tmp_path
+        os.replace(tmp_path, path)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+
+def atomic_write_bytes(path: Path, data: bytes):
+    """原子写入二进制内容"""
+    with atomic_output(path) as tmp_path:
+        tmp_path.write_bytes(data)
+
+
+def atomic_write_text(path: Path, text: str):
+    """原子写入文本内容 (UTF-8)"""
+    with atomic_output(path) as tmp_path:
+        tmp_path.write_text(text, encoding="utf-8")
+
+
+def write_if_changed(path: Path, content) -> bool:
+    """
+    生成产物的统一写入：内容 SHA-256 与现有文件一致时跳过（不改 mtime，也不产生提交差异），否则原子写入
+    content 为 str 时按 UTF-8 编码；返回是否写入，并计入 WRITE_STATS
+    """
+    path = Path(path)
+    data = content.encode("utf-8") if isinstance(content, str) else content
+    if path.exists() and path.stat().st_size == len(data) and \
+            hashlib.sha256(path.read_bytes()).digest() == hashlib.sha256(data).digest():
+        WRITE_STATS["unchanged"] += 1
+        return False
+    atomic_write_bytes(path, data)
+    WRITE_STATS["written"] += 1
+    return True
+
+
+def log_write_summary():
+    """输出本次运行生成产物的写入统计"""
+    if WRITE_STATS["written"] or WRITE_STATS["unchanged"]:
+        print(f"[INFO] 生成产物: 写入 {WRITE_STATS['written']} 个，内容未变跳过 {WRITE_STATS['unchanged']} 个")
+
+
+def write_json(path: Path, data: dict, if_changed: bool = False) -> bool:
+    """
+    以仓库统一格式 (ensure_ascii=False, indent=2) 原子写入 JSON
+    if_changed 用于生成产物（meta.json、坐标表等）：内容未变时不重写，见 write_if_changed
+    """
+    text = json.dumps(data, ensure_ascii=False, indent=2)
+    if if_changed:
+        return write_if_changed(path, text)
+    atomic_write_text(path, text)
+    return True
+
+
+def write_meta(entry_dir: Path, fields: dict) -> dict:
+    """
+    合并写入条目的 meta.json：保留已有字段（画廊占位图 thumb、原图指针 originals 等），以 fields 覆盖同名字段，
+    内容未变时不重写；返回合并后的元数据
+    """
+    meta_path = Path(entry_dir) / "meta.json"
+    meta = {}
+    if meta_path.exists():
+        try:
+            meta = json.loads(meta_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            meta = {}
+    meta.update(fields)
+    write_json(meta_path, meta, if_changed=True)
+    return meta
+
+
+def load_checkpoint(entry_dir: Path) -> dict:
+    """读取条目的断点状态，不存在或损坏时返回空状态"""
+    path = Path(entry_dir) / CHECKPOINT_FILE
+    if path.exists():
+        try:
+            return json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            pass
+    return {"stages": {}}
+
+
+def update_checkpoint(entry_dir: Path, **fields) -> dict:
+    """合并写入断点状态中的顶层字段（如 meta 草稿）"""
+    checkpoint = load_checkpoint(entry_dir)
+    checkpoint.update(fields)
+    write_json(Path(entry_dir) / CHECKPOINT_FILE, checkpoint, if_changed=True)
+    return checkpoint
+
+
+def mark_stage(entry_dir: Path, stage: str, **info) -> dict:
+    """
+    记录某个阶段已完成（附带完成时间和额外信息）
+    已记录且额外信息相同时不改写：断点文件位于 docs/ 下随仓库提交，重跑不应产生变更
+    """
+    checkpoint = load_checkpoint(entry_dir)
+    recorded = checkpoint.get("stages", {}).get(stage)
+    if recorded is not None and {k: v for k, v in recorded.items() if k != "done_at"} == info:
+        return checkpoint
+    checkpoint.setdefault("stages", {})[stage] = {
+        "done_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        **info
+    }
+    write_json(Path(entry_dir) / CHECKPOINT_FILE, checkpoint)
+    return checkpoint
+
+
+def is_entry_complete(entry_dir: Path) -> bool:
+    """条目是否已完整归档（原图、缩略图、元数据齐全；已分层的原图以 meta.json 中的指针为准）"""
+    entry_dir = Path(entry_dir)
+    if all((entry_dir / name).exists() for name in REQUIRED_ARTIFACTS):
+        return True
+    if not all((entry_dir / name).exists() for name in REQUIRED_ARTIFACTS if name != "image.jpg"):
+        return False
+    from src.storage import has_original  # 延迟导入，避免循环依赖
+    return has_original(entry_dir)
+
+
+def iter_entries(sources=None, base: Path = WALLPAPERS_BASE):
+    """
+    遍历归档条目，按源名、日期升序产出 (源名, 日期, 条目目录)
+    sources 为 None 时遍历所有源
+    """
+    base = Path(base)
+    if not base.exists():
+        return
+    for source_dir in sorted(base.iterdir()):
+        if not source_dir.is_dir() or source_dir.name.startswith('.'):
+            continue
+        if sources and source_dir.name not in sources:
+            continue
+        for entry_dir in sorted(source_dir.iterdir()):
+            if entry_dir.is_dir() and not entry_dir.name.startswith('.'):
+                yield source_dir.name, entry_dir.name, entry_dir
+
+
+def entry_upload_files(entry_dir: Path):
+    """条目中需要分发到 COS 的文件（含多市场图片），按上传顺序排列"""
+    entry_dir = Path(entry_dir)
+    names = ["image.jpg", "thumb.jpg", "story.md"]
+    names += sorted(p.name for p in entry_dir.glob("image_*.jpg"))
+    names.append("meta.json")  # 元数据最后上传，作为条目完整的标志
+    return [entry_dir / name for name in names if (entry_dir / name).exists()]
+
+
+def upload_entry_to_cos(entry_dir: Path) -> bool:
+    """
+    上传条目的全部文件到 COS，并在断点状态中记录已上传文件的大小
+    COS 未配置或任一文件失败时返回 False（不记录 cos 阶段）
+    """
+    from src.utils import cos_configured, upload_to_cos
+
+    if not cos_configured():
+        print("[INFO] COS 配置不全，跳过 COS 上传")
+        return False
+
+    entry_dir = Path(entry_dir)
+    cos_base_path = f"wallpapers/{entry_dir.parent.name}/{entry_dir.name}"
+    uploaded = {}
+    for path in entry_upload_files(entry_dir):
+        if not upload_to_cos(str(path), f"{cos_base_path}/{path.name}"):
+            return False
+        uploaded[path.name] = path.stat().st_size
+
+    mark_stage(entry_dir, "cos", files=uploaded)
+    return True
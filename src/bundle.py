@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+按月打包归档
+把某个源一个月的原图、缩略图、故事和元数据打成单个 tar.zst（未安装 zstandard 时为 zip），供整月下载
+- 流水线：条目 -> 成员 -> 成员摘要 -> 写入器，逐个成员以固定大小的块从磁盘复制到压缩流，
+  内存占用与当月文件数量和大小无关；已分层的原图按指针取回到 .cache/originals 后再写入
+- 增量：清单记录每个成员的 SHA-256 与上传记录，随仓库提交在 data/bundles/<源>/ 下（包本身在 dist/，不提交）；
+  成员与上次构建完全一致、且包文件仍在本地或已上传过同一版本时跳过，CI 的全新检出也不会重复构建和上传。
+  文件摘要按 (size, mtime) 缓存在 .cache/bundle_hashes.json，未改动的文件不重复计算
+- 可复现：成员按路径排序，时间戳取条目日期，属主信息清空，相同输入得到相同的包
+"""
+
+import json
+import shutil
+import tarfile
+import time
+import zipfile
+from datetime import datetime, timezone
+from functools import lru_cache
+from pathlib import Path
+
+from src.archive import atomic_output, iter_entries, write_json
+from src.storage import file_sha256, read_pointers
+
+DEFAULT_BUNDLE = {"format": "tar.zst", "level": 10, "dir": "dist/bundles", "manifest_dir": "data/bundles"}
+FORMATS = ("tar.zst", "zip")
+HASH_CACHE = Path(".cache/bundle_hashes.json")
+CHUNK_SIZE = 1024 * 1024
+STORED_SUFFIXES = (".jpg", ".jpeg", ".png", ".webp")  # 已压缩的格式在 zip 中不再压缩
+
+
+@lru_cache(maxsize=1)
+def get_bundle_config() -> dict:
+    """读取 config/sources.yaml 中的 bundle 配置"""
+    from src.config_loader import load_sources_config
+    config = dict(DEFAULT_BUNDLE)
+    config.update(load_sources_config().get("bundle") or {})
+    return config
+
+
+@lru_cache(maxsize=None)
+def resolve_format(fmt: str) -> str:
+    """tar.zst 需要 zstandard，未安装时回退为 zip"""
+    if fmt == "tar.zst":
+        try:
+            import zstandard  # noqa: F401
+        except ImportError:
+            print("[WARN] 未安装 zstandard，改为打包 zip（pip install zstandard 后可生成 tar.zst）")
+            return "zip"
+    return fmt
+
+
+def list_months(source: str):
+    """某个源有归档条目的月份 (YYYY-MM)，升序"""
+    return sorted({date[:7] for _, date, _ in iter_entries([source])})
+
+
+class Member:
+    """包内的一个文件：arcname 为包内路径，open_path() 返回可读取的本地路径"""
+
+    def __init__(self, arcname: str, entry_dir: Path, name: str, size: int, sha256: str, mtime: int):
+        self.arcname = arcname
+        self.entry_dir = entry_dir
+        self.name = name
+        self.size = size
+        self.sha256 = sha256
+        self.mtime = mtime
+
+    def open_path(self) -> Path:
+        local = self.entry_dir / self.name
+        if local.exists():
+            return local
+        from src.storage import fetch_original
+        return fetch_original(self.entry_dir, self.name)
+
+
+class HashCache:
+    """按 (size, mtime_ns) 缓存文件 SHA-256"""
+
+    def __init__(self, path: Path = HASH_CACHE):
+        self.path = Path(path)
+        self.entries = {}
+        self.dirty = False
+        if self.path.exists():
+            try:
+                self.entries = json.loads(self.path.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                pass
+
+    def digest(self, path: Path) -> str:
+        st = path.stat()
+        key = path.as_posix()
+        cached = self.entries.get(key)
+        if cached and cached[:2] == [st.st_size, st.st_mtime_ns]:
+            return cached[2]
+        sha256 = file_sha256(path)
+        self.entries[key] = [st.st_size, st.st_mtime_ns, sha256]
+        self.dirty = True
+        return sha256
+
+    def save(self):
+        if self.dirty:
+            write_json(self.path, self.entries)
+            self.dirty = False
+
+
+def iter_month_entries(source: str, month: str):
+    """某个源某月的条目 (日期, 目录)"""
+    for _, date, entry_dir in iter_entries([source]):
+        if date.startswith(month):
+            yield date, entry_dir
+
+
+def iter_entry_files(entry_dir: Path):
+    """条目中要打包的文件名：原图（含多市场图片，已分层的以指针为准）、缩略图、故事、元数据"""
+    originals = {p.name for p in entry_dir.glob("image*.jpg")} | set(read_pointers(entry_dir))
+    names = sorted(originals) + ["thumb.jpg", "story.md", "meta.json"]
+    for name in names:
+        if name in originals or (entry_dir / name).exists():
+            yield name
+
+
+def iter_members(source: str, month: str, hashes: HashCache):
+    """逐个产出某月的包成员及其摘要"""
+    root = f"{source}-{month}"
+    for date, entry_dir in iter_month_entries(source, month):
+        mtime = int(datetime.strptime(date, "%Y-%m-%d").replace(tzinfo=timezone.utc).timestamp())
+        pointers = None
+        for name in iter_entry_files(entry_dir):
+            path = entry_dir / name
+            if path.exists():
+                size, sha256 = path.stat().st_size, hashes.digest(path)
+            else:
+                pointers = pointers if pointers is not None else read_pointers(entry_dir)
+                size, sha256 = pointers[name]["bytes"], pointers[name]["sha256"]
+            yield Member(f"{root}/{date}/{name}", entry_dir, name, size, sha256, mtime)
+
+
+def write_tar_zst(members, out_path: Path, level: int):
+    """把成员流式写入 tar.zst"""
+    import zstandard
+
+    compressor = zstandard.ZstdCompressor(level=level, threads=-1)
+    with open(out_path, "wb") as raw, compressor.stream_writer(raw, closefd=False) as zst, \
+            tarfile.open(fileobj=zst, mode="w|", format=tarfile.PAX_FORMAT) as tar:
+        for member in members:
+            info = tarfile.TarInfo(member.arcname)
+            info.size, info.mtime, info.mode = member.size, member.mtime, 0o644
+            with open(member.open_path(), "rb") as f:
+                tar.addfile(info, f)
+
+
+def write_zip(members, out_path: Path, level: int):
+    """把成员流式写入 zip；图片不再压缩，文本用 deflate（默认级别，level 只作用于 tar.zst）"""
+    with zipfile.ZipFile(out_path, "w") as zf:
+        for member in members:
+            info = zipfile.ZipInfo(member.arcname, datetime.fromtimestamp(member.mtime, timezone.utc).timetuple()[:6])
+            info.external_attr = 0o644 << 16
+            if not member.arcname.lower().endswith(STORED_SUFFIXES):
+                info.compress_type = zipfile.ZIP_DEFLATED
+            with open(member.open_path(), "rb") as src, zf.open(info, "w", force_zip64=True) as dst:
+                shutil.copyfileobj(src, dst, CHUNK_SIZE)
+
+
+WRITERS = {"tar.zst": write_tar_zst, "zip": write_zip}
+
+
+def bundle_paths(source: str, month: str, fmt: str, out_dir: Path):
+    """(包路径, 清单路径)；清单与包分开存放，随仓库提交"""
+    stem = f"{source}-{month}"
+    manifest_dir = Path(get_bundle_config()["manifest_dir"]) / source
+    return Path(out_dir) / source / f"{stem}.{fmt}", manifest_dir / f"{stem}.json"
+
+
+def is_current(manifest: dict, fmt: str, digests: dict, out_path: Path) -> bool:
+    """清单与当前成员一致，且包文件在本地或同一版本已上传"""
+    if manifest.get("format") != fmt or manifest.get("members") != digests:
+        return False
+    uploaded = (manifest.get("uploaded") or {}).get("sha256")
+    return out_path.exists() or (uploaded is not None and uploaded == manifest.get("sha256"))
+
+
+def load_manifest(path: Path) -> dict:
+    if path.exists():
+        try:
+            return json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            pass
+    return {}
+
+
+def build_bundle(source: str, month: str, fmt: str = None, level: int = None, out_dir: Path = None,
+                 force: bool = False, hashes: HashCache = None) -> dict:
+    """
+    构建某个源某月的包；成员摘要与上次构建一致、且包文件存在或已上传时跳过
+    返回清单 {"source", "month", "format", "file", "members", "entries", "input_bytes", "bytes",
+    "seconds", "built_at", "rebuilt"}；当月没有条目时返回 None
+    """
+    config = get_bundle_config()
+    fmt = resolve_format(fmt or config["format"])
+    level = int(level or config["level"])
+    out_dir = Path(out_dir or config["dir"])
+    hashes = hashes or HashCache()
+
+    members = list(iter_members(source, month, hashes))  # 只保留路径与摘要，文件内容在写入时再读取
+    hashes.save()
+    if not members:
+        return None
+    digests = {m.arcname: m.sha256 for m in members}
+
+    out_path, manifest_path = bundle_paths(source, month, fmt, out_dir)
+    manifest = load_manifest(manifest_path)
+    if not force and is_current(manifest, fmt, digests, out_path):
+        return {**manifest, "rebuilt": False}
+
+    started = time.perf_counter()
+    with atomic_output(out_path) as tmp_path:
+        WRITERS[fmt](iter(members), tmp_path, level)
+    for stale in FORMATS:
+        stale_path = bundle_paths(source, month, stale, out_dir)[0]
+        if stale != fmt and stale_path.exists():
+            stale_path.unlink()
+
+    manifest = {
+        "source": source,
+        "month": month,
+        "format": fmt,
+        "file": out_path.name,
+        "entries": len({m.entry_dir for m in members}),
+        "input_bytes": sum(m.size for m in members),
+        "bytes": out_path.stat().st_size,
+        "sha256": file_sha256(out_path),
+        "seconds": round(time.perf_counter() - started, 3),
+        "built_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "members": digests,
+    }
+    write_json(manifest_path, manifest)
+    return {**manifest, "rebuilt": True}
+
+
+def upload_bundle(manifest: dict, out_dir: Path = None) -> str:
+    """把包上传到对象存储的 bundles/<源>/ 下，返回访问地址（失败返回 None，没有公开地址时为空字符串），并记录到清单"""
+    from src.storage import put_object
+
+    out_dir = Path(out_dir or get_bundle_config()["dir"])
+    out_path, manifest_path = bundle_paths(manifest["source"], manifest["month"], manifest["format"], out_dir)
+    url = put_object(out_path, f"bundles/{manifest['source']}/{out_path.name}")
+    if url is not None:
+        stored = load_manifest(manifest_path)
+        stored["uploaded"] = {"url": url, "sha256": manifest["sha256"]} if url else {"sha256": manifest["sha256"]}
+        write_json(manifest_path, stored)
+    return url
+
+
+def describe(manifest: dict) -> str:
+    """一行构建统计"""
+    mb_in, mb_out = manifest["input_bytes"] / 1024 / 1024, manifest["bytes"] / 1024 / 1024
+    ratio = manifest["bytes"] / manifest["input_bytes"] if manifest["input_bytes"] else 0
+    speed = mb_in / manifest["seconds"] if manifest["seconds"] else 0
+    return (f"{manifest['file']}: {manifest['entries']} 个条目 / {len(manifest['members'])} 个文件，"
+            f"{mb_in:.1f}MB -> {mb_out:.1f}MB ({ratio:.1%})，{manifest['seconds']:.2f}s ({speed:.0f}MB/s)")
@@ -3,7 +3,6 @@
 配置加载器 - 管理壁纸源配置
 """
 
-import yaml
 from pathlib import Path
 from typing import List, Dict, Any
 
@@ -12,6 +11,7 @@ def load_sources_config() -> Dict[str, Any]:
     """加载壁纸源配置"""
     config_path = Path("config/sources.yaml")
     if config_path.exists():
+        import yaml  # 按需导入，避免拖慢不读取配置的快速路径
         return yaml.safe_load(config_path.read_text(encoding="utf-8"))
     
     # 默认配置
@@ -36,6 +36,15 @@ def get_enabled_sources() -> List[Dict[str, Any]]:
     return [s for s in config.get("sources", []) if s.get("enabled", False)]
 
 
+def get_source_config(name: str) -> Dict[str, Any]:
+    """获取指定壁纸源的配置（未配置时返回空字典）"""
+    config = load_sources_config()
+    for source in config.get("sources", []):
+        if source.get("name") == name:
+            return source
+    return {}
+
+
 def get_display_config() -> Dict[str, Any]:
     """获取显示配置"""
     config = load_sources_config()
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+常驻模式 (python fetch_bing_wallpaper.py --daemon)
+在一个进程内循环抓取，HTTP 连接（src/resilience.py 的共享 Session）与已加载的模块在轮询之间保持复用
+- 发布时刻学习：记录必应 API 返回的 fullstartdate 历史，按其 UTC 时刻推算下一张壁纸的预计发布时间，
+  只在预计时刻附近密集轮询；窗口之外休眠（每隔数小时兜底轮询一次，发布时刻变化时也能发现）
+- 新内容出现后立即在进程内运行必应抓取流程；其他启用的源（Unsplash）每个 UTC 日运行一次
+- 健康文件：心跳、当前阶段、上次轮询 / 新内容 / 错误、下次唤醒时间，供外部探活
+- SIGTERM / SIGINT：休眠中立即退出，流程执行中则等当前流程完成后退出；再次收到信号时强制退出
+"""
+
+import json
+import os
+import signal
+import statistics
+import threading
+import time
+import traceback
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from src.archive import is_entry_complete, write_json
+
+PUBLISH_HISTORY_FILE = Path(".cache/bing_publish.json")
+HISTORY_LIMIT = 60           # 保留的 fullstartdate 条数
+WINDOW_LEAD = 10 * 60        # 预计发布时刻之前开始密集轮询（秒）
+WINDOW_TAIL = 30 * 60        # 预计发布时刻之后继续密集轮询
+DENSE_INTERVAL = 60          # 窗口内轮询间隔
+LATE_INTERVAL = 5 * 60       # 超过窗口仍未发布时的轮询间隔
+SPARSE_INTERVAL = 3 * 3600   # 窗口之外的兜底轮询间隔
+LEARNING_INTERVAL = 15 * 60  # 尚无历史时的轮询间隔
+DAILY_RETRY = 3600           # 每日源失败后的重试间隔
+ERROR_BACKOFF_MAX = 30 * 60
+
+
+def parse_fullstartdate(value: str) -> datetime:
+    """"202510181600" -> UTC datetime"""
+    return datetime.strptime(value, "%Y%m%d%H%M").replace(tzinfo=timezone.utc)
+
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class PublishSchedule:
+    """必应发布时刻的历史与轮询节奏"""
+
+    def __init__(self, path: Path = PUBLISH_HISTORY_FILE):
+        self.path = Path(path)
+        self.seen = {}  # fullstartdate -> 首次观察到的时间（ISO，由种子数据得到的为 None）
+        if self.path.exists():
+            try:
+                self.seen = json.loads(self.path.read_text(encoding="utf-8")).get("seen", {})
+            except (OSError, ValueError):
+                pass
+
+    def observe(self, images, first_seen: datetime = None) -> list:
+        """记录 API 返回的图片，返回新出现的 fullstartdate 列表"""
+        new = [img["fullstartdate"] for img in images
+               if img.get("fullstartdate") and img["fullstartdate"] not in self.seen]
+        for value in new:
+            self.seen[value] = first_seen.isoformat(timespec="seconds") if first_seen else None
+        if new:
+            keep = sorted(self.seen)[-HISTORY_LIMIT:]
+            self.seen = {k: self.seen[k] for k in keep}
+            write_json(self.path, {"seen": self.seen})
+        return new
+
+    def latest(self):
+        return parse_fullstartdate(max(self.seen)) if self.seen else None
+
+    def publish_minute(self):
+        """历史发布时刻（UTC 当日分钟数）的中位数与最大偏差，按跨零点处理；没有历史时返回 None"""
+        minutes = [parse_fullstartdate(v) for v in self.seen]
+        minutes = [t.hour * 60 + t.minute for t in minutes]
+        if not minutes:
+            return None
+        ref = minutes[-1]
+        offsets = [(m - ref + 720) % 1440 - 720 for m in minutes]
+        center = statistics.median(offsets)
+        spread = max(abs(o - center) for o in offsets)
+        return (ref + center) % 1440, spread
+
+    def expected_next(self):
+        """下一张壁纸的预计发布时间与时刻偏差（分钟），没有历史时返回 (None, 0)"""
+        latest, learned = self.latest(), self.publish_minute()
+        if latest is None or learned is None:
+            return None, 0
+        center, spread = learned
+        target = latest + timedelta(days=1)
+        midnight = target.replace(hour=0, minute=0, second=0, microsecond=0)
+        candidates = [midnight + timedelta(days=d, minutes=center) for d in (-1, 0, 1)]
+        return min(candidates, key=lambda c: abs(c - target)), spread
+
+    def next_poll(self, now: datetime):
+        """返回 (距下次轮询的秒数, 阶段)；阶段为 learning / idle / window / late"""
+        expected, spread = self.expected_next()
+        if expected is None:
+            return LEARNING_INTERVAL, "learning"
+        start = expected - timedelta(seconds=WINDOW_LEAD, minutes=spread)
+        end = expected + timedelta(seconds=WINDOW_TAIL, minutes=spread)
+        if now < start:
+            return min((start - now).total_seconds(), SPARSE_INTERVAL), "idle"
+        if now <= end:
+            return DENSE_INTERVAL, "window"
+        return LATE_INTERVAL, "late"
+
+
+class Daemon:
+    def __init__(self, args, schedule: PublishSchedule = None):
+        self.args = args
+        self.schedule = schedule or PublishSchedule()
+        self.health_path = Path(args.health_file)
+        self.stop = threading.Event()
+        self.failures = 0
+        self.daily_attempts = {}  # 源名 -> (UTC 日期, 上次尝试的 monotonic 时间)
+        self.health = {
+            "pid": os.getpid(),
+            "started_at": utcnow().isoformat(timespec="seconds"),
+            "status": "starting",
+            "polls": 0,
+            "runs": {},
+            "last_poll": None,
+            "last_new_content": None,
+            "last_error": None,
+            "expected_publish": None,
+            "next_wake": None,
+        }
+
+    # ---- 健康文件与信号 ----
+
+    def write_health(self, status: str, **fields):
+        self.health.update(status=status, heartbeat=utcnow().isoformat(timespec="seconds"), **fields)
+        write_json(self.health_path, self.health)
+
+    def handle_signal(self, signum, frame):
+        if self.stop.is_set():
+            raise SystemExit(f"收到第二次信号 {signum}，强制退出")
+        print(f"\n[INFO] 收到信号 {signum}，当前流程完成后退出（再次发送信号强制退出）")
+        self.stop.set()
+
+    # ---- 抓取 ----
+
+    def run_pipeline(self, name: str, module_name: str) -> bool:
+        """在进程内运行某个源的抓取流程"""
+        import importlib
+        module = importlib.import_module(module_name)
+        self.write_health("running", current=name)
+        started = time.perf_counter()
+        archived = module.run(self.args)
+        self.health["runs"][name] = self.health["runs"].get(name, 0) + 1
+        self.health.pop("current", None)
+        print(f"[INFO] {name} 流程结束（{'新条目' if archived else '无新条目'}，{time.perf_counter() - started:.1f}s）")
+        return archived
+
+    def poll_bing(self):
+        import fetch_bing_wallpaper as bing
+
+        now = utcnow()
+        images = bing.fetch_bing_images(bing.PRIMARY_MARKET, idx=0, n=1)
+        self.health["polls"] += 1
+        self.health["last_poll"] = now.isoformat(timespec="seconds")
+        new = self.schedule.observe(images, first_seen=now)
+        if new:
+            published = parse_fullstartdate(max(new))
+            print(f"[INFO] 检测到新的必应壁纸 (fullstartdate={max(new)}，发布后 {(now - published).total_seconds():.0f}s 发现)")
+
+        date = bing.get_date_from_meta(images[0])
+        if is_entry_complete(Path("docs/wallpapers/bing") / date):
+            return
+        if self.run_pipeline("bing", "fetch_bing_wallpaper"):
+            published = parse_fullstartdate(images[0]["fullstartdate"]) if images[0].get("fullstartdate") else None
+            self.health["last_new_content"] = {
+                "source": "bing",
+                "date": date,
+                "at": utcnow().isoformat(timespec="seconds"),
+                "lag_seconds": round((utcnow() - published).total_seconds()) if published else None,
+            }
+
+    def run_daily_sources(self):
+        """其他启用的源：每个 UTC 日运行一次，失败后间隔 DAILY_RETRY 重试"""
+        from src.config_loader import get_enabled_sources
+
+        today = utcnow().strftime("%Y-%m-%d")
+        for source in get_enabled_sources():
+            name = source["name"]
+            if name != "unsplash":
+                continue  # 必应由 poll_bing 负责；目前其他源中只有 Unsplash 提供进程内流程
+            if source.get("api_key_env") and not os.environ.get(source["api_key_env"]):
+                continue
+            if is_entry_complete(Path("docs/wallpapers") / name / today):
+                continue
+            day, attempted = self.daily_attempts.get(name, (None, None))
+            if day == today and time.monotonic() - attempted < DAILY_RETRY:
+                continue
+            self.daily_attempts[name] = (today, time.monotonic())
+            if self.run_pipeline(name, "fetch_unsplash_wallpaper"):
+                self.health["last_new_content"] = {"source": name, "date": today,
+                                                   "at": utcnow().isoformat(timespec="seconds")}
+
+    def seconds_until_next_day(self, now: datetime) -> float:
+        tomorrow = (now + timedelta(days=1)).replace(hour=0, minute=1, second=0, microsecond=0)
+        return (tomorrow - now).total_seconds()
+
+    # ---- 主循环 ----
+
+    def loop(self):
+        import fetch_bing_wallpaper as bing
+
+        # 种子：一次请求 8 天的历史，启动即可推算发布时刻
+        try:
+            self.schedule.observe(bing.fetch_bing_images(bing.PRIMARY_MARKET, idx=0, n=8))
+        except Exception as e:
+            print(f"[WARN] 无法获取发布历史: {e}")
+
+        while not self.stop.is_set():
+            try:
+                self.poll_bing()
+                if not self.stop.is_set():
+                    self.run_daily_sources()
+                self.failures = 0
+                delay, phase = self.schedule.next_poll(utcnow())
+            except Exception as e:
+                self.failures += 1
+                traceback.print_exc()
+                self.health["last_error"] = {"at": utcnow().isoformat(timespec="seconds"), "error": repr(e)}
+                delay, phase = min(ERROR_BACKOFF_MAX, DENSE_INTERVAL * 2 ** self.failures), "error"
+
+            now = utcnow()
+            delay = max(1.0, min(delay, self.seconds_until_next_day(now)))
+            expected, _ = self.schedule.expected_next()
+            wake = now + timedelta(seconds=delay)
+            self.write_health(phase, next_wake=wake.isoformat(timespec="seconds"),
+                              expected_publish=expected.isoformat(timespec="minutes") if expected else None)
+            print(f"[INFO] 阶段 {phase}，{delay:.0f}s 后再次轮询（预计发布 "
+                  f"{expected.strftime('%Y-%m-%d %H:%M') + ' UTC' if expected else '未知'}）")
+            self.stop.wait(delay)
+
+        self.write_health("stopped", next_wake=None)
+        print("[INFO] 常驻模式已退出")
+
+
+def run_daemon(args):
+    """常驻模式入口（需在主线程调用以注册信号处理）"""
+    daemon = Daemon(args)
+    signal.signal(signal.SIGTERM, daemon.handle_signal)
+    signal.signal(signal.SIGINT, daemon.handle_signal)
+    print(f"[INFO] 常驻模式启动 (pid {os.getpid()})，健康文件: {daemon.health_path}")
+    daemon.loop()
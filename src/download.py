@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+分段并行下载
+首个请求即下载第一段 (Range: bytes=0-)：
+- 服务器返回 206 时从 Content-Range 得知总大小，按段数均分并预分配临时文件，
+  首个响应只读到第一段末尾，其余区间并行下载写入各自偏移
+- 服务器忽略 Range 返回 200 时，直接把这个响应作为单连接下载读完，不多发请求
+组装完成后校验总大小、各段 ETag 一致、图片可解码，再原子替换为目标文件；单连接下载同样校验大小与解码
+"""
+
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+
+import requests
+
+from src import resilience
+from src.archive import atomic_output
+
+DEFAULT_DOWNLOAD = {"segments": 4, "min_segment_kb": 1024}
+IMAGE_SUFFIXES = (".jpg", ".jpeg", ".png", ".webp")
+CHUNK_SIZE = 256 * 1024
+SEGMENT_ATTEMPTS = 3
+TIMEOUT = (10, 30)  # (连接, 读取) 秒
+
+
+class DownloadError(IOError):
+    """分段下载结果与服务器声明不一致"""
+
+
+@lru_cache(maxsize=1)
+def get_download_config() -> dict:
+    """读取 config/sources.yaml 中的 download 配置"""
+    from src.config_loader import load_sources_config
+    config = dict(DEFAULT_DOWNLOAD)
+    config.update(load_sources_config().get("download") or {})
+    return config
+
+
+def parse_content_range(resp):
+    """解析 "bytes 0-1023/4096"，返回 (起点, 终点, 总大小) 或 None"""
+    match = re.match(r"bytes (\d+)-(\d+)/(\d+)$", resp.headers.get("Content-Range", ""))
+    return tuple(int(x) for x in match.groups()) if match else None
+
+
+def plan_ranges(start: int, total: int, segments: int, min_segment: int):
+    """把 [start, total) 切成不超过 segments 个、每段不小于 min_segment 的区间 [(起点, 终点)]"""
+    remaining = total - start
+    if remaining <= 0:
+        return []
+    count = max(1, min(segments, remaining // max(1, min_segment)))
+    size = -(-remaining // count)  # 向上取整
+    return [(offset, min(offset + size, total) - 1) for offset in range(start, total, size)]
+
+
+def _write_response(resp, path: Path, offset: int, expected: int = None, limit: int = None) -> int:
+    """
+    把响应体写入文件的指定偏移，返回写入字节数；长度与预期不符时抛出 DownloadError
+    limit 给定时只读取前 limit 字节，随后关闭连接
+    """
+    written = 0
+    try:
+        with open(path, "r+b") as f:
+            f.seek(offset)
+            for chunk in resp.iter_content(CHUNK_SIZE):
+                if limit is not None:
+                    chunk = chunk[:limit - written]
+                f.write(chunk)
+                written += len(chunk)
+                if limit is not None and written >= limit:
+                    break
+    finally:
+        resp.close()
+    if expected is not None and written != expected:
+        raise DownloadError(f"区间 {offset}+ 应为 {expected} 字节，实际 {written} 字节")
+    return written
+
+
+def _fetch_range(url: str, path: Path, start: int, end: int, total: int, etag: str, label: str):
+    """下载单个区间，校验返回的区间与 ETag；传输中断时重试"""
+    for attempt in range(1, SEGMENT_ATTEMPTS + 1):
+        try:
+            resp = resilience.get(url, headers={"Range": f"bytes={start}-{end}"}, stream=True,
+                                  timeout=TIMEOUT, label=f"{label} [{start}-{end}]")
+            if resp.status_code != 206 or parse_content_range(resp) != (start, end, total):
+                resp.close()
+                raise DownloadError(f"服务器未返回请求的区间 {start}-{end}")
+            if etag and resp.headers.get("ETag") not in (None, etag):
+                resp.close()
+                raise DownloadError("下载过程中文件已变化 (ETag 不一致)")
+            _write_response(resp, path, start, end - start + 1)
+            return
+        except (requests.RequestException, DownloadError) as e:
+            if attempt == SEGMENT_ATTEMPTS:
+                raise
+            delay = resilience.backoff_delay(attempt)
+            print(f"[WARN] {label} 区间 {start}-{end} 第 {attempt} 次失败 ({e})，{delay:.1f}s 后重试")
+            time.sleep(delay)
+
+
+def verify_download(path: Path, total: int, is_image: bool = True):
+    """提交前校验：大小与服务器声明一致，图片文件能够解码"""
+    size = Path(path).stat().st_size
+    if size != total:
+        raise DownloadError(f"文件大小 {size} 与服务器声明的 {total} 不一致")
+    if is_image:
+        from PIL import Image
+        try:
+            with Image.open(path) as img:
+                img.verify()
+        except Exception as e:
+            raise DownloadError(f"下载的图片无法解码: {e}")
+
+
+def download_file(url: str, save_path: Path, segments: int = None, min_segment: int = None) -> dict:
+    """
+    下载文件到 save_path（原子写入）
+    segments <= 1 时单连接下载；否则服务器支持 Range 且文件足够大时分段并行下载
+    返回 {"mode": "single" | "segmented", "bytes", "segments", "seconds"}
+    """
+    config = get_download_config()
+    segments = int(segments or config["segments"])
+    min_segment = int(min_segment or config["min_segment_kb"] * 1024)
+    label = f"下载 {Path(save_path).name}"
+    is_image = Path(save_path).suffix.lower() in IMAGE_SUFFIXES
+    started = time.perf_counter()
+
+    with atomic_output(save_path) as tmp_path:
+        if segments <= 1:
+            resp = resilience.get(url, timeout=TIMEOUT, hedge=True, hedge_after=15, label=label)
+            tmp_path.write_bytes(resp.content)
+            verify_download(tmp_path, len(resp.content), is_image)
+            return {"mode": "single", "bytes": len(resp.content), "segments": 1,
+                    "seconds": time.perf_counter() - started}
+
+        # 首个请求不限终点，得知总大小后只读第一段；对冲以响应头到达时间为准
+        resp = resilience.get(url, headers={"Range": "bytes=0-"}, stream=True,
+                              timeout=TIMEOUT, hedge=True, hedge_after=15, label=label)
+        first = parse_content_range(resp)
+        if resp.status_code != 206 or not first or first[0] != 0:
+            # 不支持 Range：这个响应就是完整文件
+            length = resp.headers.get("Content-Length")
+            written = _write_response(resp, tmp_path, 0, int(length) if length else None)
+            verify_download(tmp_path, written, is_image)
+            return {"mode": "single", "bytes": written, "segments": 1,
+                    "seconds": time.perf_counter() - started}
+
+        total = first[2]
+        etag = resp.headers.get("ETag")
+        with open(tmp_path, "r+b") as f:
+            f.truncate(total)  # 预分配，各段直接写入自己的偏移
+        (_, first_end), *ranges = plan_ranges(0, total, segments, min_segment)
+
+        with ThreadPoolExecutor(max_workers=max(1, len(ranges))) as pool:
+            futures = [pool.submit(_fetch_range, url, tmp_path, start, end, total, etag, label)
+                       for start, end in ranges]
+            _write_response(resp, tmp_path, 0, first_end + 1, limit=first_end + 1)
+            for future in futures:
+                future.result()
+
+        verify_download(tmp_path, total, is_image)
+
+    return {"mode": "segmented", "bytes": total, "segments": len(ranges) + 1,
+            "seconds": time.perf_counter() - started}
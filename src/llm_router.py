@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+LLM 提供方路由
+config/sources.yaml 的 llm.providers 按优先级列出候选提供方（地址、模型、密钥均可来自环境变量），
+未配置密钥的提供方跳过。每个提供方保留最近若干次调用的耗时与成败：
+- 健康（样本不足，或近期错误率低于阈值）的提供方按滚动耗时中位数从快到慢排序，
+  尚无耗时样本的排在有样本的之后，同类之间保持配置顺序
+- 以 EXPLORE_RATE 的概率把另一个健康提供方排到最前，让尚未使用的后备也能积累耗时样本
+- 不健康的提供方排在最后，仍作为兜底；距最近一次调用超过 RECOVERY_SECONDS 后重新视为健康，放行试探
+run() 按此顺序逐个尝试，请求失败或响应格式异常即顺延到下一个；
+统计写入 data/llm_providers.json（与用量台账一样随仓库提交），跨运行累积
+"""
+
+import json
+import os
+import random
+import statistics
+import threading
+import time
+from collections import deque
+from pathlib import Path
+
+import requests
+
+from src.archive import write_json
+
+DEFAULT_PROVIDERS = [
+    {"name": "primary", "base_url_env": "LLM_BASE_URL", "base_url": "https://api.openai.com/v1",
+     "api_key_env": "LLM_API_KEY", "model_env": "LLM_MODEL_NAME", "model": "gpt-4o"},
+]
+STATS_FILE = Path("data/llm_providers.json")
+# 记为提供方失败并顺延的错误：请求失败，以及响应缺字段、JSON 无法解析等格式异常
+PROVIDER_ERRORS = (requests.RequestException, KeyError, IndexError, ValueError)
+WINDOW = 20                  # 每个提供方保留的最近调用数
+MIN_SAMPLES = 3              # 少于此数时不判定健康状况
+UNHEALTHY_ERROR_RATE = 0.5   # 近期错误率达到此值视为不健康
+RECOVERY_SECONDS = 600       # 不健康的提供方闲置这么久后重新参与排序
+EXPLORE_RATE = 0.1           # 试探非最优提供方的概率
+
+
+class Provider:
+    """一个 OpenAI 兼容的提供方及其滚动统计"""
+
+    def __init__(self, name: str, base_url: str, model: str, api_key: str):
+        self.name = name
+        self.base_url = base_url.rstrip("/")
+        self.model = model
+        self.api_key = api_key
+        self.samples = deque(maxlen=WINDOW)  # {"at", "ok", "seconds", "ttft", "tokens_per_s"}
+        self.calls = 0      # 本次运行
+        self.failures = 0
+
+    def error_rate(self) -> float:
+        if not self.samples:
+            return 0.0
+        return sum(not s["ok"] for s in self.samples) / len(self.samples)
+
+    def latency(self):
+        """最近成功调用的耗时中位数，没有样本时为 None"""
+        seconds = [s["seconds"] for s in self.samples if s["ok"]]
+        return statistics.median(seconds) if seconds else None
+
+    def healthy(self) -> bool:
+        if len(self.samples) < MIN_SAMPLES or self.error_rate() < UNHEALTHY_ERROR_RATE:
+            return True
+        return time.time() - self.samples[-1].get("at", 0) >= RECOVERY_SECONDS
+
+    def mean(self, field: str):
+        values = [s[field] for s in self.samples if s["ok"] and s.get(field)]
+        return statistics.mean(values) if values else None
+
+
+def load_providers(config: dict = None):
+    """按配置解析提供方列表；环境变量优先于配置中的字面值，缺少地址或密钥的提供方跳过"""
+    if config is None:
+        from src.config_loader import load_sources_config
+        config = load_sources_config().get("llm") or {}
+    providers = []
+    for entry in config.get("providers") or DEFAULT_PROVIDERS:
+        base_url = os.environ.get(entry.get("base_url_env", "")) or entry.get("base_url")
+        model = os.environ.get(entry.get("model_env", "")) or entry.get("model")
+        api_key = os.environ.get(entry.get("api_key_env", "")) or entry.get("api_key")
+        if base_url and model and api_key:
+            providers.append(Provider(entry["name"], base_url, model, api_key))
+    return providers
+
+
+class LLMRouter:
+    """按滚动耗时与错误率为每次请求选择提供方，失败时沿链路回退"""
+
+    def __init__(self, providers, stats_path: Path = STATS_FILE):
+        self.providers = list(providers)
+        self.stats_path = Path(stats_path)
+        self.lock = threading.Lock()
+        self._load_stats()
+
+    def _load_stats(self):
+        if not self.stats_path.exists():
+            return
+        try:
+            stored = json.loads(self.stats_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return
+        for provider in self.providers:
+            provider.samples.extend(stored.get(provider.name, []))
+
+    def _save_stats(self):
+        write_json(self.stats_path, {p.name: list(p.samples) for p in self.providers})
+
+    def order(self):
+        """本次请求的尝试顺序"""
+        with self.lock:
+            indexed = list(enumerate(self.providers))
+            healthy = [(i, p) for i, p in indexed if p.healthy()]
+            unhealthy = [(i, p) for i, p in indexed if not p.healthy()]
+            healthy.sort(key=lambda item: (item[1].latency() is None, item[1].latency() or 0, item[0]))
+            if len(healthy) > 1 and random.random() < EXPLORE_RATE:
+                healthy.insert(0, healthy.pop(random.randrange(1, len(healthy))))
+            return [p for _, p in healthy + unhealthy]
+
+    def record(self, provider: Provider, ok: bool, seconds: float, ttft: float = None,
+               tokens_per_s: float = None):
+        with self.lock:
+            provider.calls += 1
+            provider.failures += not ok
+            provider.samples.append({"at": round(time.time()), "ok": ok, "seconds": round(seconds, 3),
+                                     "ttft": round(ttft, 3) if ttft else None,
+                                     "tokens_per_s": round(tokens_per_s, 1) if tokens_per_s else None})
+            self._save_stats()
+
+    def run(self, call, label: str = "LLM"):
+        """
+        依次以各提供方调用 call(provider, is_last)，返回 (结果, 提供方)
+        call 返回 {"seconds", "ttft", "tokens_per_s", ...}；抛出 PROVIDER_ERRORS 中的错误时记为失败并顺延，
+        最后一个提供方也失败时抛出其错误
+        """
+        providers = self.order()
+        if not providers:
+            raise requests.RequestException(f"{label}: 没有可用的 LLM 提供方（未配置密钥）")
+        for index, provider in enumerate(providers):
+            is_last = index == len(providers) - 1
+            started = time.perf_counter()
+            try:
+                result = call(provider, is_last)
+            except PROVIDER_ERRORS as e:
+                self.record(provider, False, time.perf_counter() - started)
+                if is_last:
+                    raise
+                print(f"[WARN] {label}: 提供方 {provider.name} 失败 ({e})，回退到 {providers[index + 1].name}")
+                continue
+            self.record(provider, True, result["seconds"], result.get("ttft"), result.get("tokens_per_s"))
+            return result, provider
+
+    def log_summary(self):
+        """输出本次运行用到的各提供方统计"""
+        used = [p for p in self.providers if p.calls]
+        if not used:
+            return
+        print("[INFO] LLM 提供方统计（滚动窗口为最近 %d 次）:" % WINDOW)
+        for p in used:
+            latency, ttft, speed = p.latency(), p.mean("ttft"), p.mean("tokens_per_s")
+            print(f"       - {p.name} ({p.model}): 本次调用 {p.calls} 次，失败 {p.failures} 次；"
+                  f"耗时 p50 {f'{latency:.2f}s' if latency is not None else '-'}，"
+                  f"错误率 {p.error_rate():.0%}，首 token {f'{ttft:.2f}s' if ttft else '-'}，"
+                  f"{f'{speed:.1f} tokens/s' if speed else '-'}{'' if p.healthy() else '（不健康）'}")
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_router() -> LLMRouter:
+    """进程内共享的路由器（首次调用时按配置创建）"""
+    global _router
+    with _router_lock:
+        if _router is None:
+            _router = LLMRouter(load_providers())
+        return _router
+
+
+def log_summary():
+    """输出提供方统计；本次运行未调用 LLM 时不输出"""
+    if _router is not None:
+        _router.log_summary()
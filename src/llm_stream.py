@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+流式 (SSE) 调用 OpenAI 兼容的对话接口
+- 增量写入：每收到一段内容就追加到片段文件，进程崩溃或连接中断时已生成的内容不会丢失
+- 续写：片段文件已有内容时，以其作为 assistant 前缀请模型从中断处继续，而不是从头生成
+- 统计：首 token 耗时 (TTFT)、输出 token 数与 tokens/s
+- on_first_token：收到第一段内容时回调，只依赖「已开始生成」的下游步骤可以提前进行
+服务端不支持流式、直接返回完整 JSON 时按普通响应处理
+"""
+
+import json
+import time
+from pathlib import Path
+
+import requests
+
+from src import resilience
+
+STREAM_TIMEOUT = (10, 30)  # (连接, 两段内容之间的最长间隔) 秒；流停滞时尽早失败，不必等满整体超时
+RESUME_PROMPT = "输出在上文处中断了。请从中断处直接继续写完，不要重复已写内容，也不要添加任何说明。"
+
+
+class StreamInterrupted(requests.RequestException):
+    """流在正常结束前中断；已收到的内容保留在片段文件中"""
+
+
+def iter_sse_data(resp):
+    """逐条产出 SSE 事件的 data 字段，遇到 [DONE] 结束"""
+    # 按字节分行后再以 UTF-8 解码：requests 对未声明 charset 的 text/* 按 ISO-8859-1 解码，
+    # 中文字节中的 \x85 会被 splitlines 当作换行
+    for raw in resp.iter_lines():
+        line = raw.decode("utf-8")
+        if not line or not line.startswith("data:"):
+            continue
+        data = line[5:].strip()
+        if data == "[DONE]":
+            return
+        yield data
+
+
+def stream_chat(url: str, headers: dict, payload: dict, partial_path: Path,
+                on_first_token=None, label: str = "LLM", attempts: int = 2) -> dict:
+    """
+    以流式方式请求补全，内容边收边追加到 partial_path
+    partial_path 已有内容时作为前缀续写；返回
+    {"text", "resumed", "ttft", "seconds", "tokens", "tokens_per_s", "usage"}，text 含续写前缀
+    流中断（连接断开、读取超时、未收到结束标记）时抛出 StreamInterrupted；
+    attempts 为建立连接阶段（尚未收到内容）的重试次数
+    """
+    partial_path = Path(partial_path)
+    prefix = partial_path.read_text(encoding="utf-8") if partial_path.exists() else ""
+    body = {**payload, "stream": True, "stream_options": {"include_usage": True}}
+    if prefix:
+        body["messages"] = payload["messages"] + [
+            {"role": "assistant", "content": prefix},
+            {"role": "user", "content": RESUME_PROMPT},
+        ]
+
+    started = time.perf_counter()
+    resp = resilience.post(url, headers=headers, json=body, stream=True,
+                           timeout=STREAM_TIMEOUT, attempts=attempts, label=label)
+
+    if "text/event-stream" not in resp.headers.get("Content-Type", ""):
+        # 服务端忽略 stream 参数，返回了完整响应
+        result = resp.json()
+        text = result["choices"][0]["message"]["content"]
+        seconds = time.perf_counter() - started
+        if on_first_token:
+            on_first_token()
+        tokens = (result.get("usage") or {}).get("completion_tokens") or len(text)
+        return {"text": prefix + text, "resumed": bool(prefix), "ttft": seconds, "seconds": seconds,
+                "tokens": tokens, "tokens_per_s": None, "usage": result.get("usage")}
+
+    partial_path.parent.mkdir(parents=True, exist_ok=True)
+    pieces, ttft, usage, chunks, finished = [], None, None, 0, False
+    try:
+        with open(partial_path, "a", encoding="utf-8") as f:
+            for data in iter_sse_data(resp):
+                event = json.loads(data)
+                usage = event.get("usage") or usage
+                for choice in event.get("choices") or []:
+                    finished = finished or bool(choice.get("finish_reason"))
+                    content = (choice.get("delta") or {}).get("content")
+                    if not content:
+                        continue
+                    if ttft is None:
+                        ttft = time.perf_counter() - started
+                        if on_first_token:
+                            on_first_token()
+                    f.write(content)
+                    f.flush()
+                    pieces.append(content)
+                    chunks += 1
+    except (requests.RequestException, ValueError) as e:
+        raise StreamInterrupted(f"{label} 流式输出中断（已收到 {sum(map(len, pieces))} 字）: {e}") from e
+    finally:
+        resp.close()
+    if not finished:
+        raise StreamInterrupted(f"{label} 流式输出未正常结束（已收到 {sum(map(len, pieces))} 字）")
+
+    seconds = time.perf_counter() - started
+    tokens = (usage or {}).get("completion_tokens") or chunks  # 服务端不返回 usage 时以增量块数近似
+    generating = seconds - (ttft or seconds)
+    return {
+        "text": prefix + "".join(pieces),
+        "resumed": bool(prefix),
+        "ttft": ttft,
+        "seconds": seconds,
+        "tokens": tokens,
+        "tokens_per_s": tokens / generating if generating > 0 else None,
+        "usage": usage,
+    }
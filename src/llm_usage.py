@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+LLM 用量台账
+每次成功的 LLM 调用（画面分析与各路文本输出）向 data/llm_usage.jsonl 追加一行：
+时间、源、条目、调用类型、提供方、模型、prompt / completion tokens 与耗时；台账随仓库提交，跨运行累积
+- 服务端未返回 usage 时 completion tokens 按流式增量块数估算（estimated=true），prompt tokens 记为 null
+- 预算：config/sources.yaml 的 llm.budget 设置每次运行与每天 (UTC) 的 token 上限，0 表示不限；
+  批量路径（batch_fetch、generate_missing_stories）在生成每个条目的故事前检查，超出后把剩余条目推迟到下次运行
+- 成本：llm.pricing 按模型给出每百万 token 的单价（美元），汇总见 scripts/llm_usage_report.py
+"""
+
+import json
+import threading
+from datetime import datetime, timezone
+from functools import lru_cache
+from pathlib import Path
+
+LEDGER_FILE = Path("data/llm_usage.jsonl")
+DEFAULT_BUDGET = {
+    "per_run_tokens": 0,  # 0 表示不限
+    "per_day_tokens": 0,
+}
+
+_lock = threading.Lock()
+_run = {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "cost": 0.0}
+
+
+@lru_cache(maxsize=1)
+def get_llm_config() -> dict:
+    from src.config_loader import load_sources_config
+    return load_sources_config().get("llm") or {}
+
+
+def get_budget() -> dict:
+    """读取 llm.budget，缺省项使用 DEFAULT_BUDGET"""
+    budget = dict(DEFAULT_BUDGET)
+    budget.update(get_llm_config().get("budget") or {})
+    return budget
+
+
+def get_pricing() -> dict:
+    """读取 llm.pricing：{模型名: {"prompt": 每百万 token 单价, "completion": 每百万 token 单价}}"""
+    return get_llm_config().get("pricing") or {}
+
+
+def row_tokens(row: dict) -> int:
+    return (row.get("prompt_tokens") or 0) + (row.get("completion_tokens") or 0)
+
+
+def row_cost(row: dict, pricing: dict):
+    """一行的成本（美元）；模型未配置单价时为 None"""
+    price = pricing.get(row.get("model"))
+    if not price:
+        return None
+    return ((row.get("prompt_tokens") or 0) * float(price.get("prompt", 0))
+            + (row.get("completion_tokens") or 0) * float(price.get("completion", 0))) / 1_000_000
+
+
+def record(entry_dir: Path, kind: str, provider, usage: dict, seconds: float, tokens: int = None,
+           ledger: Path = LEDGER_FILE) -> dict:
+    """
+    记录一次成功的调用并返回写入的行
+    kind 为调用类型（analysis 或输出名）；usage 为接口返回的 usage 块，缺失时以 tokens 估算 completion tokens
+    """
+    entry_dir = Path(entry_dir)
+    usage = usage or {}
+    row = {
+        "at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "source": entry_dir.parent.name,
+        "entry": entry_dir.name,
+        "kind": kind,
+        "provider": provider.name,
+        "model": provider.model,
+        "prompt_tokens": usage.get("prompt_tokens"),
+        "completion_tokens": usage.get("completion_tokens") or tokens,
+        "seconds": round(seconds, 3),
+    }
+    if not usage.get("completion_tokens"):
+        row["estimated"] = True
+    cost = row_cost(row, get_pricing())
+
+    ledger = Path(ledger)
+    with _lock:
+        ledger.parent.mkdir(parents=True, exist_ok=True)
+        with open(ledger, "a", encoding="utf-8") as f:
+            f.write(json.dumps(row, ensure_ascii=False) + "\n")
+        _run["calls"] += 1
+        _run["prompt_tokens"] += row["prompt_tokens"] or 0
+        _run["completion_tokens"] += row["completion_tokens"] or 0
+        _run["cost"] += cost or 0.0
+    return row
+
+
+def read_ledger(ledger: Path = LEDGER_FILE):
+    """逐行读取台账，跳过损坏的行"""
+    ledger = Path(ledger)
+    if not ledger.exists():
+        return
+    with open(ledger, encoding="utf-8") as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
+
+
+def run_tokens() -> int:
+    """本次运行已用的 token 数"""
+    with _lock:
+        return _run["prompt_tokens"] + _run["completion_tokens"]
+
+
+def day_tokens(day: str = None, ledger: Path = LEDGER_FILE) -> int:
+    """某天 (UTC, YYYY-MM-DD) 台账中的 token 总数，默认当天"""
+    day = day or datetime.now(timezone.utc).strftime("%Y-%m-%d")
+    return sum(row_tokens(row) for row in read_ledger(ledger) if row.get("at", "").startswith(day))
+
+
+def budget_exceeded():
+    """超出预算时返回原因，否则返回 None"""
+    budget = get_budget()
+    per_run, per_day = int(budget["per_run_tokens"] or 0), int(budget["per_day_tokens"] or 0)
+    if per_run and run_tokens() >= per_run:
+        return f"本次运行已用 {run_tokens()} tokens，达到单次预算 {per_run}"
+    if per_day:
+        used = day_tokens()
+        if used >= per_day:
+            return f"今天 (UTC) 已用 {used} tokens，达到每日预算 {per_day}"
+    return None
+
+
+def log_summary():
+    """输出本次运行的用量；未调用 LLM 时不输出"""
+    with _lock:
+        run = dict(_run)
+    if not run["calls"]:
+        return
+    cost = f"，约 ${run['cost']:.4f}" if run["cost"] else ""
+    print(f"[INFO] LLM 用量: 本次 {run['calls']} 次调用，prompt {run['prompt_tokens']} tokens，"
+          f"completion {run['completion_tokens']} tokens{cost}（台账: {LEDGER_FILE}）")
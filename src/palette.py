@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+主色调与平均亮度提取
+基于已有的 thumb.jpg，用 NumPy 向量化的 k-means 对像素数组做颜色量化，
+结果写入 meta.json：
+- palette:   [{"color": "#rrggbb", "ratio": 0.42}, ...]  按占比降序
+- luminance: 0~1 的平均亮度 (Rec. 709 权重)
+"""
+
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+PALETTE_SIZE = 5           # 主色数量 (k)
+SAMPLE_SIZE = (100, 100)   # 量化前把缩略图缩到此尺寸以内，400x225 -> 100x56
+MAX_ITERATIONS = 20
+LUMA_WEIGHTS = np.array([0.2126, 0.7152, 0.0722], dtype=np.float32)
+
+
+def load_pixels(thumb_path: Path) -> np.ndarray:
+    """读取缩略图并降采样，返回 (N, 3) 的 float32 RGB 像素数组"""
+    with Image.open(thumb_path) as img:
+        img = img.convert("RGB")
+        img.thumbnail(SAMPLE_SIZE)
+        return np.asarray(img, dtype=np.float32).reshape(-1, 3)
+
+
+def kmeans(pixels: np.ndarray, k: int = PALETTE_SIZE, iterations: int = MAX_ITERATIONS):
+    """
+    向量化 k-means，返回 (聚类中心 (k, 3), 每类像素数 (k,))
+    初始中心取亮度分位点上的像素，结果可复现
+    """
+    k = min(k, len(pixels))
+    order = np.argsort(pixels @ LUMA_WEIGHTS, kind="stable")
+    centers = pixels[order[((np.arange(k) + 0.5) * len(order) / k).astype(int)]]
+
+    for _ in range(iterations):
+        # (N, k) 距离矩阵，一次算完所有像素到所有中心的距离
+        distances = ((pixels[:, None, :] - centers[None, :, :]) ** 2).sum(axis=2)
+        labels = distances.argmin(axis=1)
+        counts = np.bincount(labels, minlength=k)
+        sums = np.stack([np.bincount(labels, weights=pixels[:, c], minlength=k) for c in range(3)], axis=1)
+
+        updated = centers.copy()
+        filled = counts > 0
+        updated[filled] = sums[filled] / counts[filled, None]
+        converged = np.abs(updated - centers).max() < 0.5
+        centers = updated
+        if converged:
+            break
+    return centers, counts
+
+
+def describe_colors(thumb_path: Path, k: int = PALETTE_SIZE) -> dict:
+    """计算缩略图的主色调和平均亮度，返回可直接合并进 meta.json 的字段"""
+    pixels = load_pixels(thumb_path)
+    centers, counts = kmeans(pixels, k)
+
+    palette = []
+    for i in np.argsort(-counts, kind="stable"):
+        if counts[i] == 0:
+            continue
+        r, g, b = np.clip(np.rint(centers[i]), 0, 255).astype(int)
+        palette.append({
+            "color": f"#{r:02x}{g:02x}{b:02x}",
+            "ratio": round(float(counts[i]) / len(pixels), 3),
+        })
+
+    return {
+        "palette": palette,
+        "luminance": round(float((pixels @ LUMA_WEIGHTS).mean()) / 255, 3),
+    }
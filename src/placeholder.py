@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+画廊低清占位图
+由 thumb.jpg 缩成约 16px 宽的 micro-JPEG，以 base64 data URI 内联到卡片上，
+缩略图加载前先显示模糊的色块，并用缩略图的实际宽高固定卡片尺寸。
+结果缓存在 meta.json 的 thumb 字段中：{"width", "height", "bytes", "placeholder"}，
+缩略图未变化（字节数一致）时不再重新计算。
+"""
+
+import base64
+import io
+import json
+from pathlib import Path
+
+from src.archive import write_json
+
+PLACEHOLDER_SIZE = (16, 16)  # 按比例缩放到此尺寸以内，16:9 缩略图得到 16x9
+PLACEHOLDER_QUALITY = 40
+
+
+def make_placeholder(thumb_path: Path) -> dict:
+    """由缩略图生成占位信息 {"width", "height", "bytes", "placeholder"}"""
+    from PIL import Image
+
+    with Image.open(thumb_path) as img:
+        width, height = img.size
+        tiny = img.convert("RGB")
+        tiny.thumbnail(PLACEHOLDER_SIZE)
+        buffer = io.BytesIO()
+        tiny.save(buffer, "JPEG", quality=PLACEHOLDER_QUALITY, optimize=True)
+
+    return {
+        "width": width,
+        "height": height,
+        "bytes": Path(thumb_path).stat().st_size,
+        "placeholder": "data:image/jpeg;base64," + base64.b64encode(buffer.getvalue()).decode("ascii"),
+    }
+
+
+def ensure_placeholder(entry_dir: Path, meta: dict) -> dict:
+    """
+    返回条目的占位信息：meta.json 中已缓存且缩略图未变化时直接使用，
+    否则重新计算并写回 meta.json
+    """
+    entry_dir = Path(entry_dir)
+    thumb_path = entry_dir / "thumb.jpg"
+    cached = meta.get("thumb")
+    if cached and cached.get("bytes") == thumb_path.stat().st_size:
+        return cached
+
+    info = make_placeholder(thumb_path)
+    meta_path = entry_dir / "meta.json"
+    # 以磁盘上的 meta.json 为准合并，避免覆盖调用方未读取的字段
+    stored = json.loads(meta_path.read_text(encoding="utf-8"))
+    stored["thumb"] = info
+    write_json(meta_path, stored, if_changed=True)
+    meta["thumb"] = info
+    return info
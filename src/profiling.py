@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+按阶段的性能剖析 (--profile / --trace-memory)
+入口脚本在流程中调用 stage("名称") 标记阶段切换：每次调用结束上一个阶段、开始下一个，
+同名阶段多次出现（批量抓取的每个日期）时累加。未开启剖析时 stage() 只做一次判断，不导入任何剖析模块。
+- --profile       每个阶段一个 cProfile（只统计主线程；线程池中的工作在主线程上表现为等待），
+                  写出 <阶段>.prof（可用 snakeviz / pstats 查看）与按累计耗时排序的 <阶段>.txt
+- --trace-memory  tracemalloc 记录每个阶段的内存峰值（相对阶段开始时）、净增量，以及净增最多的分配位置，
+                  写入 memory.txt；原图 base64 等短暂的大块分配体现在峰值中。
+                  Pillow 的像素缓冲区不经过 Python 分配器，不计入统计（整图解码的内存需对照进程 RSS）
+报告写入 --profile-dir/<脚本>-<时间>/，结束时输出各阶段的汇总表并写入 summary.json
+"""
+
+import time
+from pathlib import Path
+
+DEFAULT_PROFILE_DIR = ".cache/profiles"
+TOP_FUNCTIONS = 30   # 每个阶段 .txt 中列出的函数数
+TOP_ALLOCATORS = 10  # 每个阶段列出的分配位置数
+
+_session = None
+
+
+def add_arguments(parser):
+    """为入口脚本添加剖析相关的命令行参数"""
+    parser.add_argument('--profile', action='store_true', help='按阶段记录 cProfile 统计（见 src/profiling.py）')
+    parser.add_argument('--trace-memory', action='store_true', help='按阶段记录 tracemalloc 内存峰值与主要分配位置')
+    parser.add_argument('--profile-dir', default=DEFAULT_PROFILE_DIR, help='剖析报告目录')
+
+
+class StageStats:
+    def __init__(self, name: str):
+        self.name = name
+        self.runs = 0
+        self.seconds = 0.0
+        self.profile = None
+        self.peak = 0
+        self.net = 0
+        self.allocators = {}  # "文件:行号" -> 净增字节数（各次累加）
+
+
+class ProfileSession:
+    def __init__(self, name: str, profile: bool, trace_memory: bool, report_root: Path):
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        self.report_dir = Path(report_root) / f"{name}-{stamp}"
+        self.profile = profile
+        self.trace_memory = trace_memory
+        self.stages = {}
+        self.current = None
+        self.started = 0.0
+        if trace_memory:
+            import tracemalloc
+            tracemalloc.start()
+
+    # ---- 阶段切换 ----
+
+    def switch(self, name: str):
+        self._close_current()
+        stats = self.stages.get(name) or self.stages.setdefault(name, StageStats(name))
+        self.current = stats
+        stats.runs += 1
+        if self.trace_memory:
+            import tracemalloc
+            tracemalloc.reset_peak()
+            self.memory_base = tracemalloc.get_traced_memory()[0]
+            self.snapshot = tracemalloc.take_snapshot()
+        if self.profile:
+            import cProfile
+            stats.profile = stats.profile or cProfile.Profile()
+            try:
+                stats.profile.enable()
+            except ValueError:  # 已有其他剖析器（如 python -m cProfile）在运行
+                print("[WARN] 已有其他剖析器在运行，关闭 --profile")
+                self.profile = False
+        self.started = time.perf_counter()
+
+    def _close_current(self):
+        stats = self.current
+        if stats is None:
+            return
+        stats.seconds += time.perf_counter() - self.started
+        if self.profile and stats.profile:
+            stats.profile.disable()
+        if self.trace_memory:
+            import tracemalloc
+            current, peak = tracemalloc.get_traced_memory()
+            stats.peak = max(stats.peak, peak - self.memory_base)
+            stats.net += current - self.memory_base
+            ignore = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+            after = tracemalloc.take_snapshot().filter_traces(ignore)
+            for diff in after.compare_to(self.snapshot.filter_traces(ignore), "lineno")[:TOP_ALLOCATORS]:
+                if diff.size_diff > 0:
+                    frame = diff.traceback[0]
+                    key = f"{frame.filename}:{frame.lineno}"
+                    stats.allocators[key] = stats.allocators.get(key, 0) + diff.size_diff
+            self.snapshot = None
+        self.current = None
+
+    # ---- 报告 ----
+
+    def close(self):
+        self._close_current()
+        if self.trace_memory:
+            import tracemalloc
+            tracemalloc.stop()
+        if not self.stages:
+            return
+        self.report_dir.mkdir(parents=True, exist_ok=True)
+        stages = list(self.stages.values())
+        if self.profile:
+            self._write_profiles(stages)
+        if self.trace_memory:
+            self._write_memory(stages)
+        self._write_summary(stages)
+
+    def _write_profiles(self, stages):
+        import io
+        import pstats
+
+        for index, stats in enumerate(stages, 1):
+            if stats.profile is None:
+                continue
+            stem = self.report_dir / f"{index:02d}-{stats.name}"
+            stats.profile.dump_stats(f"{stem}.prof")
+            buffer = io.StringIO()
+            pstats.Stats(stats.profile, stream=buffer).sort_stats("cumulative").print_stats(TOP_FUNCTIONS)
+            Path(f"{stem}.txt").write_text(buffer.getvalue(), encoding="utf-8")
+
+    def _write_memory(self, stages):
+        lines = []
+        for stats in stages:
+            lines.append(f"== {stats.name}: 峰值 {mb(stats.peak)}，净增 {mb(stats.net)}（{stats.runs} 次）")
+            top = sorted(stats.allocators.items(), key=lambda item: -item[1])[:TOP_ALLOCATORS]
+            lines.extend(f"   {size / 1024:>10.1f}KB  {where}" for where, size in top)
+            lines.append("")
+        (self.report_dir / "memory.txt").write_text("\n".join(lines), encoding="utf-8")
+
+    def _write_summary(self, stages):
+        from src.archive import write_json
+
+        total = sum(s.seconds for s in stages) or 1
+        rows = [{"stage": s.name, "runs": s.runs, "seconds": round(s.seconds, 4),
+                 "share": round(s.seconds / total, 4),
+                 "peak_bytes": s.peak if self.trace_memory else None,
+                 "net_bytes": s.net if self.trace_memory else None} for s in stages]
+        write_json(self.report_dir / "summary.json", {"stages": rows, "profile": self.profile,
+                                                      "trace_memory": self.trace_memory})
+
+        print(f"\n📊 剖析汇总（报告: {self.report_dir}）")
+        header = f"   {'阶段':<16}{'次数':>4}{'耗时':>8}{'占比':>7}"  # 中文表头按两列宽对齐
+        if self.trace_memory:
+            header += f"{'内存峰值':>10}{'净增':>10}"
+        print(header)
+        for row in rows:
+            line = f"   {row['stage']:<18}{row['runs']:>6}{row['seconds']:>9.3f}s{row['share']:>9.1%}"
+            if self.trace_memory:
+                line += f"{mb(row['peak_bytes']):>14}{mb(row['net_bytes']):>12}"
+            print(line)
+
+
+def mb(size: int) -> str:
+    return f"{size / 1024 / 1024:.1f}MB"
+
+
+def start(args, name: str):
+    """按命令行参数开启剖析；两个选项都未开启时什么也不做"""
+    global _session
+    profile, trace_memory = getattr(args, "profile", False), getattr(args, "trace_memory", False)
+    if profile or trace_memory:
+        _session = ProfileSession(name, profile, trace_memory, getattr(args, "profile_dir", DEFAULT_PROFILE_DIR))
+
+
+def stage(name: str):
+    """结束当前阶段并开始名为 name 的阶段"""
+    if _session is not None:
+        _session.switch(name)
+
+
+def finish():
+    """结束最后一个阶段，写出报告并输出汇总表"""
+    global _session
+    if _session is not None:
+        session, _session = _session, None
+        session.close()
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+原图无损重压缩
+用 jpegtran 对归档的 JPEG 原图做无损优化：重建 Huffman 表 (-optimize)、渐进式编码 (-progressive)、
+去掉 EXIF 与内嵌缩略图等元数据，只保留 ICC 色彩配置 (-copy icc)。DCT 系数不变，解码后的像素完全一致。
+- 替换前逐像素比对原文件与新文件的解码结果，并确认 ICC 配置未丢失；不一致或没有变小时保留原文件
+- 替换后同步 meta.json / 断点状态中记录的原图大小（缩略图的 source_bytes、元数据草稿的 bytes），
+  避免对账把未变化的缩略图当作过期；COS 上的旧副本由对账按大小差异重新上传
+- 断点状态的 recompress 阶段记录处理后的文件大小，大小未变的条目不重复处理
+jpegtran 为可选依赖（libjpeg-turbo 2.1+ 或 IJG 9+，需支持 -copy icc），未安装时跳过
+"""
+
+import json
+import shutil
+import subprocess
+from functools import lru_cache
+from pathlib import Path
+
+from src.archive import CHECKPOINT_FILE, atomic_output, load_checkpoint, mark_stage, write_json
+
+DEFAULT_RECOMPRESS = {"enabled": False, "jpegtran": "jpegtran"}
+JPEGTRAN_ARGS = ["-copy", "icc", "-optimize", "-progressive"]
+
+
+class RecompressError(RuntimeError):
+    """jpegtran 输出与原图像素不一致，或 jpegtran 执行失败"""
+
+
+class _KeepOriginal(Exception):
+    """重压缩结果没有变小，放弃替换"""
+
+
+@lru_cache(maxsize=1)
+def get_recompress_config() -> dict:
+    """读取 config/sources.yaml 中的 recompress 配置"""
+    from src.config_loader import load_sources_config
+    config = dict(DEFAULT_RECOMPRESS)
+    config.update(load_sources_config().get("recompress") or {})
+    return config
+
+
+def find_jpegtran(binary: str = None):
+    """jpegtran 可执行文件路径，未安装时返回 None"""
+    return shutil.which(binary or get_recompress_config()["jpegtran"])
+
+
+def pixels_identical(original: Path, candidate: Path) -> bool:
+    """两张 JPEG 解码后的尺寸、模式、像素与 ICC 配置是否完全一致"""
+    from PIL import Image
+
+    with Image.open(original) as a, Image.open(candidate) as b:
+        if a.size != b.size or a.mode != b.mode or a.info.get("icc_profile") != b.info.get("icc_profile"):
+            return False
+        return a.tobytes() == b.tobytes()
+
+
+def exif_orientation(path: Path) -> int:
+    """EXIF 方向标记，没有时为 1"""
+    from PIL import Image
+
+    with Image.open(path) as img:
+        return img.getexif().get(0x0112, 1)
+
+
+def recompress_file(path: Path, jpegtran: str) -> dict:
+    """
+    无损重压缩单个 JPEG，仅在像素一致且体积变小时原子替换
+    返回 {"file", "before", "after", "status"}，status 为 optimized / unchanged / rotated
+    （带 EXIF 旋转标记的图片去掉元数据后显示方向会变，保持原样）
+    """
+    path = Path(path)
+    before = path.stat().st_size
+    result = {"file": path.name, "before": before, "after": before, "status": "unchanged"}
+    if exif_orientation(path) != 1:
+        result["status"] = "rotated"
+        return result
+    try:
+        with atomic_output(path) as tmp_path:
+            proc = subprocess.run([jpegtran, *JPEGTRAN_ARGS, "-outfile", str(tmp_path), str(path)],
+                                  capture_output=True, text=True)
+            if proc.returncode != 0:
+                raise RecompressError(f"jpegtran 执行失败: {proc.stderr.strip()}")
+            after = tmp_path.stat().st_size
+            if after >= before:
+                raise _KeepOriginal()
+            if not pixels_identical(path, tmp_path):
+                raise RecompressError(f"{path.name} 重压缩后像素不一致，保留原文件")
+            result.update(after=after, status="optimized")
+    except _KeepOriginal:
+        pass  # atomic_output 已删除临时文件
+    return result
+
+
+def local_originals(entry_dir: Path):
+    """条目中仍在本地的原图（含多市场图片）"""
+    return sorted(Path(entry_dir).glob("image*.jpg"))
+
+
+def is_recompressed(entry_dir: Path) -> bool:
+    """recompress 阶段记录的文件大小与当前本地原图一致"""
+    recorded = load_checkpoint(entry_dir).get("stages", {}).get("recompress", {}).get("files")
+    if recorded is None:
+        return False
+    return recorded == {p.name: p.stat().st_size for p in local_originals(entry_dir)}
+
+
+def sync_recorded_sizes(entry_dir: Path):
+    """原图大小变化后同步 meta.json、元数据草稿中的 bytes 与缩略图阶段的 source_bytes"""
+    entry_dir = Path(entry_dir)
+    image_bytes = (entry_dir / "image.jpg").stat().st_size
+    meta_path = entry_dir / "meta.json"
+    if meta_path.exists():
+        meta = json.loads(meta_path.read_text(encoding="utf-8"))
+        if "bytes" in meta:
+            meta["bytes"] = image_bytes
+            write_json(meta_path, meta, if_changed=True)
+
+    checkpoint = load_checkpoint(entry_dir)
+    thumb = checkpoint.get("stages", {}).get("thumb")
+    if thumb and "source_bytes" in thumb:
+        thumb["source_bytes"] = image_bytes
+    if "bytes" in (checkpoint.get("meta") or {}):
+        checkpoint["meta"]["bytes"] = image_bytes
+    if (entry_dir / CHECKPOINT_FILE).exists():
+        write_json(entry_dir / CHECKPOINT_FILE, checkpoint)
+
+
+def recompress_entry(entry_dir: Path, jpegtran: str = None, force: bool = False) -> dict:
+    """
+    重压缩条目中的本地原图，返回 {"entry", "files", "before", "after", "saved", "skipped", "error"}
+    已处理且文件大小未变时跳过（force 时重新处理）
+    """
+    entry_dir = Path(entry_dir)
+    report = {"entry": f"{entry_dir.parent.name}/{entry_dir.name}", "files": [], "before": 0, "after": 0,
+              "saved": 0, "skipped": False, "error": None}
+    originals = local_originals(entry_dir)
+    if not originals or (not force and is_recompressed(entry_dir)):
+        report["skipped"] = True
+        return report
+
+    jpegtran = jpegtran or find_jpegtran()
+    try:
+        for path in originals:
+            result = recompress_file(path, jpegtran)
+            report["files"].append(result)
+            report["before"] += result["before"]
+            report["after"] += result["after"]
+    except (RecompressError, OSError) as e:
+        report["error"] = str(e)
+    report["saved"] = report["before"] - report["after"]
+
+    if report["saved"] and (entry_dir / "image.jpg").exists():
+        sync_recorded_sizes(entry_dir)
+    if not report["error"]:
+        mark_stage(entry_dir, "recompress", files={p.name: p.stat().st_size for p in originals},
+                   saved=report["saved"])
+    return report
+
+
+def apply_recompress(entry_dir: Path) -> int:
+    """下载后的可选阶段：配置启用且安装了 jpegtran 时无损重压缩原图，返回节省的字节数"""
+    if not get_recompress_config().get("enabled"):
+        return 0
+    jpegtran = find_jpegtran()
+    if not jpegtran:
+        print("[INFO] 未找到 jpegtran，跳过原图无损重压缩")
+        return 0
+    report = recompress_entry(entry_dir, jpegtran)
+    if report["error"]:
+        print(f"[WARN] 原图无损重压缩失败，保留原文件: {report['error']}")
+    elif report["saved"]:
+        print(f"[OK] 原图无损重压缩: {report['before'] // 1024} KB -> {report['after'] // 1024} KB "
+              f"(节省 {report['saved'] / report['before']:.1%})")
+    return report["saved"]
@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+"""
+网络调用韧性层
+- 重试：连接错误、超时、429 / 5xx 时按指数退避 + 全抖动重试，优先遵循 Retry-After
+- 熔断：按主机统计连续失败，达到阈值后在冷却期内快速失败，冷却结束放行一次试探请求
+- 对冲：幂等 GET（元数据、图片下载）超过该主机历史耗时分位数仍未返回时，
+        并行发出第二个相同请求，先成功者胜出；耗时分位数取自该主机所有成功的 GET
+- 统计：记录重试、对冲（含节省的耗时）与熔断，运行结束时由 log_summary() 输出；
+        节省的耗时以落败请求的完成时刻计算，输出前最多等待 HEDGE_SETTLE_TIMEOUT 秒，仍未完成的按下限计
+所有请求共用一个 requests.Session，同一主机的连接在请求之间（及常驻模式的多次轮询之间）保持复用
+"""
+
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from concurrent.futures import TimeoutError as FutureTimeout
+from urllib.parse import urlparse
+
+import requests
+
+DEFAULT_ATTEMPTS = 3
+BACKOFF_BASE = 0.5      # 秒，第 n 次重试的退避上限为 BACKOFF_BASE * 2^(n-1)
+BACKOFF_MAX = 8.0
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+BREAKER_THRESHOLD = 5   # 连续失败次数
+BREAKER_COOLDOWN = 30.0  # 秒
+
+HEDGE_PERCENTILE = 95   # 超过该主机历史耗时的此分位数后发出对冲请求
+HEDGE_MIN_SAMPLES = 5   # 样本不足时使用调用方给出的 hedge_after
+LATENCY_WINDOW = 100
+HEDGE_SETTLE_TIMEOUT = 5.0  # 秒，输出汇总前等待落败请求完成的上限
+
+
+class CircuitOpenError(requests.RequestException):
+    """主机处于熔断状态，请求未发出"""
+
+
+class CircuitBreaker:
+    """单个主机的熔断器：closed -> open（冷却）-> half-open（放行一次试探）"""
+
+    def __init__(self, threshold: int = BREAKER_THRESHOLD, cooldown: float = BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self.trial = False
+        self.lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if not self.trial and time.monotonic() - self.opened_at >= self.cooldown:
+                self.trial = True
+                return True
+            return False
+
+    def success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial = False
+
+    def failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.trial or self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+                self.trial = False
+
+
+class LatencyWindow:
+    """主机最近若干次成功请求的耗时"""
+
+    def __init__(self):
+        self.samples = deque(maxlen=LATENCY_WINDOW)
+        self.lock = threading.Lock()
+
+    def add(self, seconds: float):
+        with self.lock:
+            self.samples.append(seconds)
+
+    def percentile(self, pct: float):
+        with self.lock:
+            if len(self.samples) < HEDGE_MIN_SAMPLES:
+                return None
+            ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+class RunStats:
+    """本次运行的网络调用统计"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.retries = []    # (标签, 第几次, 原因, 退避秒数)
+        self.hedges = []     # {"label", "after", "winner", "saved", "lower_bound", "finished", "losers"}
+        self.rejected = []   # 熔断拒绝的标签
+
+    def as_dict(self) -> dict:
+        with self.lock:
+            saved = [h["saved"] for h in self.hedges if h["saved"]]
+            return {
+                "requests": self.requests,
+                "retries": len(self.retries),
+                "hedges": len(self.hedges),
+                "hedges_won": sum(h["winner"] == "hedge" for h in self.hedges),
+                "saved_seconds": round(sum(saved), 3),
+                "saved_lower_bound": any(h["lower_bound"] for h in self.hedges if h["saved"]),
+                "rejected": len(self.rejected),
+            }
+
+
+_breakers = {}
+_latencies = {}
+_registry_lock = threading.Lock()
+_hedge_pool = None
+_session = requests.Session()
+_session.mount("http://", requests.adapters.HTTPAdapter(pool_maxsize=16))
+_session.mount("https://", requests.adapters.HTTPAdapter(pool_maxsize=16))
+stats = RunStats()
+
+
+def _for_host(host: str):
+    """主机对应的 (熔断器, 耗时窗口)"""
+    with _registry_lock:
+        if host not in _breakers:
+            _breakers[host] = CircuitBreaker()
+            _latencies[host] = LatencyWindow()
+        return _breakers[host], _latencies[host]
+
+
+def _pool():
+    global _hedge_pool
+    with _registry_lock:
+        if _hedge_pool is None:
+            _hedge_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="hedge")
+        return _hedge_pool
+
+
+def backoff_delay(attempt: int, retry_after: str = None) -> float:
+    """第 attempt 次失败后的等待时间：Retry-After 优先，否则指数退避 + 全抖动"""
+    if retry_after:
+        try:
+            return min(BACKOFF_MAX, float(retry_after))
+        except ValueError:
+            pass
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (attempt - 1)))
+
+
+def _timed_get(url: str, window: LatencyWindow, **kwargs):
+    """发出一次 GET，成功时记录耗时，返回 (响应, 完成时刻)"""
+    started = time.perf_counter()
+    resp = _session.get(url, **kwargs)
+    finished = time.perf_counter()
+    if resp.status_code < 500:
+        window.add(finished - started)
+    return resp, finished
+
+
+def _hedged_get(url: str, label: str, window: LatencyWindow, hedge_after, **kwargs):
+    """
+    对冲 GET：主请求超过阈值未返回时发出第二个请求，返回先成功的响应
+    阈值取该主机历史耗时的分位数，样本不足时使用 hedge_after；两者都没有时不对冲
+    """
+    threshold = window.percentile(HEDGE_PERCENTILE) or hedge_after
+    if not threshold:
+        return _timed_get(url, window, **kwargs)[0]
+
+    primary = _pool().submit(_timed_get, url, window, **kwargs)
+    try:
+        return primary.result(timeout=threshold)[0]
+    except FutureTimeout:
+        pass
+
+    hedge = _pool().submit(_timed_get, url, window, **kwargs)
+    event = {"label": label, "after": threshold, "winner": None, "saved": None, "lower_bound": False,
+             "finished": None, "losers": []}
+    with stats.lock:
+        stats.requests += 1
+        stats.hedges.append(event)
+
+    pending = {primary, hedge}
+    error = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            try:
+                resp, finished = future.result()
+            except requests.RequestException as e:
+                error = e
+                continue
+            event["winner"] = "hedge" if future is hedge else "primary"
+            event["finished"] = finished
+            event["losers"] = list(pending)
+            for loser in pending:
+                loser.add_done_callback(lambda f: _settle_loser(f, event, finished))
+            return resp
+    raise error
+
+
+def _settle_loser(future, event: dict, winner_finished: float):
+    """落败的请求完成后关闭响应；对冲胜出时记录节省的耗时"""
+    try:
+        resp, finished = future.result()
+    except Exception:
+        return
+    resp.close()
+    if event["winner"] == "hedge":
+        with stats.lock:
+            event["saved"] = finished - winner_finished
+            event["lower_bound"] = False
+
+
+def _settle_hedges(timeout: float = HEDGE_SETTLE_TIMEOUT):
+    """
+    等待落败的请求完成，使节省的耗时按实际完成时刻计算；
+    超时仍未完成的，以当前时刻计为节省耗时的下限
+    """
+    with stats.lock:
+        events = [h for h in stats.hedges if h["winner"] == "hedge" and h["saved"] is None]
+    losers = [loser for h in events for loser in h["losers"]]
+    if losers:
+        wait(losers, timeout=timeout)
+    now = time.perf_counter()
+    with stats.lock:
+        for h in events:
+            for loser in h["losers"]:
+                if not loser.done():
+                    h["saved"], h["lower_bound"] = now - h["finished"], True
+                elif h["saved"] is None and loser.exception() is None:
+                    h["saved"] = loser.result()[1] - h["finished"]  # 完成回调可能尚未执行
+
+
+def request(method: str, url: str, *, attempts: int = DEFAULT_ATTEMPTS, hedge: bool = False,
+            hedge_after: float = None, label: str = None, **kwargs):
+    """
+    带重试、熔断（及可选对冲）的 HTTP 请求，成功时返回响应
+    4xx（429 除外）立即抛出 HTTPError；重试用尽后抛出最后一次的错误
+    hedge 只对 GET 生效，调用方需保证请求幂等
+    """
+    host = urlparse(url).netloc
+    breaker, window = _for_host(host)
+    label = label or host
+
+    for attempt in range(1, attempts + 1):
+        if not breaker.allow():
+            with stats.lock:
+                stats.rejected.append(label)
+            raise CircuitOpenError(f"{host} 连续失败已熔断，跳过 {label}")
+
+        with stats.lock:
+            stats.requests += 1
+        retry_after = None
+        try:
+            if hedge and method.upper() == "GET":
+                resp = _hedged_get(url, label, window, hedge_after, **kwargs)
+            elif method.upper() == "GET":
+                resp = _timed_get(url, window, **kwargs)[0]
+            else:
+                resp = _session.request(method, url, **kwargs)
+        except requests.RequestException as e:
+            breaker.failure()
+            if attempt == attempts:
+                raise
+            reason = type(e).__name__
+        else:
+            if resp.status_code not in RETRY_STATUS:
+                breaker.success()
+                resp.raise_for_status()
+                return resp
+            breaker.failure()
+            if attempt == attempts:
+                resp.raise_for_status()
+            reason = f"HTTP {resp.status_code}"
+            retry_after = resp.headers.get("Retry-After")
+            resp.close()
+
+        delay = backoff_delay(attempt, retry_after)
+        with stats.lock:
+            stats.retries.append((label, attempt, reason, delay))
+        print(f"[WARN] {label} 第 {attempt} 次请求失败 ({reason})，{delay:.1f}s 后重试")
+        time.sleep(delay)
+
+
+def get(url: str, **kwargs):
+    """幂等 GET，参数同 request()"""
+    return request("GET", url, **kwargs)
+
+
+def post(url: str, **kwargs):
+    """POST，参数同 request()（不支持对冲）"""
+    return request("POST", url, **kwargs)
+
+
+def log_summary():
+    """输出本次运行的重试 / 对冲 / 熔断情况（没有发生时不输出）"""
+    _settle_hedges()
+    summary = stats.as_dict()
+    if not (summary["retries"] or summary["hedges"] or summary["rejected"]):
+        return
+    print(f"[INFO] 网络调用 {summary['requests']} 次：重试 {summary['retries']} 次，"
+          f"对冲 {summary['hedges']} 次（对冲胜出 {summary['hedges_won']} 次，"
+          f"节省{'至少' if summary['saved_lower_bound'] else '约'} {summary['saved_seconds'] * 1000:.0f}ms），"
+          f"熔断拒绝 {summary['rejected']} 次")
+    with stats.lock:
+        for label, attempt, reason, delay in stats.retries:
+            print(f"       - 重试 {label}: 第 {attempt} 次 {reason}，退避 {delay:.1f}s")
+        for h in stats.hedges:
+            saved = f"，节省 {h['saved'] * 1000:.0f}ms{'（下限）' if h['lower_bound'] else ''}" if h["saved"] else ""
+            print(f"       - 对冲 {h['label']}: {h['after'] * 1000:.0f}ms 未返回，{h['winner'] or '均失败'} 胜出{saved}")
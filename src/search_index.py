@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""
+全文搜索索引（标题、版权信息、摄影师、AI 故事）
+- 分词：英文/数字按单词切分，中文按相邻两字 (bigram) 切分
+- .cache/search.db：SQLite FTS5 库，供命令行查询
+- docs/search/：按词项哈希分片的静态倒排索引，供 docs/index.html 在浏览器端查询
+- 增量：只重新索引内容哈希 (meta.json + story.md) 发生变化的条目；各条目的哈希记录在随仓库提交的
+  docs/search/state.json 中，本地没有搜索库时（如 CI 的全新检出）先从已提交的静态索引恢复，不必全部重建
+
+用法:
+  python src/search_index.py build
+  python src/search_index.py query 狐猴 马达加斯加
+"""
+
+import argparse
+import hashlib
+import json
+import re
+import sqlite3
+import sys
+import unicodedata
+from pathlib import Path
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from src.archive import iter_entries, write_if_changed
+from src.storage import original_url
+
+SEARCH_DB = Path(".cache/search.db")
+STATIC_DIR = Path("docs/search")
+STATE_FILE = "state.json"
+SHARD_COUNT = 16
+INDEX_VERSION = 1
+
+# 与 docs/search.js 中的分词规则保持一致
+_CJK = "\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff"
+_TOKEN_RE = re.compile(f"[a-z0-9]+|[{_CJK}]+")
+_CJK_RE = re.compile(f"[{_CJK}]")
+_MD_LINK_TARGET_RE = re.compile(r"\]\([^)]*\)")  # 去掉 Markdown 链接/图片地址，只保留文字
+
+# 静态索引中每个文档的字段顺序
+DOC_FIELDS = ["source", "date", "title", "label", "has_story", "image_url"]
+
+
+def tokenize(text: str):
+    """将文本切分为词项：英文小写单词，中文两字一组（单字成词时保留单字）"""
+    tokens = []
+    text = unicodedata.normalize("NFKC", text or "").lower()
+    for run in _TOKEN_RE.findall(text):
+        if _CJK_RE.match(run):
+            if len(run) == 1:
+                tokens.append(run)
+            else:
+                tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            tokens.append(run)
+    return tokens
+
+
+def shard_of(token: str, shards: int = SHARD_COUNT) -> int:
+    """词项所在的分片编号 (FNV-1a 32 位，与 docs/search.js 一致)"""
+    h = 0x811c9dc5
+    for ch in token:
+        h ^= ord(ch)
+        h = (h * 0x01000193) & 0xffffffff
+    return h % shards
+
+
+def content_hash(entry_dir: Path) -> str:
+    """条目可检索内容的哈希：meta.json 与 story.md 的原始字节"""
+    digest = hashlib.sha256()
+    for name in ("meta.json", "story.md"):
+        path = entry_dir / name
+        digest.update(name.encode())
+        digest.update(path.read_bytes() if path.exists() else b"")
+    return digest.hexdigest()
+
+
+def connect(db_path: Path = SEARCH_DB):
+    """打开搜索库，不存在时建表"""
+    db_path = Path(db_path)
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(db_path)
+    conn.executescript("""
+        CREATE TABLE IF NOT EXISTS entries (
+            id TEXT PRIMARY KEY,
+            source TEXT NOT NULL,
+            date TEXT NOT NULL,
+            title TEXT NOT NULL,
+            has_story INTEGER NOT NULL,
+            image_url TEXT NOT NULL,
+            content_hash TEXT NOT NULL,
+            tokens TEXT NOT NULL
+        );
+        CREATE VIRTUAL TABLE IF NOT EXISTS entries_fts USING fts5(id UNINDEXED, title, body);
+    """)
+    return conn
+
+
+def read_document(source: str, date: str, entry_dir: Path) -> dict:
+    """读取条目的可检索内容，返回文档字典"""
+    meta = json.loads((entry_dir / "meta.json").read_text(encoding="utf-8"))
+    story_path = entry_dir / "story.md"
+    story = story_path.read_text(encoding="utf-8") if story_path.exists() else ""
+
+    title = meta.get("title") or date
+    body = " ".join([
+        meta.get("copyright") or "",
+        meta.get("photographer") or "",
+        _MD_LINK_TARGET_RE.sub("]", story),
+    ])
+    title_tokens = tokenize(title)
+    body_tokens = tokenize(body)
+    return {
+        "id": f"{source}/{date}",
+        "source": source,
+        "date": date,
+        "title": title,
+        "has_story": story_path.exists(),
+        "image_url": original_url(meta, ""),  # 仅已分层的条目有独立的原图地址
+        "title_tokens": title_tokens,
+        "body_tokens": body_tokens,
+    }
+
+
+def _index_document(conn, doc: dict, digest: str):
+    conn.execute("DELETE FROM entries_fts WHERE id = ?", (doc["id"],))
+    conn.execute(
+        "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        (doc["id"], doc["source"], doc["date"], doc["title"], int(doc["has_story"]), doc["image_url"],
+         digest, " ".join(sorted(set(doc["title_tokens"] + doc["body_tokens"])))),
+    )
+    conn.execute(
+        "INSERT INTO entries_fts (id, title, body) VALUES (?, ?, ?)",
+        (doc["id"], " ".join(doc["title_tokens"]), " ".join(doc["body_tokens"])),
+    )
+
+
+def export_static_index(conn, static_dir: Path = STATIC_DIR, shards: int = SHARD_COUNT) -> int:
+    """
+    从搜索库导出静态倒排索引：
+    manifest.json 记录文档列表和各分片的内容哈希，shard-XX.json 为 {词项: [文档序号]}
+    返回实际写入的文件数
+    """
+    from src.config_loader import get_enabled_sources
+
+    labels = {s["name"]: s.get("display_name", s["name"]) for s in get_enabled_sources()}
+    # 按日期升序编号：新条目追加在末尾，已有文档的序号和分片内容保持稳定
+    rows = conn.execute(
+        "SELECT source, date, title, has_story, image_url, tokens FROM entries ORDER BY date, source"
+    ).fetchall()
+
+    docs = []
+    postings = [{} for _ in range(shards)]
+    for number, (source, date, title, has_story, image_url, tokens) in enumerate(rows):
+        docs.append([source, date, title, labels.get(source, source), has_story, image_url])
+        for token in tokens.split():
+            postings[shard_of(token, shards)].setdefault(token, []).append(number)
+
+    static_dir = Path(static_dir)
+    written = 0
+    shard_hashes = []
+    for number, shard in enumerate(postings):
+        text = json.dumps(dict(sorted(shard.items())), ensure_ascii=False, separators=(",", ":"))
+        shard_hashes.append(hashlib.sha256(text.encode()).hexdigest()[:12])
+        written += write_if_changed(static_dir / f"shard-{number:02d}.json", text)
+
+    manifest = {"version": INDEX_VERSION, "fields": DOC_FIELDS, "shards": shard_hashes, "docs": docs}
+    written += write_if_changed(
+        static_dir / "manifest.json", json.dumps(manifest, ensure_ascii=False, separators=(",", ":"))
+    )
+    # 增量状态单独存放，浏览器端只下载 manifest.json 与分片
+    state = {"version": INDEX_VERSION, "hashes": dict(conn.execute("SELECT id, content_hash FROM entries ORDER BY id"))}
+    written += write_if_changed(static_dir / STATE_FILE, json.dumps(state, indent=1) + "\n")
+    return written
+
+
+def restore_from_static(conn, static_dir: Path = STATIC_DIR) -> int:
+    """
+    搜索库为空时，用已提交的静态索引 (manifest.json + 分片) 和 state.json 中的内容哈希恢复条目，
+    恢复的条目只有内容哈希变化时才重新索引；返回恢复的条目数
+    恢复的全文库中正文词项去重后不再保留词频，条目下次重新索引时恢复
+    """
+    static_dir = Path(static_dir)
+    try:
+        manifest = json.loads((static_dir / "manifest.json").read_text(encoding="utf-8"))
+        state = json.loads((static_dir / STATE_FILE).read_text(encoding="utf-8"))
+        if manifest.get("version") != INDEX_VERSION or state.get("version") != INDEX_VERSION:
+            return 0
+        doc_tokens = [[] for _ in manifest["docs"]]
+        for number in range(len(manifest["shards"])):
+            shard = json.loads((static_dir / f"shard-{number:02d}.json").read_text(encoding="utf-8"))
+            for token, doc_numbers in shard.items():
+                for doc_number in doc_numbers:
+                    doc_tokens[doc_number].append(token)
+    except (OSError, ValueError, KeyError, IndexError):
+        return 0
+
+    restored = 0
+    for row, tokens in zip(manifest["docs"], doc_tokens):
+        doc = dict(zip(manifest["fields"], row))
+        digest = state["hashes"].get(f"{doc['source']}/{doc['date']}")
+        if not digest:
+            continue
+        title_tokens = tokenize(doc["title"])
+        doc.update(title_tokens=title_tokens, body_tokens=[t for t in sorted(tokens) if t not in title_tokens])
+        doc["id"] = f"{doc['source']}/{doc['date']}"
+        _index_document(conn, doc, digest)
+        restored += 1
+    return restored
+
+
+def build_search_index(db_path: Path = SEARCH_DB, static_dir: Path = STATIC_DIR) -> dict:
+    """增量构建搜索库并导出静态索引，返回统计 {entries, indexed, removed, written}"""
+    conn = connect(db_path)
+    try:
+        if not conn.execute("SELECT 1 FROM entries LIMIT 1").fetchone():
+            restore_from_static(conn, static_dir)
+        known = dict(conn.execute("SELECT id, content_hash FROM entries"))
+        seen = set()
+        indexed = 0
+
+        for source, date, entry_dir in iter_entries():
+            if not (entry_dir / "meta.json").exists():
+                continue
+            entry_id = f"{source}/{date}"
+            seen.add(entry_id)
+            digest = content_hash(entry_dir)
+            if known.get(entry_id) == digest:
+                continue
+            try:
+                doc = read_document(source, date, entry_dir)
+            except (OSError, ValueError) as e:
+                print(f"[WARN] {entry_id} 索引失败: {e}")
+                continue
+            _index_document(conn, doc, digest)
+            indexed += 1
+
+        removed = set(known) - seen
+        for entry_id in removed:
+            conn.execute("DELETE FROM entries WHERE id = ?", (entry_id,))
+            conn.execute("DELETE FROM entries_fts WHERE id = ?", (entry_id,))
+        conn.commit()
+
+        written = export_static_index(conn, static_dir)
+    finally:
+        conn.close()
+
+    return {"entries": len(seen), "indexed": indexed, "removed": len(removed), "written": written}
+
+
+def search(query: str, limit: int = 20, db_path: Path = SEARCH_DB):
+    """在搜索库中查询（所有词项都需命中，标题权重更高），返回 [(条目 id, 标题)]"""
+    tokens = list(dict.fromkeys(tokenize(query)))
+    if not tokens:
+        return []
+    # 单个汉字用前缀匹配命中以它开头的 bigram
+    match = " ".join(f'"{t}"*' if len(t) == 1 and _CJK_RE.match(t) else f'"{t}"' for t in tokens)
+    conn = connect(db_path)
+    try:
+        return conn.execute(
+            """
+            SELECT e.id, e.title FROM entries_fts f JOIN entries e ON e.id = f.id
+            WHERE entries_fts MATCH ? ORDER BY bm25(entries_fts, 0.0, 5.0, 1.0), e.date DESC LIMIT ?
+            """,
+            (match, limit),
+        ).fetchall()
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="壁纸全文搜索索引")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("build", help="增量构建搜索库与静态索引")
+    query_parser = sub.add_parser("query", help="命令行查询")
+    query_parser.add_argument("terms", nargs="+", help="查询词")
+    query_parser.add_argument("--limit", type=int, default=20, help="最多返回条数")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        stats = build_search_index()
+        print(f"[OK] 搜索索引已更新：{stats['entries']} 个条目，重新索引 {stats['indexed']}，"
+              f"移除 {stats['removed']}，写入静态文件 {stats['written']} 个")
+    else:
+        results = search(" ".join(args.terms), limit=args.limit)
+        for entry_id, title in results:
+            print(f"{entry_id}  {title}")
+        if not results:
+            print("未找到匹配的壁纸（先运行 build 构建索引）")
+
+
+if __name__ == "__main__":
+    main()
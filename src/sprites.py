@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+画廊缩略图雪碧图
+每个源每月的缩略图拼成一张雪碧图 (docs/sprites/<源>-<YYYY-MM>.webp，不支持 WebP 时为 JPEG)，
+画廊卡片的 <img>（缩略图懒加载，保留 alt 与宽高）以雪碧图中的格子作为背景，首屏一个月只需一次图片请求。
+- 只收录画廊实际展示的缩略图；不再展示的月份的雪碧图与坐标表由 prune_sprites 删除
+- 每张缩略图按 cover 方式裁剪缩放到统一的 16:9 格子，与卡片 object-fit: cover 的效果一致
+- 坐标表 (<源>-<YYYY-MM>.json) 记录每个日期的格子位置和缩略图 SHA-256，成员未变化时不重新生成
+- 引用地址带雪碧图内容摘要作为版本参数，重新生成后浏览器缓存随之失效
+"""
+
+import hashlib
+import json
+import math
+from pathlib import Path
+
+from src.archive import atomic_output, write_json
+from src.storage import file_sha256
+
+SPRITES_DIR = Path("docs/sprites")
+CELL_SIZE = (400, 225)  # 与 fetch_bing_wallpaper.THUMB_SIZE 一致
+SPRITE_QUALITY = 80
+
+
+def sprite_format() -> tuple:
+    """(扩展名, Pillow 格式名)：优先 WebP"""
+    from PIL import features
+    return ("webp", "WEBP") if features.check("webp") else ("jpg", "JPEG")
+
+
+def sprite_paths(source: str, month: str, ext: str):
+    """(雪碧图路径, 坐标表路径)"""
+    stem = f"{source}-{month}"
+    return SPRITES_DIR / f"{stem}.{ext}", SPRITES_DIR / f"{stem}.json"
+
+
+def grid_shape(count: int) -> tuple:
+    """(列数, 行数)：接近正方形，控制雪碧图的边长"""
+    cols = max(1, math.ceil(math.sqrt(count)))
+    return cols, math.ceil(count / cols)
+
+
+def render_sprite(thumbs, out_path: Path, image_format: str) -> dict:
+    """把 [(日期, 缩略图路径)] 拼成雪碧图，返回 {日期: {"col", "row"}}"""
+    from PIL import Image, ImageOps
+
+    cols, rows = grid_shape(len(thumbs))
+    cell_w, cell_h = CELL_SIZE
+    sheet = Image.new("RGB", (cols * cell_w, rows * cell_h))
+    cells = {}
+    for index, (date, thumb_path) in enumerate(thumbs):
+        col, row = index % cols, index // cols
+        with Image.open(thumb_path) as img:
+            tile = ImageOps.fit(img.convert("RGB"), CELL_SIZE, Image.Resampling.LANCZOS)
+        sheet.paste(tile, (col * cell_w, row * cell_h))
+        cells[date] = {"col": col, "row": row}
+    options = {"method": 6} if image_format == "WEBP" else {"optimize": True, "progressive": True}
+    with atomic_output(out_path) as tmp_path:
+        sheet.save(tmp_path, image_format, quality=SPRITE_QUALITY, **options)
+    return cells
+
+
+def ensure_sprite(source: str, month: str, thumbs) -> dict:
+    """
+    返回某个源某月的坐标表：成员缩略图的 SHA-256 与坐标表一致且雪碧图存在时直接使用，否则重新生成
+    坐标表 {"image", "version", "cols", "rows", "members": {日期: {"col", "row", "sha256"}}}
+    """
+    thumbs = sorted(thumbs)
+    ext, image_format = sprite_format()
+    sprite_path, map_path = sprite_paths(source, month, ext)
+    digests = {date: file_sha256(path) for date, path in thumbs}
+
+    if map_path.exists() and sprite_path.exists():
+        try:
+            sprite_map = json.loads(map_path.read_text(encoding="utf-8"))
+            if sprite_map.get("image") == sprite_path.name and \
+                    {d: m.get("sha256") for d, m in sprite_map.get("members", {}).items()} == digests:
+                return sprite_map
+        except ValueError:
+            pass
+
+    cells = render_sprite(thumbs, sprite_path, image_format)
+    cols, rows = grid_shape(len(thumbs))
+    sprite_map = {
+        "image": sprite_path.name,
+        "version": hashlib.sha256(sprite_path.read_bytes()).hexdigest()[:10],
+        "cols": cols,
+        "rows": rows,
+        "members": {date: {**cells[date], "sha256": digests[date]} for date in cells},
+    }
+    write_json(map_path, sprite_map, if_changed=True)
+    return sprite_map
+
+
+def prune_sprites(sprite_maps: dict):
+    """删除不在 {(源, 月份): 坐标表} 中的雪碧图与坐标表（画廊已不再展示的月份）"""
+    if not SPRITES_DIR.exists():
+        return
+    keep = {sprite_map["image"] for sprite_map in sprite_maps.values()}
+    keep |= {f"{source}-{month}.json" for source, month in sprite_maps}
+    for path in SPRITES_DIR.iterdir():
+        if path.is_file() and path.name not in keep:
+            path.unlink()
+
+
+def sprite_style(sprite_map: dict, date: str, placeholder: str = None, base_url: str = "./sprites") -> str:
+    """
+    卡片引用雪碧图格子的 CSS：背景尺寸与位置均为百分比，随卡片宽度缩放
+    给定 placeholder 时作为下层背景，雪碧图加载前先显示低清占位图
+    """
+    cell = sprite_map["members"][date]
+    cols, rows = sprite_map["cols"], sprite_map["rows"]
+    x = cell["col"] / (cols - 1) * 100 if cols > 1 else 0
+    y = cell["row"] / (rows - 1) * 100 if rows > 1 else 0
+    images = [f'url({base_url}/{sprite_map["image"]}?v={sprite_map["version"]})']
+    sizes, positions = [f"{cols * 100}% {rows * 100}%"], [f"{x:.4g}% {y:.4g}%"]
+    if placeholder:
+        images.append(f"url({placeholder})")
+        sizes.append("cover")
+        positions.append("center")
+    return (f"background-image: {', '.join(images)}; background-size: {', '.join(sizes)}; "
+            f"background-position: {', '.join(positions)}")
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+原图存储分层
+- tier: git    原图随仓库提交（默认，兼容旧行为）
+- tier: object 原图只存对象存储（COS 或本地目录替身），仓库内只保留缩略图和元数据，
+               meta.json 中的 originals 字段记录指针 {backend, key, url, bytes, sha256}；
+               本地目录替身只有配置了 public_base_url 时才记录 url，本机 file:// 路径不会写入提交的文件
+"""
+
+import hashlib
+import json
+import shutil
+from pathlib import Path
+
+from src.archive import atomic_output, load_checkpoint, write_json
+
+DEFAULT_STORAGE = {
+    "tier": "git",
+    "backend": "cos",
+    "local_dir": ".cache/object_store",
+    "public_base_url": "",
+}
+ORIGINALS_CACHE = Path(".cache/originals")
+
+
+def get_storage_config() -> dict:
+    """读取 config/sources.yaml 中的 storage 配置"""
+    from src.config_loader import load_sources_config
+    config = dict(DEFAULT_STORAGE)
+    config.update(load_sources_config().get("storage") or {})
+    return config
+
+
+def is_tiered(config: dict = None) -> bool:
+    """原图是否只存放在对象存储中"""
+    return (config or get_storage_config()).get("tier") == "object"
+
+
+def file_sha256(path: Path) -> str:
+    """分块计算文件 SHA-256"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def read_pointers(entry_dir: Path) -> dict:
+    """读取条目 meta.json 中的原图指针 {文件名: 指针}"""
+    meta_path = Path(entry_dir) / "meta.json"
+    if not meta_path.exists():
+        return {}
+    try:
+        return json.loads(meta_path.read_text(encoding="utf-8")).get("originals") or {}
+    except ValueError:
+        return {}
+
+
+def has_original(entry_dir: Path, name: str = "image.jpg") -> bool:
+    """原图在本地或对象存储中是否可用"""
+    return (Path(entry_dir) / name).exists() or name in read_pointers(entry_dir)
+
+
+def original_url(meta: dict, local_url: str, name: str = "image.jpg") -> str:
+    """页面中使用的原图链接：已分层且有公开地址的条目指向对象存储，否则使用仓库内的相对路径"""
+    pointer = (meta.get("originals") or {}).get(name) or {}
+    return pointer.get("url") or local_url
+
+
+def _public_url(config: dict, key: str, fallback: str) -> str:
+    base = config.get("public_base_url")
+    return f"{base.rstrip('/')}/{key}" if base else fallback
+
+
+def put_object(local_path: Path, key: str, config: dict = None):
+    """
+    上传单个文件到配置的对象存储后端，返回公开访问地址；失败返回 None
+    本地目录替身未配置 public_base_url 时没有公开地址，返回空字符串
+    """
+    config = config or get_storage_config()
+    backend = config.get("backend")
+
+    if backend == "local":
+        target = Path(config["local_dir"]) / key
+        with atomic_output(target) as tmp_path:
+            shutil.copyfile(local_path, tmp_path)
+        return _public_url(config, key, "")
+
+    if backend == "cos":
+        from src.utils import upload_to_cos
+        url = upload_to_cos(str(local_path), key)
+        return _public_url(config, key, url) if url else None
+
+    print(f"[ERROR] 不支持的存储后端: {backend}")
+    return None
+
+
+def tier_entry(entry_dir: Path, config: dict = None) -> int:
+    """
+    将条目中的原图（含多市场图片）迁移到对象存储：
+    上传 -> 在 meta.json 写入指针 -> 删除本地文件
+    返回迁出的字节数；任一文件上传失败时保留本地文件
+    """
+    config = config or get_storage_config()
+    entry_dir = Path(entry_dir)
+    meta_path = entry_dir / "meta.json"
+    if not meta_path.exists():
+        return 0
+
+    originals = sorted(p for p in entry_dir.glob("image*.jpg"))
+    if not originals:
+        return 0
+
+    meta = json.loads(meta_path.read_text(encoding="utf-8"))
+    pointers = dict(meta.get("originals") or {})
+    # 已由 COS 分发阶段上传且大小一致的文件无需重复上传
+    cos_files = load_checkpoint(entry_dir).get("stages", {}).get("cos", {}).get("files", {})
+    key_prefix = f"wallpapers/{entry_dir.parent.name}/{entry_dir.name}"
+
+    for path in originals:
+        key = f"{key_prefix}/{path.name}"
+        size = path.stat().st_size
+        if config.get("backend") == "cos" and cos_files.get(path.name) == size:
+            from src.utils import cos_object_url
+            url = cos_object_url(key)
+            url = url and _public_url(config, key, url)
+        else:
+            url = put_object(path, key, config)
+        if url is None:
+            print(f"[WARN] {path} 上传对象存储失败，保留本地原图")
+            return 0
+        pointer = {"backend": config.get("backend"), "key": key, "bytes": size, "sha256": file_sha256(path)}
+        if url:
+            pointer["url"] = url
+        pointers[path.name] = pointer
+
+    meta["originals"] = pointers
+    write_json(meta_path, meta, if_changed=True)
+    moved = 0
+    for path in originals:
+        moved += path.stat().st_size
+        path.unlink()
+    return moved
+
+
+def apply_storage_tier(entry_dir: Path):
+    """分层模式下把条目原图迁出仓库（git 模式下不做任何事）"""
+    config = get_storage_config()
+    if not is_tiered(config):
+        return
+    moved = tier_entry(entry_dir, config)
+    if moved:
+        print(f"[OK] 原图已迁移至对象存储 ({config['backend']}, {moved // 1024} KB)")
+
+
+def fetch_original(entry_dir: Path, name: str = "image.jpg") -> Path:
+    """
+    获取原图的本地路径：本地存在时直接返回；
+    已分层时下载到 .cache/originals 并校验 SHA-256；都不可用时返回 None
+    """
+    entry_dir = Path(entry_dir)
+    local = entry_dir / name
+    if local.exists():
+        return local
+
+    pointer = read_pointers(entry_dir).get(name)
+    if not pointer:
+        return None
+
+    if pointer.get("backend") == "local":
+        stored = Path(get_storage_config()["local_dir"]) / pointer["key"]
+        if stored.exists():
+            return stored
+
+    cached = ORIGINALS_CACHE / entry_dir.parent.name / entry_dir.name / name
+    if cached.exists() and file_sha256(cached) == pointer.get("sha256"):
+        return cached
+
+    url = pointer.get("url")
+    if not url:
+        return None
+    with atomic_output(cached) as tmp_path:
+        import requests
+        with requests.get(url, timeout=60, stream=True) as r:
+            r.raise_for_status()
+            with open(tmp_path, "wb") as f:
+                for chunk in r.iter_content(chunk_size=1024 * 1024):
+                    f.write(chunk)
+        if pointer.get("sha256") and file_sha256(tmp_path) != pointer["sha256"]:
+            raise ValueError(f"{url} 的 SHA-256 与指针记录不一致")
+    return cached
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+静态故事页
+GitHub Pages 会把 story.md 当作纯文本返回，渲染步骤把每篇故事预先生成为条目目录下的 story.html：
+大图（已分层的原图链接到对象存储，加载前以缩略图垫底）、日期、来源、版权信息、主色调与排版后的正文。
+- 依赖追踪：页面摘要 = story.md + 页面展示的 meta.json 字段 (PAGE_META_FIELDS 与原图链接)
+  + 页面模板 (templates/story.html) + 渲染器版本，写在页面的 <meta name="story-digest"> 中，随页面一起提交；
+  摘要未变的页面跳过，只重建新增或变化的条目（画廊占位图等页面不展示的字段变化不触发重建）
+- story.md 被删除后同时删除对应的 story.html
+- Markdown 只支持故事中会出现的子集：标题、段落、强调、链接、图片、引用、列表、分隔线
+
+用法:
+  python scripts/build_story_pages.py [--source bing] [--force]
+"""
+
+import hashlib
+import html
+import json
+import re
+from pathlib import Path
+from string import Template
+
+from src.archive import iter_entries, write_if_changed
+from src.storage import original_url
+
+TEMPLATE_PATH = Path("templates/story.html")
+PAGE_NAME = "story.html"
+RENDERER_VERSION = 1  # 修改渲染逻辑后递增，使所有页面重建
+PAGE_META_FIELDS = ("title", "date", "copyright", "photographer", "palette")  # render_page 展示的元数据
+
+_DIGEST_RE = re.compile(r'<meta name="story-digest" content="([0-9a-f]+)">')
+_HEADING_RE = re.compile(r"^(#{1,6})\s+(.*?)\s*#*$")
+_IMAGE_RE = re.compile(r"^!\[([^\]]*)\]\(([^)\s]+)\)$")
+_LIST_RE = re.compile(r"^(?:[-*+]|\d+[.)])\s+")
+_HR_RE = re.compile(r"^(?:-{3,}|\*{3,}|_{3,})$")
+
+
+def render_inline(text: str) -> str:
+    """行内元素：转义后处理代码、图片、链接、粗体与斜体"""
+    text = html.escape(text, quote=True)
+    text = re.sub(r"`([^`]+)`", r"<code>\1</code>", text)
+    text = re.sub(r"!\[([^\]]*)\]\(([^)\s]+)\)", r'<img src="\2" alt="\1">', text)
+    text = re.sub(r"\[([^\]]+)\]\(([^)\s]+)\)", r'<a href="\2">\1</a>', text)
+    text = re.sub(r"\*\*(.+?)\*\*|__(.+?)__", lambda m: f"<strong>{m.group(1) or m.group(2)}</strong>", text)
+    text = re.sub(r"(?<![\w*])\*(?!\s)(.+?)(?<!\s)\*(?!\w)|(?<!\w)_(?!\s)(.+?)(?<!\s)_(?!\w)",
+                  lambda m: f"<em>{m.group(1) or m.group(2)}</em>", text)
+    return text
+
+
+def _render_lines(lines) -> str:
+    """段内换行：行尾两个空格为硬换行，其余按空格连接"""
+    parts = []
+    for line in lines:
+        hard_break = line.endswith("  ")
+        parts.append(render_inline(line.strip()) + ("<br>" if hard_break else ""))
+    return "\n".join(parts).removesuffix("<br>")
+
+
+def render_markdown(text: str, skip_image: str = "image.jpg") -> str:
+    """
+    把故事 Markdown 渲染为 HTML 片段
+    页面标题占用 h1，正文标题整体降一级；只引用 skip_image 的图片行（故事开头的配图）省略，由页面大图代替
+    """
+    blocks, current = [], []
+    for line in text.replace("\r\n", "\n").split("\n"):
+        if line.strip():
+            current.append(line)
+        elif current:
+            blocks.append(current)
+            current = []
+    if current:
+        blocks.append(current)
+
+    out = []
+    for block in blocks:
+        first = block[0].strip()
+        heading = _HEADING_RE.match(first)
+        image = _IMAGE_RE.match(first)
+        if heading and len(block) == 1:
+            level = min(len(heading.group(1)) + 1, 6)
+            out.append(f"<h{level}>{render_inline(heading.group(2))}</h{level}>")
+        elif image and len(block) == 1:
+            if image.group(2) != skip_image:
+                out.append(f"<figure>{render_inline(first)}</figure>")
+        elif _HR_RE.match(first) and len(block) == 1:
+            out.append("<hr>")
+        elif all(line.lstrip().startswith(">") for line in block):
+            inner = [line.lstrip()[1:].removeprefix(" ") for line in block]
+            out.append(f"<blockquote><p>{_render_lines(inner)}</p></blockquote>")
+        elif all(_LIST_RE.match(line.strip()) for line in block):
+            tag = "ol" if first[0].isdigit() else "ul"
+            items = "".join(f"<li>{render_inline(_LIST_RE.sub('', line.strip()))}</li>" for line in block)
+            out.append(f"<{tag}>{items}</{tag}>")
+        else:
+            out.append(f"<p>{_render_lines(block)}</p>")
+    return "\n".join(f"            {chunk}" for chunk in out)
+
+
+def _esc(value) -> str:
+    return html.escape(str(value), quote=True)
+
+
+def load_template() -> str:
+    return TEMPLATE_PATH.read_text(encoding="utf-8")
+
+
+def page_digest(entry_dir: Path, template: str, source_label: str) -> str:
+    """页面依赖的摘要：story.md、页面展示的元数据字段、模板、来源名称与渲染器版本"""
+    digest = hashlib.sha256(f"v{RENDERER_VERSION}\0{source_label}\0".encode())
+    digest.update(template.encode())
+    story_path, meta_path = entry_dir / "story.md", entry_dir / "meta.json"
+    digest.update(b"\0story.md\0" + (story_path.read_bytes() if story_path.exists() else b""))
+    meta = json.loads(meta_path.read_text(encoding="utf-8")) if meta_path.exists() else {}
+    shown = {key: meta.get(key) for key in PAGE_META_FIELDS}
+    shown["image_url"] = original_url(meta, "image.jpg")
+    digest.update(b"\0meta\0" + json.dumps(shown, ensure_ascii=False, sort_keys=True).encode())
+    return digest.hexdigest()
+
+
+def built_digest(page_path: Path):
+    """已生成页面记录的摘要，页面不存在或没有摘要时为 None"""
+    if not page_path.exists():
+        return None
+    with open(page_path, encoding="utf-8") as f:
+        match = _DIGEST_RE.search(f.read(2048))  # 摘要位于 <head> 开头，不必读完整个页面
+    return match.group(1) if match else None
+
+
+def render_page(entry_dir: Path, template: str, source_label: str, digest: str) -> str:
+    meta = json.loads((entry_dir / "meta.json").read_text(encoding="utf-8"))
+    story = (entry_dir / "story.md").read_text(encoding="utf-8")
+    date = meta.get("date") or entry_dir.name
+    title = meta.get("title") or date
+    copyright_text = meta.get("copyright") or (f"© {meta['photographer']}" if meta.get("photographer") else "")
+
+    palette = ""
+    if meta.get("palette"):
+        swatches = "".join(f'<span style="background: {c["color"]}; flex: {c.get("ratio", 1)}" title="{c["color"]}"></span>'
+                           for c in meta["palette"])
+        palette = f'<div class="palette">{swatches}</div>'
+
+    return Template(template).substitute(
+        digest=digest,
+        title=_esc(title),
+        date=_esc(date),
+        source=_esc(source_label),
+        description=_esc(copyright_text or title),
+        copyright=_esc(copyright_text),
+        image_url=_esc(original_url(meta, "image.jpg")),
+        palette=palette,
+        story=render_markdown(story),
+    )
+
+
+def build_story_page(entry_dir: Path, template: str, source_label: str, force: bool = False) -> str:
+    """
+    生成单个条目的故事页，返回 built / skipped / removed；
+    条目没有故事时返回 None（若残留旧页面则删除并返回 removed）
+    """
+    entry_dir = Path(entry_dir)
+    page_path = entry_dir / PAGE_NAME
+    if not (entry_dir / "story.md").exists() or not (entry_dir / "meta.json").exists():
+        if page_path.exists():
+            page_path.unlink()
+            return "removed"
+        return None
+
+    digest = page_digest(entry_dir, template, source_label)
+    if not force and built_digest(page_path) == digest:
+        return "skipped"
+    write_if_changed(page_path, render_page(entry_dir, template, source_label, digest))
+    return "built"
+
+
+def build_story_pages(sources=None, force: bool = False) -> dict:
+    """为所有（或指定源的）条目生成故事页，返回 {"built", "skipped", "removed"} 计数"""
+    from src.config_loader import load_sources_config
+
+    labels = {s["name"]: s.get("display_name", s["name"]) for s in load_sources_config().get("sources", [])}
+    template = load_template()
+    counts = {"built": 0, "skipped": 0, "removed": 0}
+    for source, _, entry_dir in iter_entries(sources):
+        status = build_story_page(entry_dir, template, labels.get(source, source), force)
+        if status:
+            counts[status] += 1
+    return counts
+
+
+def describe(counts: dict) -> str:
+    """一行统计"""
+    text = f"故事页: 生成 {counts['built']} 个，跳过 {counts['skipped']} 个（未变化）"
+    if counts["removed"]:
+        text += f"，删除 {counts['removed']} 个"
+    return text
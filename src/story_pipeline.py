@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+故事生成流水线：一次视觉调用 + 多路纯文本输出
+- 画面分析：带图片的视觉调用只做一次，输出结构化的画面分析（场景、主体、色彩、光线、构图、地点线索、氛围），
+  缓存为条目目录下的 analysis.json；之后补生成其他语言或重写故事不再发送图片
+- 文本输出：config/sources.yaml 的 story.outputs 列出每种语言 / 风格的输出文件与提示词，
+  基于画面分析、标题与版权信息并发调用纯文本接口生成；第一个输出为主输出 (story.md)
+- 每路输出都流式生成并增量写入各自的片段文件，中断后从已生成部分续写（见 src/llm_stream.py）
+提供方由 src/llm_router.py 选择，失败时回退；每次成功调用的用量记入台账（见 src/llm_usage.py）
+"""
+
+import base64
+import json
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from functools import lru_cache
+from pathlib import Path
+
+from src.archive import STORY_PARTIAL_FILE, write_json, write_if_changed
+
+DEFAULT_STORY = {
+    "outputs": [{"name": "zh", "file": "story.md", "prompt": "prompts/story_prompt.txt"}],
+    "max_tokens": 1000,
+    "analysis_max_tokens": 600,
+}
+ANALYSIS_FILE = "analysis.json"
+ANALYSIS_PROMPT_FILE = Path("prompts/image_analysis_prompt.txt")
+ANALYSIS_TIMEOUT = (10, 120)
+STORY_STREAM_ATTEMPTS = 3  # 故事流中断后从已生成部分续写的总次数
+
+DEFAULT_ANALYSIS_PROMPT = (
+    "你是一位细致的图片分析师。请只输出一个 JSON 对象，不要输出其他内容，字段为："
+    "scene（整体场景）、subjects（主要主体，数组）、colors（主要色彩与色调，数组）、lighting（光线）、"
+    "composition（构图）、location_cues（可辨认的地点、地貌、建筑或文化线索，数组）、mood（氛围）。"
+)
+DEFAULT_STORY_PROMPT = (
+    "你是一位地理与文化深度旅行作家。请结合提供的画面分析、标题和背景信息，写一篇约 500 字的精美短文。要求：\n"
+    "1. 直接输出 Markdown 正文，不要包含“好的”、“这是一篇...”等开头或结尾的客套话。\n"
+    "2. 标题使用一级标题 (# Title)。\n"
+    "3. 内容要包含对画面视觉细节（光影、色彩、构图）的细腻描写，并自然引出背后的地理文化故事。\n"
+    "4. 语言风格优美、感性且富有深度。"
+)
+_JSON_BLOCK_RE = re.compile(r"\{[\s\S]*\}")
+
+
+@lru_cache(maxsize=1)
+def get_story_config() -> dict:
+    """读取 config/sources.yaml 中的 story 配置"""
+    from src.config_loader import load_sources_config
+    config = dict(DEFAULT_STORY)
+    config.update(load_sources_config().get("story") or {})
+    return config
+
+
+def get_outputs() -> list:
+    """配置的文本输出；主输出的提示词可由 STORY_PROMPT_FILE 环境变量覆盖"""
+    outputs = [dict(o) for o in get_story_config()["outputs"]]
+    if os.environ.get("STORY_PROMPT_FILE"):
+        outputs[0]["prompt"] = os.environ["STORY_PROMPT_FILE"]
+    return outputs
+
+
+def missing_outputs(entry_dir: Path) -> list:
+    """条目中尚未生成的非主输出"""
+    return [o for o in get_outputs()[1:] if not (Path(entry_dir) / o["file"]).exists()]
+
+
+def partial_file(output: dict) -> str:
+    """输出的流式片段文件名：主输出沿用 .story.partial.md"""
+    stem = Path(output["file"]).stem
+    return STORY_PARTIAL_FILE if stem == "story" else f".{stem}.partial.md"
+
+
+def read_prompt(path, fallback: str) -> str:
+    path = Path(path) if path else None
+    if path and path.exists():
+        return path.read_text(encoding="utf-8").strip()
+    return fallback
+
+
+def parse_analysis(text: str) -> dict:
+    """解析模型输出的 JSON（容忍代码块包裹与前后说明）；无法解析时整段作为 scene"""
+    match = _JSON_BLOCK_RE.search(text or "")
+    if match:
+        try:
+            value = json.loads(match.group(0))
+            if isinstance(value, dict):
+                return value
+        except ValueError:
+            pass
+    return {"scene": (text or "").strip()}
+
+
+def _auth_headers(provider) -> dict:
+    return {"Authorization": f"Bearer {provider.api_key}", "Content-Type": "application/json"}
+
+
+def analyze_image(entry_dir: Path, title: str, copyright: str, image_path: Path, router) -> dict:
+    """
+    返回条目的画面分析：已缓存 (analysis.json) 时直接读取，否则发起一次视觉调用并写入缓存
+    """
+    from src import llm_usage, resilience
+
+    cache_path = Path(entry_dir) / ANALYSIS_FILE
+    if cache_path.exists():
+        try:
+            return json.loads(cache_path.read_text(encoding="utf-8"))["analysis"]
+        except (OSError, ValueError, KeyError):
+            pass
+
+    with open(image_path, "rb") as image_file:
+        base64_image = base64.b64encode(image_file.read()).decode("utf-8")
+    payload = {
+        "messages": [
+            {"role": "system", "content": read_prompt(ANALYSIS_PROMPT_FILE, DEFAULT_ANALYSIS_PROMPT)},
+            {"role": "user", "content": [
+                {"type": "text", "text": f"题目：{title}\n背景项：{copyright}"},
+                {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{base64_image}"}},
+            ]},
+        ],
+        "max_tokens": int(get_story_config()["analysis_max_tokens"]),
+    }
+    del base64_image
+
+    def call(provider, is_last):
+        started = time.perf_counter()
+        resp = resilience.post(f"{provider.base_url}/chat/completions", headers=_auth_headers(provider),
+                               json={**payload, "model": provider.model}, timeout=ANALYSIS_TIMEOUT,
+                               attempts=2 if is_last else 1, label=f"LLM 画面分析 [{provider.name}]")
+        result = resp.json()
+        return {"text": result["choices"][0]["message"]["content"], "usage": result.get("usage"),
+                "seconds": time.perf_counter() - started, "ttft": None, "tokens_per_s": None}
+
+    print(f"[INFO] 正在分析 '{title}' 的画面（视觉调用）...")
+    result, provider = router.run(call, label="LLM 画面分析")
+    llm_usage.record(entry_dir, "analysis", provider, result["usage"], result["seconds"])
+    analysis = parse_analysis(result["text"])
+    write_json(cache_path, {
+        "analysis": analysis,
+        "model": provider.model,
+        "provider": provider.name,
+        "usage": result["usage"],
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+    })
+    print(f"[OK] 画面分析完成 [{provider.name}]，{result['seconds']:.1f}s，已缓存到 {cache_path}")
+    return analysis
+
+
+def write_output(entry_dir: Path, output: dict, analysis: dict, title: str, copyright: str, partial_path: Path,
+                 router, on_first_token=None) -> str:
+    """基于画面分析流式生成一路文本输出，返回正文（不含配图）"""
+    from src import llm_usage
+    from src.llm_stream import StreamInterrupted, stream_chat
+
+    payload = {
+        "messages": [
+            {"role": "system", "content": read_prompt(output.get("prompt"), DEFAULT_STORY_PROMPT)},
+            {"role": "user", "content": (
+                f"题目：{title}\n背景项：{copyright}\n"
+                f"画面分析：\n{json.dumps(analysis, ensure_ascii=False, indent=2)}\n"
+                "请根据以上画面分析进行创作。"
+            )},
+        ],
+        "max_tokens": int(output.get("max_tokens") or get_story_config()["max_tokens"]),
+    }
+    name = output["name"]
+    started = []
+
+    def first_token():
+        if on_first_token and not started:
+            started.append(True)
+            on_first_token()
+
+    def stream_with(provider, is_last):
+        for attempt in range(1, STORY_STREAM_ATTEMPTS + 1):
+            if partial_path.exists() and partial_path.stat().st_size:
+                first_token()  # 已有片段，故事视为已开始
+            try:
+                # 还有后备提供方时不在同一提供方上重试连接，直接回退
+                return stream_chat(f"{provider.base_url}/chat/completions", _auth_headers(provider),
+                                   {**payload, "model": provider.model}, partial_path,
+                                   on_first_token=first_token, label=f"LLM 故事生成 ({name}) [{provider.name}]",
+                                   attempts=2 if is_last else 1)
+            except StreamInterrupted as e:
+                if attempt == STORY_STREAM_ATTEMPTS:
+                    raise
+                print(f"[WARN] {e}，从已生成部分续写")
+
+    result, provider = router.run(stream_with, label=f"LLM 故事生成 ({name})")
+    llm_usage.record(entry_dir, name, provider, result["usage"], result["seconds"], tokens=result["tokens"])
+    ttft = f"{result['ttft']:.2f}s" if result["ttft"] is not None else "-"
+    speed = f"{result['tokens_per_s']:.1f} tokens/s" if result["tokens_per_s"] else "-"
+    print(f"[INFO] 故事 ({name}) 生成完成{'（续写）' if result['resumed'] else ''} [{provider.name}]："
+          f"首 token {ttft}，{result['tokens']} tokens，{speed}，共 {result['seconds']:.1f}s")
+    partial_path.unlink(missing_ok=True)
+    return result["text"]
+
+
+def generate_outputs(entry_dir: Path, title: str, copyright: str, image_path: Path,
+                     on_first_token=None, partial_path: Path = None, include_primary: bool = True) -> dict:
+    """
+    为条目生成配置的文本输出，返回 {输出名: Markdown 内容或 None}
+    主输出由调用方写入并记录断点（include_primary=False 时只补齐其他输出）；
+    其他输出的文件已存在时跳过，否则在这里直接写入条目目录
+    on_first_token 在主输出开始生成时回调；partial_path 覆盖主输出的片段文件位置
+    """
+    from src.llm_router import get_router
+
+    router = get_router()
+    entry_dir = Path(entry_dir)
+    outputs = get_outputs()
+    results = {o["name"]: None for o in outputs}
+    if not router.providers:
+        return results
+    primary = outputs[0]["name"]
+    pending = [o for i, o in enumerate(outputs)
+               if (include_primary if i == 0 else not (entry_dir / o["file"]).exists())]
+    if not pending:
+        return results
+
+    analysis = analyze_image(entry_dir, title, copyright, image_path, router)
+
+    def run(output):
+        is_primary = output["name"] == primary
+        partial = Path(partial_path) if is_primary and partial_path else entry_dir / partial_file(output)
+        try:
+            text = write_output(entry_dir, output, analysis, title, copyright, partial, router,
+                                on_first_token if is_primary else None)
+        except Exception as e:
+            print(f"[WARN] 故事 ({output['name']}) 生成失败: {e}")
+            return output["name"], None
+        # 在文章头部插入原图展示（故事与原图在同一条目目录下）
+        content = f"![{title}](image.jpg)\n\n{text}"
+        if not is_primary:
+            write_if_changed(entry_dir / output["file"], content)
+            print(f"[OK] 故事 ({output['name']}) 已写入 {entry_dir / output['file']}")
+        return output["name"], content
+
+    # 纯文本调用互不依赖，并发生成
+    with ThreadPoolExecutor(max_workers=len(pending)) as pool:
+        for name, content in pool.map(run, pending):
+            results[name] = content
+    return results
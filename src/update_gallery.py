@@ -4,6 +4,7 @@
 支持多数据源
 """
 
+import argparse
 import re
 import json
 import sys
@@ -11,7 +12,14 @@ from pathlib import Path
 
 # 添加项目根目录到路径
 sys.path.insert(0, str(Path(__file__).parent.parent))
+from src import profiling
+from src.archive import log_write_summary, write_if_changed
 from src.config_loader import get_enabled_sources, get_display_config
+from src.storage import has_original, original_url
+from src.placeholder import ensure_placeholder
+from src.sprites import ensure_sprite, prune_sprites, sprite_style
+from src.search_index import build_search_index
+from src.story_pages import build_story_pages, describe as describe_story_pages
 
 
 def update_gallery():
@@ -29,6 +37,7 @@ def update_gallery():
         return
     
     # 收集所有壁纸
+    profiling.stage("gallery.collect")
     all_wallpapers = []
     
     for source in enabled_sources:
@@ -53,41 +62,69 @@ def update_gallery():
             image_path = date_dir / image_file
             story_path = date_dir / "story.md"
             
-            if meta_path.exists() and thumb_path.exists() and image_path.exists():
+            if meta_path.exists() and thumb_path.exists() and has_original(date_dir):
                 try:
                     meta = json.loads(meta_path.read_text(encoding="utf-8"))
                     title = meta.get("title", date)
                     
                     # GitHub Pages 路径：从 docs/ 目录访问同级的 wallpapers/
                     # 使用 ./ 而不是 ../ 因为 GitHub Pages 会将 docs/ 作为根目录
-                    img_url = f"./wallpapers/{source_name}/{date}/{image_file}"
+                    # 已分层的原图链接到对象存储
+                    img_url = original_url(meta, f"./wallpapers/{source_name}/{date}/{image_file}")
                     thumb_url = f"./wallpapers/{source_name}/{date}/thumb.jpg"
-                    story_url = f"./wallpapers/{source_name}/{date}/story.md" if story_path.exists() else None
+                    story_url = f"./wallpapers/{source_name}/{date}/story.html" if story_path.exists() else None
                     
                     all_wallpapers.append({
                         "date": date,
                         "title": title,
                         "img_url": img_url,
                         "thumb_url": thumb_url,
+                        "thumb_path": thumb_path,
                         "story_url": story_url,
-                        "source": source.get("display_name", source_name)
+                        "source": source.get("display_name", source_name),
+                        "source_dir": source_dir,
+                        "palette": [c["color"] for c in meta.get("palette", [])],
+                        "luminance": meta.get("luminance"),
+                        "thumb": ensure_placeholder(date_dir, meta)  # 首次渲染时计算并缓存到 meta.json
                     })
                 except:
                     pass
     
     # 按日期排序
     all_wallpapers.sort(key=lambda x: x["date"], reverse=True)
+
+    # 故事页：把 story.md 预先渲染为 story.html（GitHub Pages 不渲染 Markdown），只重建变化的条目；
+    # 放在收集之后，本轮对 meta.json 的修改（占位图缓存）已落盘
+    profiling.stage("gallery.stories")
+    print(f"[OK] {describe_story_pages(build_story_pages([s['name'] for s in enabled_sources]))}")
+
+    # 每个源每月一张雪碧图，只包含画廊实际展示的缩略图；卡片以它作为首屏背景，缩略图未变化时沿用已生成的雪碧图
+    profiling.stage("gallery.sprites")
+    month_groups = {}
+    for wp in all_wallpapers:
+        month_groups.setdefault((wp["source_dir"].name, wp["date"][:7]), []).append((wp["date"], wp["thumb_path"]))
+    sprite_maps = {key: ensure_sprite(*key, thumbs) for key, thumbs in month_groups.items()}
+    prune_sprites(sprite_maps)
+    for wp in all_wallpapers:
+        sprite_map = sprite_maps[(wp["source_dir"].name, wp["date"][:7])]
+        wp["sprite_style"] = sprite_style(sprite_map, wp["date"], wp["thumb"]["placeholder"])
     
     # 生成卡片
+    profiling.stage("gallery.html")
     cards = []
     for wp in all_wallpapers:
         title_html = f'<span class="title">{wp["title"]}</span>'
         if wp["story_url"]:
             title_html = f'<a href="{wp["story_url"]}" class="story-link"><span class="title">{wp["title"]} 📖</span></a>'
         
-        cards.append(f'''        <div class="card">
+        # 主色调与亮度供页面按颜色筛选、按明暗排序
+        color_attrs = ""
+        if wp["palette"]:
+            color_attrs = f' data-colors="{" ".join(wp["palette"])}" data-luminance="{wp["luminance"]}"'
+
+        cards.append(f'''        <div class="card"{color_attrs}>
             <a href="{wp["img_url"]}" target="_blank">
-                <img src="{wp["thumb_url"]}" alt="{wp["title"]}" loading="lazy">
+                <img class="thumb" src="{wp["thumb_url"]}" alt="{wp["title"]}" width="{wp["thumb"]["width"]}" height="{wp["thumb"]["height"]}" loading="lazy" style="{wp["sprite_style"]}">
             </a>
             <p>{wp["date"]} · {wp["source"]}</p>
             {title_html}
@@ -100,9 +137,23 @@ def update_gallery():
     pattern = r'(<div class="gallery">)[\s\S]*?(</div>\s*</body>)'
     replacement = f"\\1\n{gallery_content}\n    \\2"
     new_content = re.sub(pattern, replacement, html_content)
-    html_path.write_text(new_content, encoding="utf-8")
+    if write_if_changed(html_path, new_content):
+        print("[OK] docs/index.html 已更新")
+    else:
+        print("[INFO] docs/index.html 内容未变化，跳过写入")
+
+    # 画廊的搜索框依赖 docs/search/ 下的静态索引，随画廊一起增量更新
+    profiling.stage("gallery.search")
+    build_search_index()
 
 
 if __name__ == "__main__":
-    update_gallery()
-    print("[OK] docs/index.html 已更新 (多源模式)")
+    parser = argparse.ArgumentParser(description='重新生成 docs/index.html 画廊')
+    profiling.add_arguments(parser)
+    args = parser.parse_args()
+    profiling.start(args, "render_gallery")
+    try:
+        update_gallery()
+    finally:
+        profiling.finish()
+    log_write_summary()
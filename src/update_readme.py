@@ -4,6 +4,7 @@
 支持多数据源、路径修复、数量限制
 """
 
+import argparse
 import re
 import json
 import sys
@@ -12,7 +13,20 @@ from collections import defaultdict
 
 # 添加项目根目录到路径
 sys.path.insert(0, str(Path(__file__).parent.parent))
+from src import profiling
+from src.archive import log_write_summary, write_if_changed
 from src.config_loader import get_enabled_sources, get_display_config
+from src.storage import original_url
+
+
+def story_link(site_url, source_name: str, date: str) -> str:
+    """
+    故事链接：配置了 display.site_url 时指向 GitHub Pages 上预渲染的故事页 (story.html)，
+    否则退回仓库内的 story.md（GitHub 仓库页面可直接渲染 Markdown）
+    """
+    if site_url:
+        return f"{site_url.rstrip('/')}/wallpapers/{source_name}/{date}/story.html"
+    return f"docs/wallpapers/{source_name}/{date}/story.md"
 
 
 def update_readme():
@@ -25,8 +39,10 @@ def update_readme():
     enabled_sources = get_enabled_sources()
     display_config = get_display_config()
     max_items = display_config.get("max_items_per_source", 10)
+    site_url = display_config.get("site_url")
     
     # 按日期聚合所有源的壁纸
+    profiling.stage("readme.collect")
     date_wallpapers = defaultdict(dict)  # {date: {source_name: {meta, paths}}}
     
     for source in enabled_sources:
@@ -55,8 +71,8 @@ def update_readme():
                     date_wallpapers[date][source_name] = {
                         "meta": meta,
                         "thumb": f"docs/wallpapers/{source_name}/{date}/thumb.jpg",
-                        "image": f"docs/wallpapers/{source_name}/{date}/image.jpg",
-                        "story": f"docs/wallpapers/{source_name}/{date}/story.md" if story_path.exists() else None,
+                        "image": original_url(meta, f"docs/wallpapers/{source_name}/{date}/image.jpg"),
+                        "story": story_link(site_url, source_name, date) if story_path.exists() else None,
                         "display_name": source.get("display_name", source_name)
                     }
                 except:
@@ -70,6 +86,7 @@ def update_readme():
         return
     
     # 生成 HTML 表格（日期为行，源为列）
+    profiling.stage("readme.html")
     html_output = ['<table width="100%">']
     
     # 添加表头
@@ -118,6 +135,7 @@ def update_readme():
     index_block = "\n".join(html_output)
     
     # 需要更新的文件列表
+    profiling.stage("readme.write")
     readme_files = [Path("README.md"), Path("README_EN.md")]
     
     for readme_path in readme_files:
@@ -131,11 +149,21 @@ def update_readme():
             pattern = r"(<!-- WALLPAPER_INDEX_START -->)[\s\S]*?(<!-- WALLPAPER_INDEX_END -->)"
             replacement = f"\\1\n{index_block}\n\\2"
             new_content = re.sub(pattern, replacement, readme_content)
-            readme_path.write_text(new_content, encoding="utf-8")
-            print(f"[OK] {readme_path} 已更新")
+            if write_if_changed(readme_path, new_content):
+                print(f"[OK] {readme_path} 已更新")
+            else:
+                print(f"[INFO] {readme_path} 内容未变化，跳过写入")
         except Exception as e:
             print(f"[ERROR] 更新 {readme_path} 失败: {e}")
 
 
 if __name__ == "__main__":
-    update_readme()
+    parser = argparse.ArgumentParser(description='重新生成 README 中的壁纸索引')
+    profiling.add_arguments(parser)
+    args = parser.parse_args()
+    profiling.start(args, "render_readme")
+    try:
+        update_readme()
+    finally:
+        profiling.finish()
+    log_write_summary()
@@ -1,46 +1,65 @@
 #!/usr/bin/env python3
 """
 企业微信群机器人推送工具
+- WEWORK_WEBHOOK 可配置多个群：每条消息只构建、序列化一次，并发推送到所有群
+- 腾讯云 COS 上传与查询
 """
 
 import base64
 import hashlib
+import json
 import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import parse_qs, urlparse
+
 import requests
-from qcloud_cos import CosConfig
-from qcloud_cos import CosS3Client
-import sys
 
 
-def send_image_to_wecom(webhook_url: str, image_path: str):
-    """
-    发送图片到企业微信群机器人
-    """
+WECOM_TIMEOUT = 10  # 秒，单个群的单条消息
+STORY_MAX_BYTES = 1800  # 企业微信 Markdown 消息上限 2048 字节，留出标题余量
+
+_fanout_pool = None
+_fanout_lock = threading.Lock()
+
+
+def parse_webhooks(value) -> list:
+    """WEWORK_WEBHOOK 可配置多个群（逗号、空白或换行分隔）；也接受地址列表"""
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = re.split(r"[\s,]+", value)
+    return [url.strip() for url in value if url and url.strip()]
+
+
+def webhook_label(webhook_url: str) -> str:
+    """日志中使用的群标识：只显示 key 的末尾几位"""
+    key = parse_qs(urlparse(webhook_url).query).get("key", [""])[0]
+    return f"…{key[-6:]}" if key else urlparse(webhook_url).netloc
+
+
+def encode_payload(payload: dict) -> bytes:
+    """序列化消息体；同一条消息推送到多个群时只序列化一次"""
+    return json.dumps(payload, ensure_ascii=False).encode("utf-8")
+
+
+def image_payload(image_path: str) -> bytes:
+    """图片消息：读取、base64 与 md5 各计算一次"""
     with open(image_path, "rb") as f:
         image_data = f.read()
-        image_base64 = base64.b64encode(image_data).decode("utf-8")
-        image_md5 = hashlib.md5(image_data).hexdigest()
-
-    payload = {
+    return encode_payload({
         "msgtype": "image",
         "image": {
-            "base64": image_base64,
-            "md5": image_md5
+            "base64": base64.b64encode(image_data).decode("utf-8"),
+            "md5": hashlib.md5(image_data).hexdigest()
         }
-    }
-
-    resp = requests.post(webhook_url, json=payload, timeout=10)
-    resp.raise_for_status()
-    
-    result = resp.json()
-    if result.get("errcode") != 0:
-        raise Exception(f"WeChat push failed: {result.get('errmsg')}")
+    })
 
 
-def send_markdown_to_wecom(webhook_url: str, meta: dict, source_name: str = "Bing"):
-    """
-    发送 Markdown 消息到企业微信群机器人
-    """
+def markdown_payload(meta: dict, source_name: str = "Bing") -> bytes:
+    """壁纸元数据卡片"""
     title = meta.get("title", "")
     copyright_info = meta.get("copyright", "")
     date = meta.get("date", "")
@@ -54,75 +73,155 @@ def send_markdown_to_wecom(webhook_url: str, meta: dict, source_name: str = "Bin
 📦 已自动归档至 [GitHub 仓库](https://github.com/Hana19951208/DailyWallpaperHub)
 🔁 自动化定时任务运行中"""
 
-    payload = {
-        "msgtype": "markdown",
-        "markdown": {
-            "content": content
-        }
-    }
+    return encode_payload({"msgtype": "markdown", "markdown": {"content": content}})
+
+
+def story_payload(meta: dict, story_content: str) -> bytes:
+    """壁纸故事（Markdown，去掉图片引用并截断到消息长度上限）"""
+    title = meta.get("title", "每日壁纸")
+    date = meta.get("date", "")
+
+    # 移除任何形式的图片引用 (Markdown 格式: ![alt](url))
+    story_text = re.sub(r'!\[.*?\]\(.*?\)', '', story_content).strip()
+    if len(story_text.encode('utf-8')) > STORY_MAX_BYTES:
+        content_bytes = story_text.encode('utf-8')[:STORY_MAX_BYTES]
+        story_text = content_bytes.decode('utf-8', errors='ignore') + "\n\n...\n\n> 查看完整故事请访问 GitHub 仓库"
+
+    markdown_text = f"# 📖 {title}\n\n**日期**: {date}\n\n---\n\n{story_text}"
+    return encode_payload({"msgtype": "markdown", "markdown": {"content": markdown_text}})
+
 
-    resp = requests.post(webhook_url, json=payload, timeout=10)
+def post_payload(webhook_url: str, body: bytes):
+    """把已序列化的消息推送到一个群；HTTP 错误或 errcode 非 0 时抛出异常"""
+    resp = requests.post(webhook_url, data=body, headers={"Content-Type": "application/json; charset=utf-8"},
+                         timeout=WECOM_TIMEOUT)
     resp.raise_for_status()
-    
+
     result = resp.json()
     if result.get("errcode") != 0:
         raise Exception(f"WeChat push failed: {result.get('errmsg')}")
 
 
+def _send_sequence(webhook_url: str, messages, after=None) -> dict:
+    """在一个群上按顺序发送消息，遇到失败即停止；after 为该群之前的推送任务，先等它结束以保证消息顺序"""
+    if after is not None:
+        after.result()
+    started = time.perf_counter()
+    sent = []
+    try:
+        for name, body in messages:
+            post_payload(webhook_url, body)
+            sent.append(name)
+        error = None
+    except Exception as e:
+        error = f"{name}: {e}"
+    result = {"target": webhook_label(webhook_url), "ok": error is None, "sent": sent,
+              "seconds": time.perf_counter() - started, "error": error}
+    # 各群的线程并发输出，整行一次写入避免交错
+    if error is None:
+        print(f"[OK] 企业微信 {result['target']}: {'、'.join(sent)}推送成功 ({result['seconds'] * 1000:.0f}ms)\n", end="")
+    else:
+        print(f"[WARN] 企业微信 {result['target']}: 推送失败 ({error}，{result['seconds'] * 1000:.0f}ms)\n", end="")
+    return result
+
+
+def fan_out_to_wecom(webhooks, messages, after: dict = None, wait: bool = True):
+    """
+    把已序列化的消息 [(名称, 消息体)] 并发推送到所有群
+    每个群在独立线程中按顺序发送，某个群变慢或失败不影响其他群的送达；
+    after 为上一次 wait=False 返回的 {地址: 任务}，各群在自己的上一批消息发完后再发送本批。
+    wait=True 时等待全部完成并返回每个群的结果 [{"target", "ok", "sent", "seconds", "error"}]，
+    否则立即返回 {地址: 任务}
+    """
+    global _fanout_pool
+    webhooks = parse_webhooks(webhooks)
+    if not webhooks or not messages:
+        return [] if wait else {}
+    with _fanout_lock:
+        if _fanout_pool is None:
+            _fanout_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="wecom")
+    # 任务按提交顺序执行，等待的上一批任务总是先于本批开始，不会占满线程池互相等待
+    futures = {url: _fanout_pool.submit(_send_sequence, url, messages, (after or {}).get(url))
+               for url in webhooks}
+    if not wait:
+        return futures
+
+    results = [future.result() for future in as_completed(futures.values())]
+    if len(webhooks) > 1:
+        print(f"[INFO] 企业微信推送完成：{sum(r['ok'] for r in results)}/{len(results)} 个群成功")
+    return results
+
+
+def send_image_to_wecom(webhook_url: str, image_path: str):
+    """
+    发送图片到企业微信群机器人
+    """
+    post_payload(webhook_url, image_payload(image_path))
+
+
+def send_markdown_to_wecom(webhook_url: str, meta: dict, source_name: str = "Bing"):
+    """
+    发送 Markdown 消息到企业微信群机器人
+    """
+    post_payload(webhook_url, markdown_payload(meta, source_name))
+
+
 def send_story_to_wecom(webhook_url: str, meta: dict, story_content: str):
     """
     推送壁纸故事到企业微信（Markdown 格式）
     """
     try:
-        title = meta.get("title", "每日壁纸")
-        date = meta.get("date", "")
-        
-        # 构建 Markdown 内容
-        # 移除任何形式的图片引用 (Markdown 格式: ![alt](url))
-        import re
-        story_text = re.sub(r'!\[.*?\]\(.*?\)', '', story_content).strip()
-        
-        # 限制长度（企业微信限制 2048 字节）
-        max_length = 1800 
-        if len(story_text.encode('utf-8')) > max_length:
-            content_bytes = story_text.encode('utf-8')[:max_length]
-            story_text = content_bytes.decode('utf-8', errors='ignore') + "\n\n...\n\n> 查看完整故事请访问 GitHub 仓库"
-        
-        markdown_text = f"# 📖 {title}\n\n**日期**: {date}\n\n---\n\n{story_text}"
-        
-        payload = {
-            "msgtype": "markdown",
-            "markdown": {
-                "content": markdown_text
-            }
-        }
-        
-        resp = requests.post(webhook_url, json=payload, timeout=10)
-        resp.raise_for_status()
-        result = resp.json()
-        
-        if result.get("errcode") != 0:
-            print(f"[WARN] 企业微信故事推送返回错误: {result.get('errmsg')}")
+        post_payload(webhook_url, story_payload(meta, story_content))
     except Exception as e:
         print(f"[ERROR] 企业微信故事推送失败: {e}")
 
 
+def cos_configured() -> bool:
+    """COS 四项配置是否齐全"""
+    return all(os.environ.get(k) for k in ("COS_SECRET_ID", "COS_SECRET_KEY", "COS_REGION", "COS_BUCKET"))
+
+
+def get_cos_client():
+    """
+    创建 COS 客户端，返回 (client, bucket, region)；配置不全时返回 None
+    """
+    if not cos_configured():
+        return None
+
+    # 按需导入：qcloud_cos 加载较慢，且只有配置了 COS 的运行才需要
+    from qcloud_cos import CosConfig, CosS3Client
+
+    region = os.environ['COS_REGION']
+    config = CosConfig(
+        Region=region,
+        SecretId=os.environ['COS_SECRET_ID'],
+        SecretKey=os.environ['COS_SECRET_KEY'],
+        # 可选：自定义访问域名与协议，如指向本地替身服务 127.0.0.1:8765 / http
+        Domain=os.environ.get('COS_DOMAIN') or None,
+        Scheme=os.environ.get('COS_SCHEME') or 'https'
+    )
+    return CosS3Client(config), os.environ['COS_BUCKET'], region
+
+
+def cos_object_url(cos_path: str):
+    """COS 对象的访问地址；COS 未配置时返回 None"""
+    if not cos_configured():
+        return None
+    scheme = os.environ.get("COS_SCHEME") or "https"
+    domain = os.environ.get("COS_DOMAIN") or f"{os.environ['COS_BUCKET']}.cos.{os.environ['COS_REGION']}.myqcloud.com"
+    return f"{scheme}://{domain}/{cos_path}"
+
+
 def upload_to_cos(local_path: str, cos_path: str):
     """
     上传文件到腾讯云 COS
     """
-    secret_id = os.environ.get('COS_SECRET_ID')
-    secret_key = os.environ.get('COS_SECRET_KEY')
-    region = os.environ.get('COS_REGION')
-    bucket = os.environ.get('COS_BUCKET')
-
-    if not all([secret_id, secret_key, region, bucket]):
+    if not cos_configured():
         print("[INFO] COS 配置不全，跳过 COS 上传")
         return None
 
     try:
-        config = CosConfig(Region=region, SecretId=secret_id, SecretKey=secret_key)
-        client = CosS3Client(config)
+        client, bucket, region = get_cos_client()
 
         with open(local_path, 'rb') as f:
             response = client.put_object(
@@ -133,9 +232,25 @@ def upload_to_cos(local_path: str, cos_path: str):
                 EnableMD5=False
             )
         
-        cos_url = f"https://{bucket}.cos.{region}.myqcloud.com/{cos_path}"
+        cos_url = cos_object_url(cos_path)
         print(f"[OK] 文件已上传至 COS: {cos_url}")
         return cos_url
     except Exception as e:
         print(f"[ERROR] COS 上传失败: {e}")
         return None
+
+
+def cos_object_size(cos_path: str):
+    """
+    查询 COS 上对象的大小（字节）；对象不存在、COS 未配置或查询失败时返回 None
+    """
+    cos = get_cos_client()
+    if not cos:
+        return None
+
+    client, bucket, _ = cos
+    try:
+        response = client.head_object(Bucket=bucket, Key=cos_path)
+        return int(response.get("Content-Length", 0))
+    except Exception:
+        return None